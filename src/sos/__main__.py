@@ -1147,6 +1147,7 @@ def get_preview_parser(desc_only=False):
     )
     parser.add_argument("--exists", help=argparse.SUPPRESS)
     parser.add_argument("--signature", help=argparse.SUPPRESS)
+    parser.add_argument("--agent", action="store_true", help=argparse.SUPPRESS)
     parser.set_defaults(func=cmd_preview)
     return parser
 
@@ -1266,6 +1267,12 @@ def cmd_preview(args, unknown_args):
     load_config_files(args.config)
     env.verbosity = args.verbosity
 
+    if args.agent:
+        # serve batched requests from a RemoteHost
+        from .hosts import serve_remote_requests
+
+        serve_remote_requests()
+        return
     if args.host:
         # remote host?
         host = Host(args.host, start_engine=False)
@@ -1463,9 +1470,7 @@ def get_execute_parser(desc_only=False):
 
 
 def cmd_execute(args, workflow_args):
-    import glob
-
-    from .tasks import check_task
+    from .tasks import check_task, get_task_index
     from .utils import env, get_nodelist, load_config_files, under_cluster
 
     if args.queue is None:
@@ -1510,12 +1515,7 @@ def cmd_execute(args, workflow_args):
                     f"Failed to identify task executor {args.executor}.")
         for task in args.tasks:
             #
-            matched = [
-                os.path.basename(x)[:-5] for x in glob.glob(
-                    os.path.join(
-                        os.path.expanduser("~"), ".sos", "tasks", task +
-                        "*.task"))
-            ]
+            matched = [x[0] for x in get_task_index().match([task])]
             if not matched:
                 env.logger.error(
                     f"{task} does not match any existing task")
@@ -2168,7 +2168,7 @@ def cmd_remove(args, unknown_args):
 
     env.verbosity = args.verbosity
 
-    workflow_signatures = WorkflowSignatures()
+    workflow_signatures = WorkflowSignatures(read_only=True)
     if args.placeholders:
         placeholder_files = workflow_signatures.placeholders()
         removed: int = 0
@@ -12,7 +12,7 @@ from collections import defaultdict
 
 import zmq
 
-from .messages import decode_msg, encode_msg
+from .messages import decode_msg, encode_msg, recv_msg, send_msg
 from .signatures import StepSignatures, WorkflowSignatures
 from .utils import (ProcessKilled, env, get_localhost_ip,
                     get_open_files_and_connections)
@@ -67,7 +67,7 @@ def send_message_to_controller(msg):
         env.master_push_socket = create_socket(env.zmq_context, zmq.PUSH,
                                                "master push")
         env.master_push_socket.connect(env.config["sockets"]["master_push"])
-    env.master_push_socket.send(encode_msg(msg))
+    send_msg(env.master_push_socket, msg)
 
 
 def request_answer_from_controller(msg):
@@ -275,7 +275,7 @@ class Controller(threading.Thread):
 
     def handle_master_push_msg(self, msg):
         try:
-            if msg[0] in ("substep", "step", "workflow", "task"):
+            if msg[0] in ("substep", "substeps", "step", "workflow", "task"):
                 # cache the request, route to first available worker
                 self.workers.add_request(msg[0], msg[1])
             elif msg[0] == "nprocs":
@@ -338,7 +338,7 @@ class Controller(threading.Thread):
             while True:
                 if self.master_push_socket.poll(0):
                     self.handle_master_push_msg(
-                        decode_msg(self.master_push_socket.recv()))
+                        recv_msg(self.master_push_socket, resolve=False))
                 else:
                     break
             if msg[0] == "workflow_sig":
@@ -468,7 +468,7 @@ class Controller(threading.Thread):
                 while True:
                     if self.master_push_socket.poll(0):
                         self.handle_master_push_msg(
-                            decode_msg(self.master_push_socket.recv()))
+                            recv_msg(self.master_push_socket, resolve=False))
                     else:
                         break
 
@@ -658,7 +658,7 @@ class Controller(threading.Thread):
                     while True:
                         if self.master_push_socket.poll(0):
                             self.handle_master_push_msg(
-                                decode_msg(self.master_push_socket.recv()))
+                                recv_msg(self.master_push_socket, resolve=False))
                         else:
                             break
 
@@ -671,7 +671,7 @@ class Controller(threading.Thread):
                     while True:
                         if self.worker_backend_socket.poll(0):
                             self.handle_worker_backend_msg(
-                                decode_msg(self.worker_backend_socket.recv()))
+                                recv_msg(self.worker_backend_socket))
                         else:
                             break
 
@@ -3,6 +3,7 @@
 # Copyright (c) Bo Peng and the University of Texas MD Anderson Cancer Center
 # Distributed under the terms of the 3-clause BSD License.
 import copy
+import heapq
 import pickle
 import time
 from collections import defaultdict
@@ -92,7 +93,10 @@ class SoS_Node(object):
         # env.logger.error('Note {}: Input: {} Depends: {} Output: {}'.format(self._node_id, self._input_targets,
         #      self._depends_targets,  self._output_targets))
         self._context = {} if context is None else copy.deepcopy(context)
-        self._status = None
+        # the DAG that owns the node, which is notified of status changes
+        self._dag = None
+        self._dag_seq = None
+        self._node_status = None
         # unique ID to avoid add duplicate nodes ...
         self._node_uuid = textMD5(
             pickle.dumps((step_uuid, node_name, node_index, input_targets,
@@ -101,6 +105,17 @@ class SoS_Node(object):
                               context[k], set) else context[k])
                                 for k in sorted(context.keys())])))
 
+    @property
+    def _status(self):
+        return self._node_status
+
+    @_status.setter
+    def _status(self, status):
+        old_status = self._node_status
+        self._node_status = status
+        if self._dag is not None and old_status != status:
+            self._dag._status_changed(self, old_status, status)
+
     def __repr__(self):
         return self._node_id
 
@@ -113,6 +128,21 @@ class SoS_Node(object):
 class SoS_DAG(nx.DiGraph):
 
     def __init__(self, *args, **kwargs):
+        # number of predecessors of each node that are not completed
+        self._unmet = {}
+        # heap of (seq, node) of nodes that might be ready for execution,
+        # entries are validated lazily in find_executable
+        self._ready = []
+        self._in_ready = set()
+        # nodes grouped by status, in the order they entered the status
+        self._by_status = defaultdict(dict)
+        self._by_uuid = {}
+        self._node_seq = 0
+        # nodes of forward workflows, and what have been connected by build()
+        self._wf_nodes = defaultdict(list)
+        self._built_wf = {}
+        self._built_targets = {}
+        self._changed_targets = set()
         nx.DiGraph.__init__(self, *args, **kwargs)
         # all_input
         self._all_depends_files = defaultdict(list)
@@ -142,6 +172,75 @@ class SoS_DAG(nx.DiGraph):
     def num_nodes(self):
         return nx.number_of_nodes(self)
 
+    def _register_node(self, node):
+        if node in self._unmet:
+            return
+        node._dag = self
+        node._dag_seq = self._node_seq
+        self._node_seq += 1
+        self._unmet[node] = 0
+        self._by_status[node._status][node] = None
+        self._by_uuid[node._node_uuid] = node
+        if node._wf_index is not None:
+            self._wf_nodes[node._wf_index].append(node)
+        self._mark_ready(node)
+
+    def _mark_ready(self, node):
+        if node._status is None and self._unmet[
+                node] == 0 and node not in self._in_ready:
+            self._in_ready.add(node)
+            heapq.heappush(self._ready, (node._dag_seq, node))
+
+    def _status_changed(self, node, old_status, new_status):
+        '''Called by SoS_Node when its status is changed, which updates the
+        counters of unmet dependencies and the queue of ready nodes.'''
+        self._by_status[old_status].pop(node, None)
+        self._by_status[new_status][node] = None
+        if new_status == 'completed':
+            for succ in self.successors(node):
+                self._unmet[succ] -= 1
+                self._mark_ready(succ)
+        elif old_status == 'completed':
+            for succ in self.successors(node):
+                self._unmet[succ] += 1
+        self._mark_ready(node)
+
+    def add_node(self, node_for_adding, **attr):
+        nx.DiGraph.add_node(self, node_for_adding, **attr)
+        self._register_node(node_for_adding)
+
+    def add_edge(self, u_of_edge, v_of_edge, **attr):
+        existing = self.has_edge(u_of_edge, v_of_edge)
+        nx.DiGraph.add_edge(self, u_of_edge, v_of_edge, **attr)
+        if existing:
+            return
+        self._register_node(u_of_edge)
+        self._register_node(v_of_edge)
+        if u_of_edge._status != 'completed':
+            self._unmet[v_of_edge] += 1
+
+    def remove_edge(self, u, v):
+        nx.DiGraph.remove_edge(self, u, v)
+        if u._status != 'completed':
+            self._unmet[v] -= 1
+            self._mark_ready(v)
+
+    def remove_node(self, n):
+        succs = list(self.successors(n))
+        nx.DiGraph.remove_node(self, n)
+        if n._status != 'completed':
+            for succ in succs:
+                self._unmet[succ] -= 1
+                self._mark_ready(succ)
+        self._unmet.pop(n)
+        self._in_ready.discard(n)
+        self._by_status[n._status].pop(n, None)
+        self._by_uuid.pop(n._node_uuid, None)
+        if n._wf_index is not None:
+            self._wf_nodes[n._wf_index].remove(n)
+            self._built_wf.pop(n._wf_index, None)
+        n._dag = None
+
     def add_step(self,
                  step_uuid,
                  node_name,
@@ -156,58 +255,54 @@ class SoS_DAG(nx.DiGraph):
             step_uuid, node_name,
             None if node_index is None else self._forward_workflow_id,
             node_index, input_targets, depends_targets, output_targets, context)
-        if node._node_uuid in [x._node_uuid for x in self.nodes()]:
+        if node._node_uuid in self._by_uuid:
             return
         # adding a step would add a sos_step target to met the depends on sos_step
         # requirement of some steps.
         self._all_output_files[sos_step(node_name.split(' ')[0])].append(node)
+        self._changed_targets.add(sos_step(node_name.split(' ')[0]))
 
-        for x in input_targets:
-            if node not in self._all_depends_files[x]:
-                self._all_depends_files[x].append(node)
-        for x in depends_targets:
-            if node not in self._all_depends_files[x]:
-                self._all_depends_files[x].append(node)
-        for x in output_targets:
-            if node not in self._all_output_files[x]:
-                self._all_output_files[x].append(node)
+        self.update_step(node, input_targets, output_targets, depends_targets)
         if context is not None:
             for x in context['__changed_vars__']:
                 if node not in self._all_output_files[sos_variable(x)]:
                     self._all_output_files[sos_variable(x)].append(node)
+                    self._changed_targets.add(sos_variable(x))
         self.add_node(node)
 
     def update_step(self, node, input_targets: sos_targets,
                     output_targets: sos_targets, depends_targets: sos_targets):
-        for x in input_targets:
-            if node not in self._all_depends_files[x]:
-                self._all_depends_files[x].append(node)
-        for x in depends_targets:
-            if node not in self._all_depends_files[x]:
-                self._all_depends_files[x].append(node)
+        self.add_depends(node, input_targets)
+        self.add_depends(node, depends_targets)
         for x in output_targets:
             if node not in self._all_output_files[x]:
                 self._all_output_files[x].append(node)
+                self._changed_targets.add(x)
+
+    def add_depends(self, node, targets: sos_targets):
+        '''Add targets that node depends on, which will be connected to steps
+        that generate them by build()'''
+        for x in targets:
+            if node not in self._all_depends_files[x]:
+                self._all_depends_files[x].append(node)
+                self._changed_targets.add(x)
 
     def find_executable(self):
         '''Find an executable node, which means nodes that has not been completed
         and has no input dependency.'''
         if 'DAG' in env.config['SOS_DEBUG'] or 'ALL' in env.config['SOS_DEBUG']:
             env.log_to_file('DAG', 'find_executable')
-        for node in self.nodes():
-            # if it has not been executed
-            if node._status is None:
-                with_dependency = False
-                for edge in self.in_edges(node):
-                    if edge[0]._status != 'completed':
-                        with_dependency = True
-                        break
-                if not with_dependency:
-                    return node
+        # nodes in the ready queue could have been started or gained new
+        # dependencies after they were queued so they are validated here.
+        # A ready node is kept in the queue until its status is changed.
+        while self._ready:
+            node = self._ready[0][1]
+            if node._status is None and self._unmet.get(node, -1) == 0:
+                return node
+            heapq.heappop(self._ready)
+            self._in_ready.discard(node)
         # if no node could be found, let use try pending ones
-        pending_jobs = [
-            x for x in self.nodes() if x._status == 'signature_pending'
-        ]
+        pending_jobs = list(self._by_status['signature_pending'])
         if pending_jobs:
             notifier = ActivityNotifier(
                     f'Waiting for {len(pending_jobs)} pending job{"s: e.g." if len(pending_jobs) > 1 else ":"} output {short_repr(pending_jobs[0]._signature[0])} with signature file {pending_jobs[0]._signature[1] + "_"}. You can manually remove this lock file if you are certain that no other process is working on the output.'
@@ -230,9 +325,8 @@ class SoS_DAG(nx.DiGraph):
         return None
 
     def node_by_id(self, node_uuid):
-        for node in self.nodes():
-            if node._node_uuid == node_uuid:
-                return node
+        if node_uuid in self._by_uuid:
+            return self._by_uuid[node_uuid]
         raise RuntimeError(f'Failed to locate node with UUID {node_uuid}')
 
     def show_nodes(self):
@@ -256,11 +350,10 @@ class SoS_DAG(nx.DiGraph):
         return ''
 
     def pending(self):
-        return [x for x in self.nodes() if x._status == 'failed'
-               ], [x for x in self.nodes() if x._status is None]
+        return list(self._by_status['failed']), list(self._by_status[None])
 
     def running(self):
-        return [x for x in self.nodes() if x._status == 'running']
+        return list(self._by_status['running'])
 
     def dangling(self, targets: sos_targets):
         '''returns
@@ -324,63 +417,89 @@ class SoS_DAG(nx.DiGraph):
     #     return SoS_DAG(nx.subgraph(self, subnodes + list(ancestors)))
 
     def build(self):
-        '''Connect nodes according to status of targets'''
+        '''Connect nodes according to status of targets. Edges are only added
+        for nodes and targets that are added or changed since the last build.'''
         # right now we do not worry about status of nodes
         # connecting the output to the input of other nodes
         #
-        # NOTE: This is implemented in the least efficient way just for
-        # testing. It has to be re-implemented.
-        #
-        # refer to http://stackoverflow.com/questions/33494376/networkx-add-edges-to-graph-from-node-attributes
-        #
         # several cases triggers dependency.
         if 'DAG' in env.config['SOS_DEBUG'] or 'ALL' in env.config['SOS_DEBUG']:
             env.log_to_file('DAG', 'build DAG')
-        for wf in range(self._forward_workflow_id + 1):
-            indexed = [x for x in self.nodes() if x._wf_index == wf]
-            indexed.sort(key=lambda x: x._node_index)
-
-            for idx, node in enumerate(indexed):
-                # 1. if a node changes context (using option alias), all later steps
-                # has to rely on it.
-                if node._context['__changed_vars__']:
-                    for later_node in indexed[idx + 1:]:
-                        if node._context['__changed_vars__'] & (
-                                later_node._context['__signature_vars__']
-                                | later_node._context['__environ_vars__']):
-                            self.add_edge(node, later_node)
-
-                # 2. if the input of a step is undetermined, it has to be executed
-                # after all its previous steps.
-                if not node._input_targets.valid() and idx > 0:
-                    # if there is some input specified, it does not use default
-                    # input, so the relationship can be further looked before
-                    if node._input_targets.undetermined():
-                        # if the input is dynamic, has to rely on previous step...
-                        if 'dynamic' in node._context['__environ_vars__']:
-                            self.add_edge(indexed[idx - 1], node)
-                        else:
-                            # otherwise let us look back.
-                            for prev_node in indexed[idx - 1::-1]:
-                                if node._context[
-                                        '__environ_vars__'] & prev_node._context[
-                                            '__changed_vars__']:
-                                    self.add_edge(prev_node, node)
-                    else:
-                        self.add_edge(indexed[idx - 1], node)
+        for wf, nodes in self._wf_nodes.items():
+            # edges within a forward workflow depend only on the nodes of
+            # the workflow, which are all added before the workflow is built
+            if self._built_wf.get(wf, 0) == len(nodes):
+                continue
+            self._built_wf[wf] = len(nodes)
+            self._build_forward_workflow(
+                sorted(nodes, key=lambda x: x._node_index))
         #
         # 3. if the input of a step depends on the output of another step
-        for target, in_node in self._all_depends_files.items():
-            if target not in self._all_output_files:
+        #
+        # _all_depends_files and _all_output_files only grow so we only
+        # connect nodes that are appended to them after the last build
+        changed_targets = self._changed_targets
+        self._changed_targets = set()
+        for target in changed_targets:
+            if target not in self._all_output_files or \
+                    target not in self._all_depends_files:
                 continue
+            in_node = self._all_depends_files[target]
             # it is possible that multiple nodes satisfy the same target
             out_node = self._all_output_files[target]
-            for i in in_node:
+            n_in, n_out = self._built_targets.get(target, (0, 0))
+            self._built_targets[target] = (len(in_node), len(out_node))
+            for i in in_node[n_in:]:
                 for j in out_node:
                     if j != i:
                         self.add_edge(j, i)
+            for i in in_node[:n_in]:
+                for j in out_node[n_out:]:
+                    if j != i:
+                        self.add_edge(j, i)
         self.mark_dirty()
 
+    def _build_forward_workflow(self, indexed):
+        # index nodes by variables they change and depend on
+        changed_by = defaultdict(list)
+        used_by = defaultdict(list)
+        for idx, node in enumerate(indexed):
+            for var in node._context['__changed_vars__']:
+                changed_by[var].append(idx)
+            for var in node._context['__signature_vars__'] | node._context[
+                    '__environ_vars__']:
+                used_by[var].append(idx)
+
+        for idx, node in enumerate(indexed):
+            # 1. if a node changes context (using option alias), all later steps
+            # has to rely on it.
+            if node._context['__changed_vars__']:
+                later_nodes = set()
+                for var in node._context['__changed_vars__']:
+                    later_nodes.update(x for x in used_by[var] if x > idx)
+                for later_idx in sorted(later_nodes):
+                    self.add_edge(node, indexed[later_idx])
+
+            # 2. if the input of a step is undetermined, it has to be executed
+            # after all its previous steps.
+            if not node._input_targets.valid() and idx > 0:
+                # if there is some input specified, it does not use default
+                # input, so the relationship can be further looked before
+                if node._input_targets.undetermined():
+                    # if the input is dynamic, has to rely on previous step...
+                    if 'dynamic' in node._context['__environ_vars__']:
+                        self.add_edge(indexed[idx - 1], node)
+                    else:
+                        # otherwise let us look back.
+                        prev_nodes = set()
+                        for var in node._context['__environ_vars__']:
+                            prev_nodes.update(
+                                x for x in changed_by[var] if x < idx)
+                        for prev_idx in sorted(prev_nodes, reverse=True):
+                            self.add_edge(indexed[prev_idx], node)
+                else:
+                    self.add_edge(indexed[idx - 1], node)
+
     def save(self, dest=None):
         if not dest:
             return
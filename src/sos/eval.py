@@ -8,6 +8,7 @@ import contextlib
 import copy
 import pickle
 import sys
+from collections import OrderedDict
 from typing import Any, Dict, Optional, Set
 
 from ._version import __version__
@@ -20,7 +21,8 @@ def interpolate(text, global_dict=None, local_dict=None):
     # step 1, make it a f-string (add quotation marks and f
     # step 2, evaluate as a string
     try:
-        return eval(as_fstring(text), global_dict, local_dict)
+        return eval(
+            code_cache.compile(text, "fstring"), global_dict, local_dict)
     except Exception as e:
         raise ValueError(f"Failed to interpolate {text}: {e}") from e
 
@@ -262,7 +264,7 @@ def used_in_func(statement: str,
 
 def SoS_eval(expr: str, extra_dict: dict = {}) -> Any:
     """Evaluate an expression with sos dict."""
-    return eval(expr, env.sos_dict.dict(), extra_dict)
+    return eval(code_cache.compile(expr, "eval"), env.sos_dict.dict(), extra_dict)
 
 
 def _is_expr(expr):
@@ -290,6 +292,86 @@ class StatementHash(object):
 
 stmtHash = StatementHash()
 
+# number of compiled statements and expressions kept by each process
+CODE_CACHE_SIZE = 4096
+
+
+class CodeCache(OrderedDict):
+    """A LRU cache of code objects compiled from statements and expressions,
+    keyed by (script, mode, split). Mode "exec" and "eval" compile statements
+    and expressions, and "fstring" compiles text to be interpolated. With split
+    set, a statement is compiled as a pair of code objects, the statements
+    before a trailing expression and the trailing expression whose value is
+    returned, either of which can be None."""
+
+    def __init__(self, size):
+        super(CodeCache, self).__init__()
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+
+    def compile(self, script: str, mode: str, split: bool = False):
+        key = (script, mode, split)
+        try:
+            code = self[key]
+            self.move_to_end(key)
+            self.hits += 1
+            return code
+        except KeyError:
+            pass
+        self.misses += 1
+        if mode == "fstring":
+            code = compile(as_fstring(script), "<string>", "eval")
+        elif mode == "eval":
+            code = compile(script, "<string>", "eval")
+        elif not split:
+            code = compile(script, filename=stmtHash.hash(script), mode="exec")
+        else:
+            code = self._compile_split(script)
+        self[key] = code
+        while len(self) > self.size:
+            self.popitem(last=False)
+        return code
+
+    def _compile_split(self, script: str):
+        stmts = list(ast.iter_child_nodes(ast.parse(script)))
+        if not stmts:
+            return None, None
+        if not isinstance(stmts[-1], ast.Expr):
+            # no expression to return, we just execute the entire code
+            return compile(
+                script, filename=stmtHash.hash(script), mode="exec"), None
+        # the last one is an expression and we will try to return the results
+        # so we first execute the previous statements and then eval the last one
+        return (
+            compile(
+                ast.Module(body=stmts[:-1], type_ignores=[]),
+                filename=stmtHash.hash(script),
+                mode="exec",
+            ) if len(stmts) > 1 else None,
+            compile(
+                ast.Expression(body=stmts[-1].value),
+                filename=stmtHash.hash(script),
+                mode="eval",
+            ),
+        )
+
+    def info(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self),
+            "maxsize": self.size,
+        }
+
+    def clear(self) -> None:
+        super(CodeCache, self).clear()
+        self.hits = 0
+        self.misses = 0
+
+
+code_cache = CodeCache(CODE_CACHE_SIZE)
+
 
 def SoS_exec(script: str,
              _dict: dict = None,
@@ -299,81 +381,28 @@ def SoS_exec(script: str,
         _dict = env.sos_dict.dict()
 
     if not return_result:
+        code = code_cache.compile(script, "exec")
         if env.verbosity == 0:
             with contextlib.redirect_stdout(None):
-                exec(
-                    compile(
-                        script, filename=stmtHash.hash(script), mode="exec"),
-                    _dict)
+                exec(code, _dict)
         else:
-            exec(
-                compile(script, filename=stmtHash.hash(script), mode="exec"),
-                _dict)
+            exec(code, _dict)
         return None
 
+    res = None
     try:
-        stmts = list(ast.iter_child_nodes(ast.parse(script)))
-        if not stmts:
-            return
-        if isinstance(stmts[-1], ast.Expr):
-            # the last one is an expression and we will try to return the results
-            # so we first execute the previous statements
-            if len(stmts) > 1:
-                if env.verbosity == 0:
-                    with contextlib.redirect_stdout(None):
-                        exec(
-                            compile(
-                                ast.Module(body=stmts[:-1], type_ignores=[]),
-                                filename=stmtHash.hash(script),
-                                mode="exec",
-                            ),
-                            _dict,
-                        )
-                else:
-                    exec(
-                        compile(
-                            ast.Module(body=stmts[:-1], type_ignores=[]),
-                            filename=stmtHash.hash(script),
-                            mode="exec",
-                        ),
-                        _dict,
-                    )
-            # then we eval the last one
-            if env.verbosity == 0:
-                with contextlib.redirect_stdout(None):
-                    res = eval(
-                        compile(
-                            ast.Expression(body=stmts[-1].value),
-                            filename=stmtHash.hash(script),
-                            mode="eval",
-                        ),
-                        _dict,
-                    )
-            else:
-                res = eval(
-                    compile(
-                        ast.Expression(body=stmts[-1].value),
-                        filename=stmtHash.hash(script),
-                        mode="eval",
-                    ),
-                    _dict,
-                )
+        stmts, expr = code_cache.compile(script, "exec", split=True)
+        if env.verbosity == 0:
+            with contextlib.redirect_stdout(None):
+                if stmts is not None:
+                    exec(stmts, _dict)
+                if expr is not None:
+                    res = eval(expr, _dict)
         else:
-            # otherwise we just execute the entire code
-            if env.verbosity == 0:
-                with contextlib.redirect_stdout(None):
-                    exec(
-                        compile(
-                            script, filename=stmtHash.hash(script),
-                            mode="exec"),
-                        _dict,
-                    )
-            else:
-                exec(
-                    compile(
-                        script, filename=stmtHash.hash(script), mode="exec"),
-                    _dict)
-            res = None
+            if stmts is not None:
+                exec(stmts, _dict)
+            if expr is not None:
+                res = eval(expr, _dict)
     except SyntaxError as e:
         raise SyntaxError(f"Invalid code {script}: {e}") from e
 
@@ -6,10 +6,14 @@
 #
 # Utility functions used by various executors.
 #
+import ast
 import os
+import pickle
 import re
 import sys
 import traceback
+import weakref
+from collections import OrderedDict
 from collections.abc import Sequence
 from io import StringIO
 from tokenize import generate_tokens
@@ -21,8 +25,9 @@ import psutil
 from .controller import request_answer_from_controller
 from .eval import SoS_eval, analyze_global_statements, stmtHash
 from .syntax import SOS_TAG
-from .targets import (RemovedTarget, RuntimeInfo, dynamic, file_target,
-                      sos_step, sos_targets, sos_variable)
+from .targets import (RemovedTarget, RuntimeInfo, batch_target_exists,
+                      dynamic, file_target, sos_step, sos_targets,
+                      sos_variable)
 from .tasks import TaskParams
 from .utils import (Error, env, expand_size, format_HHMMSS, get_traceback,
                     load_config_files, textMD5)
@@ -196,6 +201,60 @@ def get_traceback_msg(e):
     return f"{error_class}: {detail}"
 
 
+# namespaces created by global definitions, keyed by the content of global_def
+_global_def_cache = OrderedDict()
+GLOBAL_DEF_CACHE_SIZE = 8
+# keys of global definitions that have been executed, with the statements
+# from which the keys were calculated
+_global_def_keys = weakref.WeakKeyDictionary()
+
+
+def _is_immutable_default(node):
+    if node is None or isinstance(node, ast.Constant):
+        return True
+    return isinstance(node, ast.Tuple) and all(_is_immutable_default(x) for x in node.elts)
+
+
+def _global_def_key(gdef):
+    """Key of global definitions that can be restored from an earlier
+    execution, or None if they create objects (classes, decorated functions,
+    functions with mutable default values) that could be changed by a substep
+    and should therefore be created again."""
+    if not isinstance(gdef, ast.Module):
+        return None
+    stmts = tuple(gdef.body)
+    memo = _global_def_keys.get(gdef, None)
+    if memo is not None and len(memo[0]) == len(stmts) and all(x is y for x, y in zip(memo[0], stmts)):
+        return memo[1]
+    key = None
+    if all(
+            isinstance(x, (ast.Import, ast.ImportFrom)) or
+        (isinstance(x, ast.FunctionDef) and not x.decorator_list and
+         all(_is_immutable_default(y) for y in x.args.defaults + x.args.kw_defaults)) for x in stmts):
+        key = textMD5(pickle.dumps(gdef))
+    _global_def_keys[gdef] = (stmts, key)
+    return key
+
+
+def exec_global_def(gdef):
+    """Execute global definitions (imports and functions) in env.sos_dict, or
+    restore the names defined by an earlier execution of the same definitions
+    in the same dictionary, so that functions defined in global_def refer to
+    the current namespace as their globals."""
+    key = _global_def_key(gdef)
+    cached = None if key is None else _global_def_cache.get(key, None)
+    if cached is not None and cached[0] is env.sos_dict._dict:
+        _global_def_cache.move_to_end(key)
+        env.sos_dict._dict.update(cached[1])
+        return
+    exec(compile(gdef, filename="<ast>", mode="exec"), env.sos_dict._dict)
+    if key is None:
+        return
+    _global_def_cache[key] = (env.sos_dict._dict, dict(env.sos_dict._dict))
+    if len(_global_def_cache) > GLOBAL_DEF_CACHE_SIZE:
+        _global_def_cache.popitem(last=False)
+
+
 def prepare_env(gdef="", gvars={}, extra_vars={}, host="localhost"):
     """clear current sos_dict, execute global_def (definitions and imports),
     and inject global variables"""
@@ -207,7 +266,7 @@ def prepare_env(gdef="", gvars={}, extra_vars={}, host="localhost"):
         gdef, gvars = analyze_global_statements("")
 
     if gdef:
-        exec(compile(gdef, filename="<ast>", mode="exec"), env.sos_dict._dict)
+        exec_global_def(gdef)
 
     env.sos_dict.quick_update(gvars)
     env.sos_dict.quick_update(extra_vars)
@@ -479,8 +538,12 @@ def verify_input(ignore_internal_targets=False):
     # now, if we are actually going to run the script, we
     # need to check the input files actually exists, not just the signatures
     for key in ("_input", "_depends"):
-        for target in env.sos_dict[key]:
-            if not target.target_exists("target") and not (
+        targets = env.sos_dict[key]._targets
+        for target, exists in zip(targets,
+                                  batch_target_exists(targets, "target")):
+            if isinstance(exists, Exception):
+                raise exists
+            if not exists and not (
                     ignore_internal_targets and
                     isinstance(target, (sos_variable, sos_step))):
                 raise RemovedTarget(target)
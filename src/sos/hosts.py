@@ -7,11 +7,15 @@ import copy
 import glob
 import multiprocessing as mp
 import os
+import pickle
+import shlex
 import shutil
 import socket
 import stat
 import subprocess
 import sys
+import tempfile
+import threading
 from collections.abc import Sequence
 from typing import Any, Dict, List, Optional, Union
 
@@ -45,6 +49,10 @@ from .workflow_engines import BackgroundProcess_WorkflowEngine
 #   * send_cmd (optional): alternative command to send files
 #   * receive_cmd (optional): alternative command to receive files
 #   * execute_cmd (optional): alternative command to execute commands
+#   * agent_cmd (optional): alternative command to start a remote agent
+#     (sos preview --agent) that serves batched requests
+#   * remote_agent: if a remote agent is used for checking targets and
+#     executing commands (default to True unless execute_cmd is specified)
 #
 # 2. task properties, namely how to manage running jobs. These include
 #   direct execution, PBS and various cluster systems, and various task
@@ -54,6 +62,8 @@ from .workflow_engines import BackgroundProcess_WorkflowEngine
 #
 #   * task_engine: type of task engine
 #   * max_jobs: maximum number of concurrent jobs on the host.
+#   * status_notification: if locally executed tasks report their status
+#     to the task engine (default to True), which otherwise relies on polling.
 #
 #
 # Implementation wise, a queue instance is created for each queue.
@@ -62,9 +72,11 @@ from .workflow_engines import BackgroundProcess_WorkflowEngine
 
 class DaemonizedProcess(mp.Process):
 
-    def __init__(self, cmd, *args, **kwargs):
+    def __init__(self, cmd, *args, env=None, **kwargs):
         super().__init__(*args, **kwargs)
         self.cmd = cmd
+        # environment of cmd
+        self.cmd_env = env
 
     def run(self):
         try:
@@ -103,7 +115,7 @@ class DaemonizedProcess(mp.Process):
             pass
 
         # fork a new process
-        subprocess.Popen(self.cmd, shell=True, close_fds=True)
+        subprocess.Popen(self.cmd, shell=True, close_fds=True, env=self.cmd_env)
 
 
 def _show_err_and_out(task_id, res) -> None:
@@ -127,6 +139,170 @@ def _show_err_and_out(task_id, res) -> None:
             sys.stderr.write("\n")
 
 
+AGENT_READY = "SOS_AGENT_READY"
+
+
+def _encode_targets(targets):
+    return base64.b64encode(pickle.dumps(targets)).decode()
+
+
+def _agent_op(op, arg):
+    if op in ("exists", "signature"):
+        items = pickle.loads(base64.b64decode(arg))
+        if op == "exists":
+            return items.target_exists()
+        return str(items.target_signature())
+    if op == "mkdir":
+        os.makedirs(os.path.expanduser(arg), exist_ok=True)
+        return None
+    if op == "run":
+        if arg.get("cwd"):
+            os.makedirs(os.path.expanduser(arg["cwd"]), exist_ok=True)
+        try:
+            ret = subprocess.run(
+                arg["cmd"],
+                shell=True,
+                executable=shutil.which("bash"),
+                cwd=os.path.expanduser(arg["cwd"] if arg.get("cwd") else "~"),
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                timeout=arg.get("timeout", None),
+            )
+        except subprocess.TimeoutExpired:
+            raise RuntimeError(f'Command {arg["cmd"]} timed out after {arg["timeout"]} seconds') from None
+        return [
+            ret.returncode,
+            ret.stdout.decode(errors="replace"),
+            ret.stderr.decode(errors="replace"),
+        ]
+    raise ValueError(f"Unrecognized request {op}")
+
+
+def serve_remote_requests(instream=None, outstream=None):
+    """Serve requests from RemoteSession, which are sent as one json line per
+    batch of [op, arg] pairs. Results of each batch are written as a json line
+    of [True, result] or [False, error message] pairs. The agent exits when the
+    input stream is closed."""
+    import json
+
+    instream = sys.stdin if instream is None else instream
+    if outstream is None:
+        # output of actions and commands should not be mixed with responses
+        outstream = sys.stdout
+        sys.stdout = sys.stderr
+    outstream.write(AGENT_READY + "\n")
+    outstream.flush()
+    for line in instream:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+            if request.get("cwd"):
+                cwd = os.path.expanduser(request["cwd"])
+                os.makedirs(cwd, exist_ok=True)
+                os.chdir(cwd)
+            results = []
+            for op, arg in request["ops"]:
+                try:
+                    results.append([True, _agent_op(op, arg)])
+                except (Exception, SystemExit) as e:
+                    # some functions (e.g. fileMD5) exit with an error message
+                    results.append([False, str(e)])
+        except Exception as e:
+            results = [[False, f"Invalid request {short_repr(line)}: {e}"]]
+        outstream.write(json.dumps(results) + "\n")
+        outstream.flush()
+
+
+def _split_common_suffix(source, dest):
+    # split source and dest paths into (source_dir, dest_dir, relpath) with
+    # the longest relpath, or return None if the basenames differ
+    src = source.rstrip("/").split("/")
+    dst = dest.rstrip("/").split("/")
+    n = 0
+    while n < min(len(src), len(dst)) - 1 and src[-1 - n] == dst[-1 - n]:
+        n += 1
+    if n == 0:
+        return None
+    return ("/".join(src[:-n]) or "/", "/".join(dst[:-n]) or "/",
+            "/".join(src[-n:]))
+
+
+class RemoteSession(object):
+    """A long-lived agent (sos preview --agent) started with a command, which
+    is by default a ssh command to the remote host. Requests are sent to the
+    agent in batches and the number of round trips is counted."""
+
+    def __init__(self, cmd: str) -> None:
+        self.cmd = cmd
+        self.round_trips = 0
+        self._proc = None
+        self._lock = threading.Lock()
+
+    def _start(self) -> None:
+        if ("TASK" in env.config["SOS_DEBUG"] or
+                "ALL" in env.config["SOS_DEBUG"]):
+            env.log_to_file("TASK", f"Starting remote agent ``{self.cmd}``")
+        self._proc = subprocess.Popen(
+            self.cmd,
+            shell=True,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+        )
+        # login shells might print messages before the agent starts
+        for line in self._proc.stdout:
+            if line.strip() == AGENT_READY:
+                return
+        self.close()
+        raise RuntimeError(f"Failed to start remote agent with {self.cmd}")
+
+    def request(self, ops, cwd=None, blocking=True) -> Optional[List[Any]]:
+        """Send a batch of [op, arg] to the agent and return a list of
+        results, with exceptions in place of failed requests. If blocking
+        is False, return None if the agent is serving another request."""
+        import json
+
+        if not self._lock.acquire(blocking):
+            return None
+        try:
+            if self._proc is None or self._proc.poll() is not None:
+                self._start()
+            try:
+                self._proc.stdin.write(
+                    json.dumps({
+                        "cwd": cwd,
+                        "ops": [list(x) for x in ops]
+                    }) + "\n")
+                self._proc.stdin.flush()
+                line = self._proc.stdout.readline()
+            except Exception as e:
+                self.close()
+                raise RuntimeError(f"Remote agent is not available: {e}") from e
+            if not line:
+                self.close()
+                raise RuntimeError("Remote agent exited unexpectedly")
+            self.round_trips += 1
+        finally:
+            self._lock.release()
+        results = json.loads(line)
+        if len(results) != len(ops):
+            raise RuntimeError(results[0][1] if results else "Invalid response")
+        return [x[1] if x[0] else RuntimeError(x[1]) for x in results]
+
+    def close(self) -> None:
+        if self._proc is None:
+            return
+        try:
+            self._proc.stdin.close()
+            self._proc.wait(timeout=5)
+        except Exception:
+            self._proc.kill()
+        self._proc = None
+
+
 class LocalHost(object):
     """For local host, no path map, send and receive ..."""
 
@@ -153,6 +329,12 @@ class LocalHost(object):
     def target_signature(self, targets):
         return targets.target_signature()
 
+    def batch_target_exists(self, targets_list):
+        return [x.target_exists() for x in targets_list]
+
+    def batch_target_signature(self, targets_list):
+        return [x.target_signature() for x in targets_list]
+
     def send_to_host(self, items):
         return {x: x for x in items}
 
@@ -315,6 +497,8 @@ class RemoteHost(object):
         self.pem_file = self.config.get("pem_file", None)
         self.shared_dirs = self._get_shared_dirs()
         self.path_map = self._get_path_map()
+        # a RemoteSession, or False if the remote agent is not available
+        self._session = None
         # we already test connect of remote hosts
         if test_connection:
             test_res = self.test_connection()
@@ -322,31 +506,83 @@ class RemoteHost(object):
                 raise RuntimeError(
                     f"Failed to connect to {self.alias}: {test_res}")
 
-    def target_exists(self, targets):
+    def _get_agent_cmd(self):
+        if "agent_cmd" in self.config:
+            return self.config["agent_cmd"]
+        return cfg_interpolate(
+            "ssh " + self.cm_opts + self.pem_opts +
+            """ -q {host} -p {port} "bash --login -c '{sos} preview --agent'" """,
+            {
+                "host": self.address,
+                "port": self.port,
+                "sos": self.config.get("sos", "sos"),
+            },
+        )
+
+    def _agent_request(self, ops, under_workdir=True, blocking=True):
+        # send a batch of requests to the remote agent, return None if
+        # the agent is disabled or cannot be started, or if blocking is
+        # False and the agent is busy
+        if self._session is False:
+            return None
+        if self._session is None:
+            # the agent is by default not used for hosts with customized
+            # execute_cmd, unless a customized agent_cmd is also provided
+            if not self.config.get(
+                    "remote_agent", "agent_cmd" in self.config or
+                    "execute_cmd" not in self.config):
+                self._session = False
+                return None
+            self._session = RemoteSession(self._get_agent_cmd())
         try:
-            msg = self.check_output(
-                [
-                    "sos",
-                    "preview",
-                    "--exists",
-                    base64.b64encode(repr(targets).encode()).decode(),
-                ],
-                under_workdir=True,
-            ).strip()
+            return self._session.request(
+                ops,
+                cwd=self._map_var(os.getcwd()) if under_workdir else None,
+                blocking=blocking)
         except Exception as e:
-            msg = f"error: {e}"
-        if msg.startswith("error:"):
-            env.logger.debug(msg)
-            return True
-        return msg == "yes"
+            env.logger.debug(
+                f"Remote agent on {self.alias} is not available: {e}")
+            self._session.close()
+            self._session = False
+            return None
+
+    def target_exists(self, targets):
+        return self.batch_target_exists([targets])[0]
 
     def target_signature(self, targets):
+        return self.batch_target_signature([targets])[0]
+
+    def batch_target_exists(self, targets_list):
+        res = self._agent_request([
+            ("exists", _encode_targets(x)) for x in targets_list
+        ])
+        if res is None:
+            return [self._query_target("exists", x) for x in targets_list]
+        for idx, r in enumerate(res):
+            if isinstance(r, Exception):
+                env.logger.debug(f"error: {r}")
+                res[idx] = True
+        return res
+
+    def batch_target_signature(self, targets_list):
+        res = self._agent_request([
+            ("signature", _encode_targets(x)) for x in targets_list
+        ])
+        if res is None:
+            return [self._query_target("signature", x) for x in targets_list]
+        for idx, (targets, r) in enumerate(zip(targets_list, res)):
+            if isinstance(r, Exception):
+                env.logger.debug(f"error: {r}")
+                res[idx] = textMD5(targets.target_name())
+        return res
+
+    def _query_target(self, query, targets):
         try:
             msg = self.check_output(
                 [
                     "sos",
                     "preview",
-                    "--signature",
+                    f"--{query}",
                     base64.b64encode(repr(targets).encode()).decode(),
                 ],
                 under_workdir=True,
@@ -355,8 +591,9 @@ class RemoteHost(object):
             msg = f"error: {e}"
         if msg.startswith("error:"):
             env.logger.debug(msg)
-            return textMD5(targets.target_name())
-        return msg
+            return True if query == "exists" else textMD5(
+                targets.target_name())
+        return msg == "yes" if query == "exists" else msg
 
     def _get_shared_dirs(self) -> List[Any]:
         value = self.config.get("shared", [])
@@ -657,6 +894,9 @@ class RemoteHost(object):
         sending = self._map_path(items)
 
         sent = {}
+        # files are copied to the remote host in batches, one rsync command
+        # for all files under the same source and destination directories
+        batches = {}
         for source in sorted(sending.keys()):
             dest = self._remote_abs(sending[source])
             if self.is_shared(source):
@@ -664,15 +904,17 @@ class RemoteHost(object):
                         "ALL" in env.config["SOS_DEBUG"]):
                     env.log_to_file(
                         "TASK", f"Skip sending {source} on shared file system")
-            else:
-                if ("TASK" in env.config["SOS_DEBUG"] or
-                        "ALL" in env.config["SOS_DEBUG"]):
-                    env.log_to_file(
-                        "TASK", f"Sending ``{source}`` to {self.alias}:{dest}")
+                sent[source] = dest
+                continue
+            if ("TASK" in env.config["SOS_DEBUG"] or
+                    "ALL" in env.config["SOS_DEBUG"]):
+                env.log_to_file("TASK",
+                                f"Sending ``{source}`` to {self.alias}:{dest}")
+            batch = _split_common_suffix(os.path.abspath(source), dest)
+            if batch is None:
+                # the file is renamed
                 cmd = cfg_interpolate(
-                    self._get_send_cmd(
-                        rename=os.path.basename(source) != os.path.basename(
-                            dest)),
+                    self._get_send_cmd(rename=True),
                     {
                         "source": sos_targets(str(source).rstrip("/")),
                         "dest": sos_targets(dest),
@@ -680,22 +922,71 @@ class RemoteHost(object):
                         "port": self.port,
                     },
                 )
-                if ("TASK" in env.config["SOS_DEBUG"] or
-                        "ALL" in env.config["SOS_DEBUG"]):
-                    env.log_to_file("TASK", cmd)
-                ret = subprocess.call(
+                self._transfer(
                     cmd,
-                    shell=True,
-                    stderr=subprocess.DEVNULL,
-                    stdout=subprocess.DEVNULL,
+                    f"Failed to copy {source} to {self.alias} using command \"{cmd}\". The remote host might be unavailable.",
                 )
-                if ret != 0:
-                    raise RuntimeError(
-                        f'Failed to copy {source} to {self.alias} using command "{cmd}". The remote host might be unavailable.'
-                    )
+            else:
+                batches.setdefault(batch[:2], []).append(batch[2])
             sent[source] = dest
+        if batches:
+            mkdir = self._agent_request(
+                [("mkdir", dest_dir) for _, dest_dir in batches],
+                under_workdir=False)
+            if mkdir is not None and any(isinstance(x, Exception) for x in mkdir):
+                mkdir = None
+        for (source_dir, dest_dir), files in batches.items():
+            cmd = self._get_batch_send_cmd(source_dir, dest_dir,
+                                           mkdir is None)
+            self._transfer(
+                cmd,
+                f"Failed to copy {short_repr(files)} to {self.alias} using command \"{cmd}\". The remote host might be unavailable.",
+                files,
+            )
         return sent
 
+    def _rsync_opts(self):
+        return (f'rsync -a -r --no-g -e "ssh -p {self.port} {self.cm_opts}'
+                f'{self.pem_opts}" --files-from={{files_from}} ')
+
+    def _get_batch_send_cmd(self, source_dir, dest_dir, mkdir=True):
+        return ((f"ssh {self.cm_opts + self.pem_opts} -q {self.address} -p {self.port} "
+                 f"\"mkdir -p {shlex.quote(dest_dir)}\" && " if mkdir else "") +
+                self._rsync_opts() +
+                f'{shlex.quote(source_dir.rstrip("/") + "/")} '
+                f'{shlex.quote(self.address + ":" + dest_dir.rstrip("/") + "/")}')
+
+    def _get_batch_receive_cmd(self, source_dir, dest_dir):
+        return (self._rsync_opts() +
+                f'{shlex.quote(self.address + ":" + source_dir.rstrip("/") + "/")} '
+                f'{shlex.quote(dest_dir.rstrip("/") + "/")}')
+
+    def _transfer(self, cmd, errmsg, files=None):
+        # run a send or receive command, with the list of files written to
+        # a file that is passed to rsync with option --files-from
+        files_from = None
+        if files is not None:
+            with tempfile.NamedTemporaryFile(
+                    "w", suffix=".txt", delete=False) as flist:
+                flist.write("\n".join(files) + "\n")
+                files_from = flist.name
+            cmd = cmd.replace("{files_from}", shlex.quote(files_from))
+        if ("TASK" in env.config["SOS_DEBUG"] or
+                "ALL" in env.config["SOS_DEBUG"]):
+            env.log_to_file("TASK", cmd)
+        try:
+            ret = subprocess.call(
+                cmd,
+                shell=True,
+                stderr=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+            )
+        finally:
+            if files_from is not None:
+                os.remove(files_from)
+        if ret != 0:
+            raise RuntimeError(errmsg)
+
     def receive_from_host(self, items):
         if isinstance(items, str):
             items = [items]
@@ -718,6 +1009,7 @@ class RemoteHost(object):
         }
         #
         received = {}
+        batches = {}
         for source in sorted(receiving.keys()):
             dest = receiving[source]
             dest_dir = os.path.dirname(dest)
@@ -733,11 +1025,12 @@ class RemoteHost(object):
                 env.logger.debug(
                     f"Skip retrieving ``{dest}`` from shared file system")
                 received[dest] = source
-            else:
+                continue
+            batch = _split_common_suffix(source, os.path.abspath(dest))
+            if batch is None:
+                # the file is renamed
                 cmd = cfg_interpolate(
-                    self._get_receive_cmd(
-                        rename=os.path.basename(source) != os.path.basename(
-                            dest)),
+                    self._get_receive_cmd(rename=True),
                     {
                         "source": sos_targets(str(source).rstrip("/")),
                         "dest": sos_targets(dest),
@@ -745,23 +1038,23 @@ class RemoteHost(object):
                         "port": self.port,
                     },
                 )
-                if ("TASK" in env.config["SOS_DEBUG"] or
-                        "ALL" in env.config["SOS_DEBUG"]):
-                    env.log_to_file("TASK", cmd)
-                try:
-                    ret = subprocess.call(
-                        cmd,
-                        shell=True,
-                        stderr=subprocess.DEVNULL,
-                        stdout=subprocess.DEVNULL,
-                    )
-                    if ret != 0:
-                        raise RuntimeError(f"command return {ret}")
-                    received[dest] = source
-                except Exception as e:
-                    raise RuntimeError(
-                        f'Failed to copy {source} from {self.alias} using command "{cmd}": {e}'
-                    ) from e
+                self._transfer(
+                    cmd,
+                    f'Failed to copy {source} from {self.alias} using command "{cmd}"'
+                )
+            else:
+                batches.setdefault(batch[:2], []).append(batch[2])
+            received[dest] = source
+        # one rsync command for all files under the same source and
+        # destination directories
+        for (source_dir, dest_dir), files in batches.items():
+            os.makedirs(dest_dir, exist_ok=True)
+            cmd = self._get_batch_receive_cmd(source_dir, dest_dir)
+            self._transfer(
+                cmd,
+                f'Failed to copy {short_repr(files)} from {self.alias} using command "{cmd}"',
+                files,
+            )
         return received
 
     #
@@ -910,6 +1203,25 @@ class RemoteHost(object):
                      **kwargs) -> object:
         if isinstance(cmd, list):
             cmd = subprocess.list2cmdline(cmd)
+        if not kwargs:
+            # commands are executed by the ssh command below if the agent
+            # is busy so that a long command does not block others
+            res = self._agent_request([("run", {
+                "cmd": cmd,
+                "cwd": self._map_var(os.getcwd()) if under_workdir else None,
+                "timeout": self.config.get("agent_timeout", 300),
+            })],
+                                      under_workdir=False,
+                                      blocking=False)
+            if res is not None:
+                if isinstance(res[0], Exception):
+                    raise res[0]
+                if res[0][0] != 0:
+                    env.logger.debug(
+                        f"Check output of {cmd} failed: {res[0][2]}")
+                    raise subprocess.CalledProcessError(
+                        res[0][0], cmd, output=res[0][1].encode())
+                return res[0][1]
         try:
             cmd = cfg_interpolate(
                 self._get_execute_cmd(
@@ -1128,6 +1440,8 @@ class Host:
         for host in cls.host_instances.values():
             # perhaps the engine failed to start
             if hasattr(host, "_task_engine"):
+                if host._task_engine is not None:
+                    host._task_engine.close()
                 del host._task_engine
         cls.host_instances = {}
 
@@ -1444,6 +1758,12 @@ class Host:
     def target_signature(self, targets):
         return self._host_agent.target_signature(targets)
 
+    def batch_target_exists(self, targets_list):
+        return self._host_agent.batch_target_exists(targets_list)
+
+    def batch_target_signature(self, targets_list):
+        return self._host_agent.batch_target_signature(targets_list)
+
     def submit_task(self, task_id: str) -> str:
         if not self._task_engine:
             raise RuntimeError(
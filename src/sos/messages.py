@@ -4,6 +4,76 @@
 # Distributed under the terms of the 3-clause BSD License.
 
 import pickle
+import threading
+import uuid
+import weakref
+from collections import OrderedDict
+
+from .utils import textMD5
+
+#
+# Messages between controller, workers and executors are sent with send_msg
+# and received with recv_msg as multipart zmq messages, with
+#
+#   1. a header frame with the version of the message protocol,
+#   2. the message pickled with protocol 5, and
+#   3. large buffers (e.g. of numpy arrays) pickled out of band.
+#
+# Large values that are repeated in many messages (e.g. global definitions
+# and configurations of substeps) can be wrapped with intern_value. They are
+# sent once per connection and are referred to by their keys afterwards.
+# Values interned with shared=True are also unpickled only once by receivers
+# and are shared by all messages, so they should not be modified.
+#
+# Senders and receivers keep the last INTERNED_CACHE_SIZE values of each
+# connection in the same LRU order, so values evicted by the receiver are
+# known to the sender and are sent again when they are used.
+#
+MESSAGE_VERSION = b"SOS_MSG_1"
+
+# protocol 5 with out-of-band buffers is only available for Python >= 3.8
+PICKLE_PROTOCOL = min(5, pickle.HIGHEST_PROTOCOL)
+
+# buffers larger than this size are sent as separate frames
+OUT_OF_BAND_SIZE = 64 * 1024
+
+# number of interned values kept for each connection
+INTERNED_CACHE_SIZE = 32
+# number of senders whose interned values are kept by each receiving socket
+INTERNED_SENDERS_SIZE = 256
+
+# keys of interned values that have been sent to peers of each socket
+_sent_values = weakref.WeakKeyDictionary()
+# interned values received from senders of each socket
+_received_values = weakref.WeakKeyDictionary()
+# unpickled shared values received from each socket
+_loaded_values = weakref.WeakKeyDictionary()
+# keys sent to, or values received from, the socket in use by each thread
+_context = threading.local()
+
+
+class _LRUCache(OrderedDict):
+
+    def __init__(self, size):
+        super(_LRUCache, self).__init__()
+        self.size = size
+
+    def touch(self, key):
+        self.move_to_end(key)
+
+    def add(self, key, value):
+        self[key] = value
+        self.move_to_end(key)
+        while len(self) > self.size:
+            self.popitem(last=False)
+
+
+class _SentValues(_LRUCache):
+    """Keys of interned values sent to a peer, identified by sender_id"""
+
+    def __init__(self):
+        super(_SentValues, self).__init__(INTERNED_CACHE_SIZE)
+        self.sender_id = uuid.uuid4().hex
 
 
 def encode_msg(msg):
@@ -12,3 +82,125 @@ def encode_msg(msg):
 
 def decode_msg(data):
     return pickle.loads(data)
+
+
+class Interned(object):
+    """A pickled value that is sent once per connection"""
+
+    __slots__ = ("key", "data", "shared")
+
+    def __init__(self, key, data, shared=False):
+        self.key = key
+        self.data = data
+        self.shared = shared
+
+    def value(self):
+        return pickle.loads(self.data)
+
+    def __repr__(self):
+        return f"Interned({self.key})"
+
+    def __reduce__(self):
+        # values sent to the peer before are referred to by key
+        sent = getattr(_context, "sent", None)
+        if sent is None:
+            return (Interned, (self.key, self.data, self.shared))
+        if self.key in sent:
+            sent.touch(self.key)
+            return (_load_interned, (sent.sender_id, self.key, None, self.shared))
+        sent.add(self.key, None)
+        return (_load_interned, (sent.sender_id, self.key,
+                                 pickle.PickleBuffer(self.data) if PICKLE_PROTOCOL >= 5 else self.data,
+                                 self.shared))
+
+
+def _load_interned(sender_id, key, data, shared=False):
+    senders = getattr(_context, "received", None)
+    if senders is None:
+        raise ValueError(f"Interned value {key} received outside of recv_msg")
+    if sender_id not in senders:
+        senders.add(sender_id, _LRUCache(INTERNED_CACHE_SIZE))
+    else:
+        senders.touch(sender_id)
+    received = senders[sender_id]
+    if data is None:
+        try:
+            data = received[key]
+        except KeyError:
+            raise ValueError(f"Message refers to an unknown interned value {key}") from None
+        received.touch(key)
+    else:
+        data = bytes(data)
+        received.add(key, data)
+        _context.loaded.pop(key, None)
+    if not _context.resolve:
+        return Interned(key, data, shared)
+    if not shared:
+        return pickle.loads(data)
+    if key not in _context.loaded:
+        _context.loaded.add(key, pickle.loads(data))
+    else:
+        _context.loaded.touch(key)
+    return _context.loaded[key]
+
+
+def intern_value(value, shared=False):
+    data = pickle.dumps(value, protocol=PICKLE_PROTOCOL)
+    return Interned(textMD5(data), data, shared)
+
+
+def send_msg(socket, msg, peer=None):
+    """Send msg through socket. Interned values are sent only once to each
+    peer of the socket, which should be specified for sockets with multiple
+    peers (e.g. a REP socket)."""
+    buffers = []
+    peers = _sent_values.setdefault(socket, {})
+    if peer not in peers:
+        peers[peer] = _SentValues()
+    _context.sent = peers[peer]
+    try:
+        if PICKLE_PROTOCOL >= 5:
+            data = pickle.dumps(
+                msg,
+                protocol=PICKLE_PROTOCOL,
+                buffer_callback=lambda buf: buf.raw().nbytes < OUT_OF_BAND_SIZE or buffers.append(buf))
+        else:
+            data = pickle.dumps(msg, protocol=PICKLE_PROTOCOL)
+    except Exception:
+        # the peer might not receive values that are marked as sent
+        peers.pop(peer, None)
+        raise
+    finally:
+        _context.sent = None
+    socket.send_multipart([MESSAGE_VERSION, data] +
+                          [buf.raw() for buf in buffers],
+                          copy=False)
+
+
+def recv_msg(socket, resolve=True):
+    """Receive a message sent by send_msg from socket. Interned values are
+    returned as Interned objects if resolve is False so that they can be
+    passed along without being unpickled."""
+    frames = socket.recv_multipart(copy=False)
+    if frames[0].bytes != MESSAGE_VERSION:
+        raise ValueError(
+            f"Incompatible message version {frames[0].bytes[:20]!r}, {MESSAGE_VERSION!r} expected."
+        )
+    if socket not in _received_values:
+        _received_values[socket] = _LRUCache(INTERNED_SENDERS_SIZE)
+        _loaded_values[socket] = _LRUCache(INTERNED_CACHE_SIZE)
+    _context.received = _received_values[socket]
+    _context.loaded = _loaded_values[socket]
+    _context.resolve = resolve
+    try:
+        if PICKLE_PROTOCOL >= 5:
+            return pickle.loads(frames[1].buffer, buffers=[x.buffer for x in frames[2:]])
+        return pickle.loads(frames[1].bytes)
+    finally:
+        _context.received = None
+
+
+def forget_peer(socket, peer):
+    """Forget interned values that have been sent to a peer that is gone"""
+    if socket in _sent_values:
+        _sent_values[socket].pop(peer, None)
@@ -2,17 +2,221 @@
 #
 # Copyright (c) Bo Peng and the University of Texas MD Anderson Cancer Center
 # Distributed under the terms of the 3-clause BSD License.
+import json
 import os
 import stat
+import socket
+import struct
+import subprocess
+import sys
 import threading
 import time
+from collections import defaultdict
 
+import fasteners
 import psutil
 
 from .tasks import TaskFile
 from .utils import env, expand_time, format_HHMMSS
 
 
+def resource_limits(max_walltime=None, max_mem=None, max_procs=None):
+    """Return limits of walltime (in seconds), mem and procs of a task from
+    pairs of limits set by the task engine (max_*) and by the task."""
+    if max_walltime is None:
+        walltime_limit = None
+    else:
+        mwall = expand_time(max_walltime[0]) if max_walltime[0] else None
+        wall = expand_time(max_walltime[1]) if max_walltime[1] else None
+        if mwall is not None and wall is not None:
+            walltime_limit = min(mwall, wall)
+        elif mwall is not None:
+            walltime_limit = mwall
+        else:
+            walltime_limit = wall
+    #
+    if max_mem is None:
+        mem_limit = None
+    elif max_mem[0] is not None and max_mem[1] is not None:
+        mem_limit = min(max_mem[0], max_mem[1])
+    elif max_mem[0] is not None:
+        mem_limit = max_mem[0]
+    else:
+        mem_limit = max_mem[1]
+    #
+    if max_procs is None:
+        procs_limit = None
+    elif max_procs[0] is not None and max_procs[1] is not None:
+        procs_limit = min(max_procs[0], max_procs[1])
+    elif max_procs[0] is not None:
+        procs_limit = max_procs[0]
+    else:
+        procs_limit = max_procs[1]
+    return walltime_limit, mem_limit, procs_limit
+
+
+def init_pulse_file(pulse_file):
+    # remove previous status file, which could be readonly if the job is killed
+    if os.path.isfile(pulse_file):
+        if not os.access(pulse_file, os.W_OK):
+            os.chmod(pulse_file, stat.S_IREAD | stat.S_IWRITE)
+        os.remove(pulse_file)
+    with open(pulse_file, "a") as pd:
+        pd.write(
+            "#time\tproc_cpu\tproc_mem\tchildren\tchildren_cpu\tchildren_mem\n"
+        )
+
+
+#
+# Resource usage of tasks is recorded in binary pulse files of fixed size. A
+# pulse file starts with a header with the totals and peaks of all samples so
+# that summaries are calculated without reading the samples. The header is
+# followed by at most capacity records of samples. When the records are full,
+# every other record is dropped and only one of every stride samples is
+# recorded afterwards, so the records cover the entire run of the task with
+# decreasing resolution. Pulse files in the text format of earlier versions
+# of SoS can still be read.
+#
+PULSE_MAGIC = b"SOSPULS1"
+# magic, capacity, count, stride, samples, first_time, last_time, total_cpu,
+# total_mem, peak_cpu, peak_mem, peak_nch
+PULSE_HEADER = struct.Struct("<8sIIIqdddddqi")
+# time, proc_cpu, proc_mem, children, children_cpu, children_mem
+PULSE_RECORD = struct.Struct("<dfqifq")
+
+
+def is_binary_pulse(content):
+    return isinstance(content, bytes) and content.startswith(PULSE_MAGIC)
+
+
+def pulse_summary(content):
+    """Return number of samples, start and end time, total and peak cpu and
+    mem, and peak number of children from content of a pulse file in binary
+    or text format."""
+    if is_binary_pulse(content):
+        (_, _, _, _, samples, start_time, end_time, total_cpu, total_mem, peak_cpu, peak_mem,
+         peak_nch) = PULSE_HEADER.unpack_from(content)
+        if samples == 0:
+            start_time = end_time = None
+        return dict(
+            samples=samples,
+            start_time=start_time,
+            end_time=end_time,
+            total_cpu=total_cpu,
+            total_mem=total_mem,
+            peak_cpu=peak_cpu,
+            peak_mem=peak_mem,
+            peak_nch=peak_nch,
+        )
+    if isinstance(content, bytes):
+        content = content.decode()
+    summary = dict(
+        samples=0,
+        start_time=None,
+        end_time=None,
+        total_cpu=0,
+        total_mem=0,
+        peak_cpu=0,
+        peak_mem=0,
+        peak_nch=0,
+    )
+    for line in content.splitlines():
+        if line.startswith("#"):
+            continue
+        try:
+            t, c, m, nch, cc, cm = line.split()
+        except Exception as e:
+            env.logger.warning(f'Unrecognized resource line "{line.strip()}": {e}')
+            continue
+        if summary["start_time"] is None:
+            summary["start_time"] = float(t)
+        summary["end_time"] = float(t)
+        summary["samples"] += 1
+        summary["total_cpu"] += float(c) + float(cc)
+        summary["total_mem"] += float(m) + float(cm)
+        summary["peak_cpu"] = max(summary["peak_cpu"], float(c) + float(cc))
+        summary["peak_mem"] = max(summary["peak_mem"], float(m) + float(cm))
+        summary["peak_nch"] = max(summary["peak_nch"], int(nch))
+    return summary
+
+
+def pulse_text(content):
+    """Return content of a pulse file in text format"""
+    if not is_binary_pulse(content):
+        return content.decode() if isinstance(content, bytes) else content
+    count = PULSE_HEADER.unpack_from(content)[2]
+    lines = ["#time\tproc_cpu\tproc_mem\tchildren\tchildren_cpu\tchildren_mem\n"]
+    for t, cpu, mem, nch, ch_cpu, ch_mem in PULSE_RECORD.iter_unpack(
+            content[PULSE_HEADER.size:PULSE_HEADER.size + count * PULSE_RECORD.size]):
+        lines.append(f"{t}\t{cpu:.2f}\t{mem}\t{nch}\t{ch_cpu}\t{ch_mem}\n")
+    return "".join(lines)
+
+
+class PulseFile(object):
+    """Pulse file of a task in binary format. Samples should be added by a
+    single PulseFile object, which keeps the header in memory."""
+
+    def __init__(self, filename, capacity=1024):
+        self.filename = filename
+        self.capacity = capacity
+        self._header = None
+
+    def create(self):
+        # remove previous status file, which could be readonly if the job is killed
+        if os.path.isfile(self.filename):
+            if not os.access(self.filename, os.W_OK):
+                os.chmod(self.filename, stat.S_IREAD | stat.S_IWRITE)
+            os.remove(self.filename)
+        self._header = [PULSE_MAGIC, self.capacity, 0, 1, 0, 0.0, 0.0, 0.0, 0.0, 0.0, 0, 0]
+        with open(self.filename, "wb") as pd:
+            pd.write(PULSE_HEADER.pack(*self._header))
+
+    def add_sample(self, t, cpu, mem, nch, ch_cpu, ch_mem):
+        with open(self.filename, "r+b") as pd:
+            if self._header is None:
+                self._header = list(PULSE_HEADER.unpack(pd.read(PULSE_HEADER.size)))
+            (magic, capacity, count, stride, samples, start_time, _, total_cpu, total_mem, peak_cpu, peak_mem,
+             peak_nch) = self._header
+            if samples % stride == 0 and count == capacity:
+                # downsample by keeping every other record
+                pd.seek(PULSE_HEADER.size)
+                records = pd.read(count * PULSE_RECORD.size)
+                pd.seek(PULSE_HEADER.size)
+                pd.write(b"".join(
+                    records[i:i + PULSE_RECORD.size] for i in range(0, len(records), 2 * PULSE_RECORD.size)))
+                count = (count + 1) // 2
+                stride *= 2
+            if samples % stride == 0:
+                # records are written before the header so that readers
+                # always see complete records
+                pd.seek(PULSE_HEADER.size + count * PULSE_RECORD.size)
+                pd.write(PULSE_RECORD.pack(t, cpu, mem, nch, ch_cpu, ch_mem))
+                count += 1
+            self._header = [
+                magic,
+                capacity,
+                count,
+                stride,
+                samples + 1,
+                t if samples == 0 else start_time,
+                t,
+                total_cpu + cpu + ch_cpu,
+                total_mem + mem + ch_mem,
+                max(peak_cpu, cpu + ch_cpu),
+                max(peak_mem, mem + ch_mem),
+                max(peak_nch, nch),
+            ]
+            pd.seek(0)
+            pd.write(PULSE_HEADER.pack(*self._header))
+
+    def summary(self):
+        with open(self.filename, "rb") as pd:
+            content = pd.read(PULSE_HEADER.size)
+            if not is_binary_pulse(content):
+                content += pd.read()
+        return pulse_summary(content)
+
+
 class TaskMonitor(threading.Thread):
 
     def __init__(
@@ -32,48 +236,14 @@ class TaskMonitor(threading.Thread):
         self.resource_monitor_interval = max(
             resource_monitor_interval // monitor_interval, 1)
         self.daemon = True
-        if max_walltime is None:
-            self.max_walltime = None
-        else:
-            mwall = expand_time(max_walltime[0]) if max_walltime[0] else None
-            wall = expand_time(max_walltime[1]) if max_walltime[1] else None
-            if mwall is not None and wall is not None:
-                self.max_walltime = min(wall, wall)
-            elif mwall is not None:
-                self.max_walltime = mwall
-            else:
-                self.max_walltime = wall
-        #
-        if max_mem is None:
-            self.max_mem = None
-        elif max_mem[0] is not None and max_mem[1] is not None:
-            self.max_mem = min(max_mem[0], max_mem[1])
-        elif max_mem[0] is not None:
-            self.max_mem = max_mem[0]
-        else:
-            self.max_mem = max_mem[1]
-        #
-        if max_procs is None:
-            self.max_procs = None
-        elif max_procs[0] is not None and max_procs[1] is not None:
-            self.max_procs = min(max_procs[0], max_procs[1])
-        elif max_procs[0] is not None:
-            self.max_procs = max_procs[0]
-        else:
-            self.max_procs = max_procs[1]
+        self.max_walltime, self.max_mem, self.max_procs = resource_limits(
+            max_walltime, max_mem, max_procs)
 
         self.pulse_file = os.path.join(
             os.path.expanduser("~"), ".sos", "tasks", task_id + ".pulse")
-        # remove previous status file, which could be readonly if the job is killed
-        if os.path.isfile(self.pulse_file):
-            if not os.access(self.pulse_file, os.W_OK):
-                os.chmod(self.pulse_file, stat.S_IREAD | stat.S_IWRITE)
-            os.remove(self.pulse_file)
+        self.pulse = PulseFile(self.pulse_file)
+        self.pulse.create()
         self.sos_dict = sos_dict
-        with open(self.pulse_file, "a") as pd:
-            pd.write(
-                "#time\tproc_cpu\tproc_mem\tchildren\tchildren_cpu\tchildren_mem\n"
-            )
 
     def _check(self):
         current_process = psutil.Process(self.pid)
@@ -135,10 +305,7 @@ class TaskMonitor(threading.Thread):
                             self.sos_dict["peak_mem"] < mem + ch_mem):
                         self.sos_dict["peak_mem"] = mem + ch_mem
 
-                    with open(self.pulse_file, "a") as pd:
-                        pd.write(
-                            f"{time.time()}\t{cpu:.2f}\t{mem}\t{nch}\t{ch_cpu}\t{ch_mem}\n"
-                        )
+                    self.pulse.add_sample(time.time(), cpu, mem, nch, ch_cpu, ch_mem)
                     if self.max_procs is not None and cpu + ch_cpu > self.max_procs:
                         self._exceed_resource(
                             f"Task {self.task_id} may be killed because of excessive use of procs (used {cpu + ch_cpu}, limit {self.max_procs})"
@@ -165,6 +332,325 @@ class TaskMonitor(threading.Thread):
                 break
 
 
+#
+# With option node_monitor (environment variable SOS_NODE_MONITOR), tasks are
+# not monitored by their own TaskMonitor threads but are registered (as files
+# under the node-local temporary directory of sos) with a NodeMonitor process
+# that monitors all tasks on the node. The NodeMonitor is started by the first
+# task that registers, keeps status of tasks in memory, samples process trees
+# of all tasks in one pass, and quits after all tasks are completed.
+#
+def monitor_dir():
+    # ~/.sos is usually shared by all nodes of a cluster so registrations
+    # and the lock of the monitor are kept on the node
+    return os.path.join(env.temp_dir, "monitor")
+
+
+class NodeMonitorClient(object):
+    """Register a task with the node monitor, with the same interface as
+    TaskMonitor."""
+
+    def __init__(
+        self,
+        task_id,
+        monitor_interval,
+        resource_monitor_interval,
+        max_walltime=None,
+        max_mem=None,
+        max_procs=None,
+        sos_dict={},
+    ):
+        self.task_id = task_id
+        self.pulse_file = os.path.join(
+            os.path.expanduser("~"), ".sos", "tasks", task_id + ".pulse")
+        PulseFile(self.pulse_file).create()
+        max_walltime, max_mem, max_procs = resource_limits(
+            max_walltime, max_mem, max_procs)
+        self.registration = {
+            "hostname": socket.gethostname(),
+            "pid": os.getpid(),
+            # pids can be reused so processes are identified by pid and create_time
+            "create_time": psutil.Process().create_time(),
+            "start_time": time.time(),
+            "monitor_interval": monitor_interval,
+            "resource_monitor_interval": resource_monitor_interval,
+            "max_walltime": max_walltime,
+            "max_mem": max_mem,
+            "max_procs": max_procs,
+        }
+
+    def start(self):
+        self.register()
+        start_node_monitor()
+
+    def register(self):
+        os.makedirs(monitor_dir(), exist_ok=True)
+        reg_file = os.path.join(monitor_dir(), self.task_id + ".task")
+        with open(reg_file + ".tmp", "w") as reg:
+            json.dump(self.registration, reg)
+        os.replace(reg_file + ".tmp", reg_file)
+
+    def peak_usage(self):
+        """Peak cpu and mem of the task recorded by the node monitor"""
+        peak_cpu = 0
+        peak_mem = 0
+        try:
+            summary = PulseFile(self.pulse_file).summary()
+            peak_cpu = summary["peak_cpu"]
+            peak_mem = int(summary["peak_mem"])
+        except Exception as e:
+            env.logger.debug(f"Failed to read pulse file of {self.task_id}: {e}")
+        if peak_mem == 0:
+            # the task is completed before it is sampled by the monitor
+            proc = psutil.Process()
+            for p in [proc] + proc.children(recursive=True):
+                try:
+                    peak_mem += p.memory_info()[0]
+                except psutil.Error:
+                    pass
+        return {"peak_cpu": peak_cpu, "peak_mem": peak_mem}
+
+
+def start_node_monitor():
+    """Start a node monitor in the background if it is not running"""
+    lock = fasteners.InterProcessLock(os.path.join(monitor_dir(), "monitor.lck"))
+    if not lock.acquire(blocking=False):
+        # held by a running monitor
+        return
+    lock.release()
+    # a monitor that loses the race to the lock simply quits
+    subprocess.Popen(
+        [sys.executable, "-c", "from sos.monitor import NodeMonitor; NodeMonitor().run()"],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+class NodeMonitor(object):
+    """Monitor all tasks registered on this node in a single process"""
+
+    def __init__(self, idle_timeout=30):
+        self.idle_timeout = idle_timeout
+        self.hostname = socket.gethostname()
+        # registration, cached status, and time of last resource check of tasks
+        self.tasks = {}
+        # psutil.Process objects are kept so that cpu_percent is measured
+        # since the last sample
+        self.processes = {}
+
+    def _task_file(self, task_id):
+        return os.path.join(os.path.expanduser("~"), ".sos", "tasks", task_id + ".task")
+
+    def _pulse_file(self, task_id):
+        return os.path.join(os.path.expanduser("~"), ".sos", "tasks", task_id + ".pulse")
+
+    def _process(self, task_id):
+        """The process of the task, or None if it is gone"""
+        task = self.tasks[task_id]
+        try:
+            proc = psutil.Process(task["pid"])
+            if proc.create_time() == task["create_time"]:
+                return proc
+        except psutil.Error:
+            pass
+        return None
+
+    def _unregister(self, task_id):
+        self.tasks.pop(task_id, None)
+        try:
+            os.remove(os.path.join(monitor_dir(), task_id + ".task"))
+        except FileNotFoundError:
+            pass
+
+    def _kill(self, task_id):
+        proc = self._process(task_id)
+        if proc is not None:
+            try:
+                proc.kill()
+            except psutil.Error:
+                pass
+        self._unregister(task_id)
+
+    def update_registrations(self):
+        registered = set()
+        for reg_file in os.listdir(monitor_dir()):
+            if not reg_file.endswith(".task"):
+                continue
+            task_id = reg_file[:-5]
+            registered.add(task_id)
+            try:
+                # a task that is restarted registers again
+                reg_mtime = os.stat(os.path.join(monitor_dir(), reg_file)).st_mtime_ns
+                if task_id in self.tasks and self.tasks[task_id]["reg_mtime"] == reg_mtime:
+                    continue
+                with open(os.path.join(monitor_dir(), reg_file)) as reg:
+                    registration = json.load(reg)
+                if registration["hostname"] != self.hostname:
+                    registered.discard(task_id)
+                    continue
+                self.tasks[task_id] = dict(
+                    registration,
+                    reg_mtime=reg_mtime,
+                    status=None,
+                    stat=None,
+                    last_sample=0,
+                    pulse=PulseFile(self._pulse_file(task_id)))
+            except Exception as e:
+                env.logger.debug(f"Failed to read registration of {task_id}: {e}")
+                registered.discard(task_id)
+        for task_id in set(self.tasks) - registered:
+            self.tasks.pop(task_id)
+
+    def update_status(self, task_id):
+        """Check status of task, which is read from the task file only if
+        the file has been changed"""
+        task = self.tasks[task_id]
+        try:
+            st = os.stat(self._task_file(task_id))
+        except FileNotFoundError:
+            # the task has been removed
+            self._unregister(task_id)
+            return
+        if (st.st_mtime_ns, st.st_size) != task["stat"]:
+            task["status"] = TaskFile(task_id).status
+            task["stat"] = (st.st_mtime_ns, st.st_size)
+        if task["status"] in ("completed", "failed") or self._process(task_id) is None:
+            self._unregister(task_id)
+        elif task["status"] == "aborted":
+            # killed by sos kill
+            self._kill(task_id)
+        elif not os.path.isfile(self._pulse_file(task_id)):
+            # the pulse file is removed when the task is completed, or by
+            # sos kill to abort the task. The status is read again because
+            # a change of status might not change the mtime of the task file
+            task["status"] = TaskFile(task_id).status
+            if task["status"] in ("completed", "failed"):
+                self._unregister(task_id)
+            else:
+                if task["status"] != "aborted":
+                    TaskFile(task_id).status = "aborted"
+                self._kill(task_id)
+
+    def sample_processes(self, pids):
+        """Return cpu and mem of processes pids and their children, sampled
+        from all processes on the node in one pass"""
+        children = defaultdict(list)
+        running = set()
+        for proc in psutil.process_iter(["ppid"]):
+            children[proc.info["ppid"]].append(proc.pid)
+            running.add(proc.pid)
+            if proc.pid not in self.processes:
+                self.processes[proc.pid] = proc
+        usage = {}
+        for pid in pids:
+            tree = [pid]
+            for p in tree:
+                tree.extend(children.get(p, []))
+            usage[pid] = [0, 0, len(tree) - 1, 0, 0]
+            for idx, p in enumerate(tree):
+                try:
+                    cpu = self.processes[p].cpu_percent()
+                    mem = self.processes[p].memory_info()[0]
+                except (KeyError, psutil.Error):
+                    continue
+                if idx == 0:
+                    usage[pid][0] = cpu
+                    usage[pid][1] = mem
+                else:
+                    usage[pid][3] += cpu
+                    usage[pid][4] += mem
+        # forget processes that are gone
+        for pid in set(self.processes) - running:
+            self.processes.pop(pid)
+        return usage
+
+    def _exceed_resource(self, task_id, msg):
+        err_file = os.path.join(os.path.expanduser("~"), ".sos", "tasks", task_id + ".soserr")
+        with open(err_file, "a") as err:
+            err.write(msg + "\n")
+
+    def check_resources(self, now):
+        tasks = {
+            task_id: task
+            for task_id, task in self.tasks.items()
+            if now - task["last_sample"] >= task["resource_monitor_interval"]
+        }
+        if not tasks:
+            return
+        usage = self.sample_processes([task["pid"] for task in tasks.values()])
+        for task_id, task in tasks.items():
+            task["last_sample"] = now
+            cpu, mem, nch, ch_cpu, ch_mem = usage[task["pid"]]
+            try:
+                task["pulse"].add_sample(now, cpu, mem, nch, ch_cpu, ch_mem)
+            except Exception as e:
+                env.logger.debug(f"Failed to write pulse file of {task_id}: {e}")
+            if task["max_procs"] is not None and cpu + ch_cpu > task["max_procs"]:
+                self._exceed_resource(
+                    task_id,
+                    f"Task {task_id} may be killed because of excessive use of procs (used {cpu + ch_cpu}, limit {task['max_procs']})"
+                )
+            if task["max_mem"] is not None and mem + ch_mem > task["max_mem"]:
+                self._exceed_resource(
+                    task_id,
+                    f"Task {task_id} may be killed because of excessive use of max_mem (used {mem + ch_mem}, limit {task['max_mem']})"
+                )
+
+    def check(self):
+        """Check all registered tasks once, return the time to sleep until
+        the next check."""
+        self.update_registrations()
+        now = time.time()
+        for task_id in list(self.tasks):
+            self.update_status(task_id)
+        self.check_resources(now)
+        interval = None
+        for task_id, task in self.tasks.items():
+            try:
+                os.utime(self._pulse_file(task_id), None)
+            except FileNotFoundError:
+                pass
+            # walltime can be checked more frequently and does not have to wait for resource option
+            elapsed = now - task["start_time"]
+            if task["max_walltime"] is not None and elapsed > task["max_walltime"]:
+                self._exceed_resource(
+                    task_id,
+                    f"Task {task_id} may be killed because of excessive run time (used {format_HHMMSS(int(elapsed))}, limit {format_HHMMSS(task['max_walltime'])})"
+                )
+            interval = task["monitor_interval"] if interval is None else min(interval, task["monitor_interval"])
+        return interval
+
+    def run(self):
+        os.makedirs(monitor_dir(), exist_ok=True)
+        lock = fasteners.InterProcessLock(os.path.join(monitor_dir(), "monitor.lck"))
+        if not lock.acquire(blocking=False):
+            # another monitor is running
+            return
+        while True:
+            try:
+                last_active = time.time()
+                while True:
+                    try:
+                        interval = self.check()
+                    except Exception as e:
+                        env.logger.debug(f"Node monitor failed to check tasks: {e}")
+                        interval = None
+                    if interval is not None:
+                        last_active = time.time()
+                    elif time.time() - last_active > self.idle_timeout:
+                        break
+                    time.sleep(interval or 1)
+            finally:
+                lock.release()
+            # tasks registered before the lock is released might not have
+            # started a new monitor
+            self.update_registrations()
+            if not self.tasks or not lock.acquire(blocking=False):
+                break
+
+
 class WorkflowMonitor(threading.Thread):
 
     def __init__(
@@ -192,16 +678,8 @@ class WorkflowMonitor(threading.Thread):
         self.pulse_file = os.path.join(
             os.path.expanduser("~"), ".sos", "workflows",
             workflow_id + ".pulse")
-        # remove previous status file, which could be readonly if the job is killed
-        if os.path.isfile(self.pulse_file):
-            if not os.stat(self.pulse_file).st_mode & stat.S_IWUSR:
-                os.chmod(self.pulse_file, stat.S_IREAD | stat.S_IWRITE)
-            os.remove(self.pulse_file)
         self.sos_dict = sos_dict
-        with open(self.pulse_file, "a") as pd:
-            pd.write(
-                "#time\tproc_cpu\tproc_mem\tchildren\tchildren_cpu\tchildren_mem\n"
-            )
+        init_pulse_file(self.pulse_file)
 
     def _check(self):
         current_process = psutil.Process(self.pid)
@@ -286,36 +764,15 @@ class WorkflowMonitor(threading.Thread):
 
 
 def summarizeExecution(task_id, pulses, status="Unknown"):
-    peak_cpu = 0
-    accu_cpu = 0
-    peak_mem = 0
-    accu_mem = 0
-    peak_nch = 0
-    start_time = None
-    end_time = None
-    count = 0
-    for line in pulses.splitlines():
-        if line.startswith("#"):
-            continue
-        try:
-            t, c, m, nch, cc, cm = line.split()
-        except Exception as e:
-            env.logger.warning(
-                f'Unrecognized resource line "{line.strip()}": {e}')
-        if start_time is None:
-            start_time = float(t)
-            end_time = float(t)
-        else:
-            end_time = float(t)
-        accu_cpu += float(c) + float(cc)
-        accu_mem += float(m) + float(cm)
-        count += 1
-        if float(c) + float(cc) > peak_cpu:
-            peak_cpu = float(c) + float(cc)
-        if float(m) + float(cm) > peak_mem:
-            peak_mem = float(m) + float(cm)
-        if int(nch) > peak_nch:
-            peak_nch = int(nch)
+    summary = pulse_summary(pulses)
+    start_time = summary["start_time"]
+    end_time = summary["end_time"]
+    count = summary["samples"]
+    peak_cpu = summary["peak_cpu"]
+    peak_mem = summary["peak_mem"]
+    peak_nch = summary["peak_nch"]
+    accu_cpu = summary["total_cpu"]
+    accu_mem = summary["total_mem"]
     try:
         second_elapsed = end_time - start_time
     except Exception:
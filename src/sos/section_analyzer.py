@@ -4,16 +4,22 @@
 # Distributed under the terms of the 3-clause BSD License.
 
 import ast
+import atexit
+import os
+import pickle
+import sqlite3
+import time
 from collections.abc import Mapping, Sequence
 from typing import Any, Dict, Optional
 
+from ._version import __version__
 from .eval import SoS_eval, SoS_exec, accessed_vars, used_in_func
 from .executor_utils import __null_func__, prepare_env, strip_param_defs
 from .parser import SoS_Step
 from .syntax import SOS_TARGETS_OPTIONS
 from .targets import (dynamic, file_target, named_output, remote, sos_step,
                       sos_targets)
-from .utils import env
+from .utils import env, textMD5
 
 # imported for eval, assert to reduce warning
 assert file_target
@@ -416,7 +422,7 @@ def get_step_input(section, default_input):
     return step_input, dynamic_input
 
 
-def get_step_output(section, default_output, analysis_type):
+def get_step_output(section, default_output, analysis_type, output_args=None):
     """determine step output"""
     #
     # There are three analysis_style:
@@ -452,7 +458,7 @@ def get_step_output(section, default_output, analysis_type):
     # # the exact output either. We just need to check if there are other
     # # named output
     n_args, name_kwargs = get_num_of_args_and_names_of_kwargs(
-        section.statements[output_idx][2])
+        section.statements[output_idx][2]) if output_args is None else output_args
     name_kwargs = [x for x in name_kwargs if x not in SOS_TARGETS_OPTIONS]
     if name_kwargs:
         step_output.extend([named_output(x) for x in name_kwargs])
@@ -609,7 +615,185 @@ def get_output_from_steps(stmt, last_step):
     return [x for x in res if x is not None]
 
 
-# analysis_cache = {}
+class StaticAnalysisCache(object):
+    """A cache of the parts of section analysis that depend only on the content
+    of sections (variables used by the section and its signature, and names
+    and number of arguments of output statements), which are kept in memory
+    and in a database shared by all SoS processes on the same machine so
+    that the analysis of large scripts is not repeated by every run."""
+
+    _db_structure = [
+        """CREATE TABLE IF NOT EXISTS analysis (
+            key text PRIMARY KEY,
+            result blob,
+            created real
+        )""",
+        "CREATE INDEX IF NOT EXISTS analysis_created ON analysis (created)",
+    ]
+
+    def __init__(self, db_file=None, max_entries=100000):
+        # the default database is located when it is first used because
+        # HOME can be changed after the module is imported
+        self._db_file = db_file
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._pid = None
+        self._results = {}
+        self._inserted = {}
+        # the database is not used if it cannot be opened
+        self.disabled = False
+        atexit.register(self.flush)
+
+    def _get_db_file(self):
+        if self._db_file is None:
+            return os.path.join(os.path.expanduser("~"), ".sos", "workflows", "section_analysis.db")
+        return self._db_file
+
+    db_file = property(_get_db_file)
+
+    def _get_conn(self):
+        # a connection cannot be shared by forked processes
+        if self._pid != os.getpid():
+            self._conn = None
+            self._inserted = {}
+            self._pid = os.getpid()
+        if self._conn is None:
+            if self.disabled or not env.config.get("analysis_cache", True):
+                return None
+            try:
+                self._conn = sqlite3.connect(self.db_file, timeout=60)
+                for stmt in self._db_structure:
+                    self._conn.execute(stmt)
+                self._conn.commit()
+            except Exception as e:
+                self._conn = None
+                self.disabled = True
+                env.logger.debug(f"Section analysis cache {self.db_file} is disabled: {e}")
+        return self._conn
+
+    def get(self, key):
+        """Return cached static analysis of a section, or None"""
+        if key in self._results:
+            self.hits += 1
+            return self._results[key]
+        res = None
+        try:
+            conn = self._get_conn()
+            if conn is not None:
+                res = conn.execute("SELECT result FROM analysis WHERE key=?", (key,)).fetchone()
+            if res is not None:
+                res = pickle.loads(res[0])
+        except Exception as e:
+            env.logger.debug(f"Failed to read section analysis cache: {e}")
+            res = None
+        if res is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._results[key] = res
+        return res
+
+    def set(self, key, result):
+        self._results[key] = result
+        if self._get_conn() is None:
+            return
+        self._inserted[key] = (pickle.dumps(result), time.time())
+        if len(self._inserted) >= 100:
+            self.flush()
+
+    def flush(self):
+        """Write analysis of new sections to the database"""
+        if not self._inserted or self._conn is None or self._pid != os.getpid():
+            return
+        try:
+            conn = self._conn
+            conn.executemany("INSERT OR REPLACE INTO analysis VALUES (?, ?, ?)",
+                             [(x,) + y for x, y in self._inserted.items()])
+            self._inserted = {}
+            count = conn.execute("SELECT COUNT(*) FROM analysis").fetchone()[0]
+            if count > self.max_entries:
+                conn.execute(
+                    "DELETE FROM analysis WHERE rowid IN (SELECT rowid FROM analysis ORDER BY created LIMIT ?)",
+                    (count - self.max_entries,))
+            conn.commit()
+        except Exception as e:
+            env.logger.debug(f"Failed to update section analysis cache: {e}")
+
+    def clear(self):
+        self._results.clear()
+        self._inserted = {}
+        self.hits = 0
+        self.misses = 0
+        try:
+            conn = self._get_conn()
+            if conn is not None:
+                conn.execute("DELETE FROM analysis")
+                conn.commit()
+        except Exception as e:
+            env.logger.debug(f"Failed to clear section analysis cache: {e}")
+
+
+static_analysis_cache = StaticAnalysisCache()
+
+# Results of analyze_section, keyed by the content of the section, global
+# variables, default input and output, and context of the analysis. Because
+# statements of a section can depend on files that are created or removed by
+# other steps, the cache is cleared by the workflow executor each time it
+# starts to resolve targets of the DAG.
+analysis_cache = {}
+
+
+def clear_analysis_cache():
+    analysis_cache.clear()
+
+
+def get_static_analysis(section):
+    key = textMD5(
+        repr((
+            __version__,
+            section.step_name(),
+            section.statements,
+            section.task,
+            section.task_params,
+            section.global_stmts,
+            sorted(section.parameters.keys()),
+            sorted(section.global_parameters.keys()),
+        )))
+    res = static_analysis_cache.get(key)
+    if res is None:
+        output_idx = find_statement(section, "output")
+        res = {
+            "signature_vars":
+                get_signature_vars(section),
+            "all_used_vars":
+                get_all_used_vars(section),
+            "output_args":
+                None if output_idx is None else
+                get_num_of_args_and_names_of_kwargs(section.statements[output_idx][2]),
+        }
+        static_analysis_cache.set(key, res)
+    return key, res
+
+
+def _analysis_key(section, static_key, all_used_vars, default_input, default_output, context, analysis_type):
+    try:
+        # only global variables that are used by the section are kept in
+        # section.global_vars after analysis
+        dynamic_key = textMD5(
+            pickle.dumps((
+                {x: y for x, y in section.global_vars.items() if x in all_used_vars},
+                default_input,
+                default_output,
+                context,
+                env.config.get("workflow_args", None),
+                env.config.get("workflow_vars", None),
+            )))
+    except Exception:
+        # no cache if anything cannot be pickled
+        return None
+    return (static_key, repr(section.options), section.last_step, analysis_type, dynamic_key)
 
 
 def analyze_section(
@@ -621,13 +805,38 @@ def analyze_section(
 ) -> Dict[str, Any]:
     """Analyze a section for how it uses input and output, what variables
     it uses, and input, output, etc."""
+    static_key, static_res = get_static_analysis(section)
+    all_used_vars = static_res["all_used_vars"]
+
+    analysis_key = _analysis_key(section, static_key, all_used_vars, default_input, default_output, context,
+                                 analysis_type)
+    if analysis_key in analysis_cache:
+        # results are returned as new objects because they are modified by the executor
+        parameter_vars, res = analysis_cache[analysis_key]
+        env.parameter_vars |= parameter_vars
+        res = pickle.loads(res)
+    else:
+        parameter_vars = set(env.parameter_vars)
+        res = _analyze_section(section, default_input, default_output, context, analysis_type, static_res)
+        if analysis_key is not None:
+            try:
+                analysis_cache[analysis_key] = (env.parameter_vars - parameter_vars, pickle.dumps(res))
+            except Exception:
+                pass
+
+    # #1225
+    # The global section can contain a lot of variables, some of which can be large. Here we
+    # found all variables that will be used in the step, including ones used in substep (signature_vars)
+    # and ones that will be used in input statement etc.
+    section.global_vars = {
+        x: y
+        for x, y in section.global_vars.items()
+        if x in all_used_vars
+    }
+    return res
 
-    # analysis_key = (section.md5, section.step_name(),
-    #     default_input.target_name() if hasattr(default_input, 'target_name') else '',
-    #     default_output.target_name() if hasattr(default_output, 'target_name') else '', vars_and_output_only)
-    # if analysis_key in analysis_cache:
-    #    return analysis_cache[analysis_key]
 
+def _analyze_section(section, default_input, default_output, context, analysis_type, static_res):
     # use a fresh env for analysis
     new_env, old_env = env.request_new()
     try:
@@ -646,12 +855,12 @@ def analyze_section(
             "step_name":
                 section.step_name(),
             "step_output":
-                get_step_output(section, default_output, analysis_type),
+                get_step_output(section, default_output, analysis_type, static_res["output_args"]),
             # variables starting with __ are internals...
             "environ_vars":
                 get_environ_vars(section),
             "signature_vars":
-                get_signature_vars(section),
+                set(static_res["signature_vars"]),
             "changed_vars":
                 get_changed_vars(section),
         }
@@ -662,18 +871,7 @@ def analyze_section(
             deps = get_step_depends(section)
             res["step_depends"] = deps[0]
             res["dynamic_depends"] = deps[1]
-    # analysis_cache[analysis_key] = res
     finally:
         # restore env
         env.restore_to_old(new_env, old_env)
-
-    # #1225
-    # The global section can contain a lot of variables, some of which can be large. Here we
-    # found all variables that will be used in the step, including ones used in substep (signature_vars)
-    # and ones that will be used in input statement etc.
-    section.global_vars = {
-        x: y
-        for x, y in section.global_vars.items()
-        if x in get_all_used_vars(section)
-    }
     return res
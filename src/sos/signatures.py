@@ -3,38 +3,88 @@
 # Copyright (c) Bo Peng and the University of Texas MD Anderson Cancer Center
 # Distributed under the terms of the 3-clause BSD License.
 
-import lzma
 import os
 import pickle
 import sqlite3
+import time
+from urllib.request import pathname2url
 
-from .utils import env
+from .utils import compress_blob, decompress_blob, env
+
+JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF")
 
 
 class SignatureDB:
     """Base class for signature DB using sqlite"""
 
-    def __init__(self):
+    # version of the schema, which is saved as user_version of the database
+    # so that indexes are added to databases created by earlier versions
+    _db_version = 1
+    # cached records are written in one transaction when there are this
+    # number of records or when the first record has been cached for
+    # this number of seconds
+    _max_cached_records = 1000
+    _max_cache_time = 5
+
+    def __init__(self, read_only=False):
         self.db_file = os.path.join(env.exec_dir, self._db_name)
+        # a read only database is not created or upgraded, and does not
+        # block or wait for writers in WAL mode
+        self.read_only = read_only
         self._conn = None
         self._cache = []
+        self._cache_time = 0
+
+    def _connect(self):
+        if self.read_only:
+            if not os.path.isfile(self.db_file):
+                # nothing has been written
+                conn = sqlite3.connect(":memory:")
+                for statement in self._db_structure:
+                    conn.execute(statement)
+                return conn
+            return sqlite3.connect(
+                f"file:{pathname2url(os.path.abspath(self.db_file))}?mode=ro",
+                uri=True,
+                timeout=60)
+        conn = sqlite3.connect(self.db_file, timeout=60)
+        # WAL mode allows readers and writers from multiple sos processes
+        # to access the database at the same time
+        journal_mode = str(env.config.get("signature_journal_mode", "")).upper()
+        if journal_mode in JOURNAL_MODES:
+            try:
+                conn.execute(f"PRAGMA journal_mode={journal_mode}")
+                if journal_mode == "WAL":
+                    # commits in WAL mode do not have to wait for the disk,
+                    # and the database stays consistent after a crash
+                    conn.execute("PRAGMA synchronous=NORMAL")
+            except sqlite3.DatabaseError as e:
+                env.logger.debug(
+                    f"Failed to set journal mode of {self.db_file} to {journal_mode}: {e}")
+        if conn.execute("PRAGMA user_version").fetchone()[0] < self._db_version:
+            for statement in self._db_structure:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {self._db_version}")
+        conn.commit()
+        return conn
 
     def _get_conn(self):
         # there is a possibility that the _conn is copied with a process
         # and we would better have a fresh conn
         if self._conn is None:
-            self._conn = sqlite3.connect(self.db_file, timeout=60)
-            self._conn.execute(self._db_structure)
-            self._conn.commit()
+            self._conn = self._connect()
         if self._cache:
-            self._conn.executemany(self._write_query, self._cache)
+            with self._conn:
+                self._conn.executemany(self._write_query, self._cache)
             self._cache = []
-            self._conn.commit()
         return self._conn
 
     def _write(self, record):
+        if not self._cache:
+            self._cache_time = time.time()
         self._cache.append(record)
-        if len(self._cache) > 1000:
+        if (len(self._cache) >= self._max_cached_records or
+                time.time() - self._cache_time > self._max_cache_time):
             # this will tricky the action to clear cache
             self._get_conn()
 
@@ -52,14 +102,14 @@ class StepSignatures(SignatureDB):
     """Step signature that stores runtime signatures of substeps"""
 
     _db_name = "step_signatures.db"
-    _db_structure = """CREATE TABLE IF NOT EXISTS steps (
+    _db_structure = ("""CREATE TABLE IF NOT EXISTS steps (
         step_id text PRIMARY KEY,
         signature BLOB
-    )"""
+    )""",)
     _write_query = "INSERT OR REPLACE INTO steps VALUES (?, ?)"
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, read_only=False):
+        super().__init__(read_only)
 
     def get(self, step_id: str):
         try:
@@ -73,7 +123,7 @@ class StepSignatures(SignatureDB):
             return None
         if res:
             try:
-                return pickle.loads(lzma.decompress(res[0]))
+                return pickle.loads(decompress_blob(res[0]))
             except Exception as e:
                 env.logger.warning(
                     f"Failed to load signature for step {step_id}: {e}")
@@ -83,8 +133,9 @@ class StepSignatures(SignatureDB):
 
     def set(self, step_id: str, signature: dict):
         try:
-            self._write((step_id, lzma.compress(pickle.dumps(signature))))
-        except sqlite3.DatabaseError as e:
+            self._write((step_id,
+                         compress_blob(pickle.dumps(signature), env.config["signature_codec"] or "zlib")))
+        except (sqlite3.DatabaseError, ValueError) as e:
             env.logger.warning(
                 f"Failed to set step signature for step {step_id}: {e}")
 
@@ -121,16 +172,20 @@ class WorkflowSignatures(SignatureDB):
     """Workflow signature to store runtime information for workflows"""
 
     _db_name = "workflow_signatures.db"
-    _db_structure = """CREATE TABLE IF NOT EXISTS workflows (
+    _db_structure = (
+        """CREATE TABLE IF NOT EXISTS workflows (
             master_id text,
             entry_type text,
             id text,
             item text
-    )"""
+    )""",
+        "CREATE INDEX IF NOT EXISTS workflows_master_id ON workflows (master_id, entry_type)",
+        "CREATE INDEX IF NOT EXISTS workflows_entry_type ON workflows (entry_type, master_id)",
+    )
     _write_query = "INSERT INTO workflows VALUES (?, ?, ?, ?)"
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, read_only=False):
+        super().__init__(read_only)
 
     def write(self, entry_type: str, id: str, item: str):
         try:
@@ -168,7 +223,7 @@ class WorkflowSignatures(SignatureDB):
         try:
             cur = self.conn.cursor()
             cur.execute(
-                'SELECT DISTINCT id FROM workflows WHERE entry_type = "task"')
+                "SELECT DISTINCT id FROM workflows WHERE entry_type = 'task'")
             return [x[0] for x in cur.fetchall()]
         except sqlite3.DatabaseError as e:
             env.logger.warning(
@@ -180,7 +235,7 @@ class WorkflowSignatures(SignatureDB):
         try:
             cur = self.conn.cursor()
             cur.execute(
-                'SELECT id, item FROM workflows WHERE entry_type = "tracked_files"'
+                "SELECT id, item FROM workflows WHERE entry_type = 'tracked_files'"
             )
             return [(x[0], eval(x[1])) for x in cur.fetchall()]
         except sqlite3.DatabaseError as e:
@@ -193,11 +248,12 @@ class WorkflowSignatures(SignatureDB):
             cur = self.conn.cursor()
             if workflow_id is None:
                 cur.execute(
-                    'SELECT item FROM workflows WHERE entry_type = "placeholder"'
+                    "SELECT item FROM workflows WHERE entry_type = 'placeholder'"
                 )
             else:
                 cur.execute(
-                    f'SELECT item FROM workflows WHERE entry_type = "placeholder" AND master_id = "{workflow_id}"'
+                    "SELECT item FROM workflows WHERE entry_type = 'placeholder' AND master_id = ?",
+                    (workflow_id,),
                 )
             return [x[0] for x in cur.fetchall()]
         except sqlite3.DatabaseError as e:
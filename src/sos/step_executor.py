@@ -9,7 +9,7 @@ import os
 import subprocess
 import sys
 import time
-from collections import defaultdict
+from collections import defaultdict, deque
 from collections.abc import Mapping, Sequence
 from typing import List
 
@@ -20,7 +20,7 @@ from .eval import KeepOnlyImportAndDefine, SoS_eval, SoS_exec, accessed_vars
 from .executor_utils import (ExecuteError, __named_output__, __null_func__, __output_from__, __traced__, clear_output,
                              create_task, get_traceback_msg, reevaluate_output, statementMD5, validate_step_sig,
                              verify_input)
-from .messages import decode_msg, encode_msg
+from .messages import decode_msg, encode_msg, intern_value
 from .syntax import (SOS_DEPENDS_OPTIONS, SOS_INPUT_OPTIONS, SOS_OUTPUT_OPTIONS, SOS_TARGETS_OPTIONS)
 from .targets import (RemovedTarget, RuntimeInfo, UnavailableLock, UnknownTarget, dynamic, file_target, invalid_target,
                       sos_step, sos_targets, sos_variable)
@@ -246,6 +246,24 @@ def parse_shared_vars(option):
     return shared_vars
 
 
+def get_max_pending_substeps(concurrent):
+    """Number of substeps that can be submitted before earlier substeps are
+    completed, which is enough for all workers to receive full batches of
+    substeps unless a limit is set by option concurrent"""
+    if not isinstance(concurrent, bool):
+        return concurrent
+    worker_procs = env.config.get("worker_procs") or []
+    if isinstance(worker_procs, (int, str)):
+        worker_procs = [str(worker_procs)]
+    default_workers = min(max(os.cpu_count() // 2, 2), 8)
+    n_workers = 0
+    for worker_proc in worker_procs:
+        n_procs = str(worker_proc).rsplit(":", 1)[-1]
+        n_workers += int(n_procs) if n_procs.isdigit() else default_workers
+    batch_size = env.config.get("max_substep_batch", 1) or 1
+    return max(100, 2 * (n_workers or default_workers) * batch_size)
+
+
 def evaluate_shared(vars, option):
     # handle option shared and store variables in a "__shared_vars" variable
     shared_vars = {}
@@ -341,6 +359,8 @@ class Base_Step_Executor:
         self.step = step
         self.task_manager = None
         self.exec_error = ExecuteError(self.step.step_name())
+        # values of variables that have been compared to global variables
+        self._global_var_checks = {}
 
     #
     #  Functions that should be redefined in derived class
@@ -467,8 +487,8 @@ class Base_Step_Executor:
 
         if ifiles._num_groups() == 0:
             ifiles._group("all")
-        #
-        return ifiles.groups
+        # input groups are created when substeps are executed
+        return ifiles._lazy_groups()
 
     def verify_dynamic_targets(self, target):
         yield None
@@ -728,9 +748,75 @@ class Base_Step_Executor:
         local_ip = get_localhost_ip()
         port = self.result_pull_socket.bind_to_random_port(f"tcp://{local_ip}")
         env.config["sockets"]["result_push_socket"] = f"tcp://{local_ip}:{port}"
+        # substeps to be sent to the controller in batches. The first substep
+        # is sent alone and batches grow to max_substep_batch so that workers
+        # can start while later substeps are being prepared.
+        self._pending_substeps = []
+        self._substep_batch_size = 1
+        # substeps are created only when fewer than this number of substeps
+        # are waiting for results
+        self._max_pending_substeps = get_max_pending_substeps(self.concurrent_substep)
+        # results returned in batches but not yet processed
+        self._returned_substep_results = deque()
+        # global definitions are not modified by substeps so workers can
+        # execute them once for all substeps
+        self._interned_global_def = intern_value(self.step.global_def, shared=True)
+        # 1225: the step might contain large variables from global section, but
+        # we do not have to sent them if they are not used in substeps.
+        self._shipped_global_vars = {
+            x: y
+            for x, y in self.step.global_vars.items()
+            if x in env.sos_dict["__signature_vars__"] or x in env.sos_dict["__environ_vars__"]
+        }
+        self._interned_global_vars = intern_value(self._shipped_global_vars)
+        self._interned_config = intern_value(env.config)
+        # task and task_params are interned again only if they are changed
+        self._interned_task = {}
+
+    def intern_task_value(self, name, value):
+        if name not in self._interned_task or self._interned_task[name][0] is not value:
+            self._interned_task[name] = (value, intern_value(value))
+        return self._interned_task[name][1]
+
+    def has_global_value(self, name):
+        """Test if variable name has the same value as the global variable
+        so that it does not have to be sent to substeps with proc_vars"""
+        if name not in self.step.global_vars or name not in env.sos_dict:
+            return False
+        value = env.sos_dict[name]
+        if name in self._global_var_checks and self._global_var_checks[name][0] is value:
+            return self._global_var_checks[name][1]
+        try:
+            same = value is self.step.global_vars[name] or bool(value == self.step.global_vars[name])
+        except Exception:
+            same = False
+        self._global_var_checks[name] = (value, same)
+        return same
 
     def submit_substep(self, param):
-        send_message_to_controller(["substep", param])
+        # substeps are sent in batches, which are flushed before waiting for results
+        self._pending_substeps.append(param)
+        if len(self._pending_substeps) >= self._substep_batch_size:
+            self.flush_substeps()
+
+    def flush_substeps(self):
+        if not self._pending_substeps:
+            return
+        if len(self._pending_substeps) == 1:
+            send_message_to_controller(["substep", self._pending_substeps[0]])
+        else:
+            send_message_to_controller(["substeps", self._pending_substeps])
+        self._pending_substeps = []
+        self._substep_batch_size = min(self._substep_batch_size * 2, env.config.get("max_substep_batch", 1) or 1)
+
+    def receive_substep_result(self):
+        if not self._returned_substep_results:
+            self.flush_substeps()
+            yield self.result_pull_socket
+            res = decode_msg(self.result_pull_socket.recv())
+            # results of batched substeps are returned as a list
+            self._returned_substep_results.extend(res if isinstance(res, list) else [res])
+        return self._returned_substep_results.popleft()
 
     def process_returned_substep_result(self, till=None, wait=True):
         while True:
@@ -738,11 +824,11 @@ class Base_Step_Executor:
                 # 1213
                 cur_index = env.sos_dict["_index"]
                 pending_substeps = cur_index - self._completed_concurrent_substeps + 1
-                if pending_substeps < (100 if isinstance(self.concurrent_substep, bool) else self.concurrent_substep):
-                    if not self.result_pull_socket.poll(0):
+                if pending_substeps < self._max_pending_substeps:
+                    if not self._returned_substep_results and not self.result_pull_socket.poll(0):
                         return
                 elif ("STEP" in env.config["SOS_DEBUG"] or "ALL" in env.config["SOS_DEBUG"]):
-                    # if there are more than 100 pending substeps
+                    # if there are too many pending substeps
                     # we wait indefinitely for the results
                     env.log_to_file(
                         "STEP",
@@ -750,8 +836,7 @@ class Base_Step_Executor:
                     )
             elif self._completed_concurrent_substeps == till:
                 return
-            yield self.result_pull_socket
-            res = decode_msg(self.result_pull_socket.recv())
+            res = yield from self.receive_substep_result()
             if "exception" in res:
                 if isinstance(res["exception"], ProcessKilled):
                     raise res["exception"]
@@ -775,8 +860,7 @@ class Base_Step_Executor:
                         f'``{self.step.step_name(True)}`` {idx_msg} returns an error.{f" Terminating step after completing {waiting} submitted substeps." if waiting else " Terminating now."}'
                     )
                     for _ in range(waiting):
-                        yield self.result_pull_socket
-                        res = decode_msg(self.result_pull_socket.recv())
+                        res = yield from self.receive_substep_result()
                         if "exception" in res:
                             self.exec_error.append(f'index={res["index"]}', res["exception"])
                     raise self.exec_error
@@ -798,9 +882,18 @@ class Base_Step_Executor:
                     # been skipped.
                     self.proc_results[res["index"]] = res
             else:
+                if res["ret_code"] == 0 and "output" in res:
+                    # output of completed substeps is kept once, as the
+                    # output of the substep, instead of also in the results
+                    self.output_groups[res["index"]] = res.pop("output")
                 self.proc_results[res["index"]] = res
             self._completed_concurrent_substeps += 1
 
+    def substep_results(self, groups):
+        """Output or depends of all substeps, with empty targets for substeps
+        that do not have them"""
+        return (groups[idx] if idx in groups else sos_targets([]) for idx in range(len(self._substeps)))
+
     def wait_for_substep(self):
         while self._completed_concurrent_substeps < len(self.proc_results):
             try:
@@ -1028,19 +1121,21 @@ class Base_Step_Executor:
                 "__num_groups__",
                 "__signature_vars__",
             })
+        # global variables that are not changed by the step are sent with global_vars
+        proc_vars = {x for x in proc_vars if x not in self._shipped_global_vars or not self.has_global_value(x)}
         self.proc_results[env.sos_dict["_index"]] = {}
+        # values that are the same for all substeps are interned so that they are
+        # sent only once to each worker
         self.submit_substep({
             'stmt': statement[1],
-            'global_def': self.step.global_def,
-            # 1225: the step might contain large variables from global section, but
-            # we do not have to sent them if they are not used in substeps.
+            'global_def': self._interned_global_def,
             'cwd': os.getcwd(),
-            'global_vars': {x: y for x, y in self.step.global_vars.items() if x in env.sos_dict["__signature_vars__"]},
-            'task': self.step.task,
-            'task_params': self.step.task_params,
+            'global_vars': self._interned_global_vars,
+            'task': self.intern_task_value('task', self.step.task),
+            'task_params': self.intern_task_value('task_params', self.step.task_params),
             'proc_vars': env.sos_dict.clone_selected_vars(proc_vars),
             'shared_vars': self.vars_to_be_shared,
-            'config': env.config,
+            'config': self._interned_config,
         })
 
     def check_task_sig(self):
@@ -1104,9 +1199,9 @@ class Base_Step_Executor:
 
         # now that output is settled, we can write remaining signatures
         for idx, res in self.proc_results.items():
-            if (self.pending_signatures[idx] is not None and res["ret_code"] == 0 and "sig_skipped" not in res):
+            if (self.pending_signatures.get(idx) is not None and res["ret_code"] == 0 and "sig_skipped" not in res):
                 # task might return output with vars #1355
-                self.pending_signatures[idx].set_output(self.output_groups[idx])
+                self.pending_signatures[idx].set_output(self.output_groups.get(idx, sos_targets([])))
                 self.pending_signatures[idx].write()
             if res["ret_code"] != 0 and "output" in res:
                 clear_output(output=res["output"])
@@ -1258,7 +1353,9 @@ class Base_Step_Executor:
                             step_def = KeepOnlyImportAndDefine().visit(ast.parse(statement[1]))
                             if step_def.body:
                                 if isinstance(self.step.global_def, ast.Module):
-                                    self.step.global_def.body.extend(step_def.body)
+                                    # global_def is shared by all steps so it is not changed in place
+                                    self.step.global_def = ast.Module(
+                                        body=self.step.global_def.body + step_def.body, type_ignores=[])
                                 else:
                                     self.step.global_def = step_def
                         self.execute(statement[1])
@@ -1323,7 +1420,7 @@ class Base_Step_Executor:
         elif env.sos_dict["step_input"].groups:
             # if default has groups...
             # default case
-            self._substeps = env.sos_dict["step_input"].groups
+            self._substeps = env.sos_dict["step_input"]._lazy_groups()
             # assuming everything starts from 0 is after input
             input_statement_idx = 0
         else:
@@ -1341,17 +1438,18 @@ class Base_Step_Executor:
             for x in self.vars_to_be_shared
             if x not in ("step_", "step_input", "step_output", "step_depends")
         ])
-        self.shared_vars = [{} for x in self._substeps]
+        # results of substeps are kept only for substeps that set them so
+        # that memory usage does not grow with the number of substeps
+        self.shared_vars = defaultdict(dict)
         # run steps after input statement, which will be run multiple times for each input
         # group.
         env.sos_dict.set("__num_groups__", len(self._substeps))
 
         # determine if a single index or the whole step should be skipped
         skip_index = False
-        # signatures of each index, which can remain to be None if no output
-        # is defined.
-        self.output_groups = [sos_targets([]) for x in self._substeps]
-        self.depends_groups = [sos_targets([]) for x in self._substeps]
+        # output and depends of substeps that have them, by index
+        self.output_groups = {}
+        self.depends_groups = {}
 
         # used to prevent overlapping output from substeps
         self._all_outputs = set()
@@ -1377,7 +1475,7 @@ class Base_Step_Executor:
             self.completed["__substep_completed__"] = len(self._substeps)
             self._completed_concurrent_substeps = 0
             # pending signatures are signatures for steps with external tasks
-            self.pending_signatures = [None for x in self._substeps]
+            self.pending_signatures = {}
 
             for idx, g in enumerate(self._substeps):
                 #
@@ -1770,13 +1868,14 @@ class Base_Step_Executor:
             # finalize output from output_groups because some output might be skipped
             # this is the final version of the output but we do maintain output
             # during the execution of step, for compatibility.
-            env.sos_dict.set("step_output", sos_targets([])._add_groups(self.output_groups))
-            env.sos_dict.set("step_depends", sos_targets([])._add_groups(self.depends_groups))
+            env.sos_dict.set("step_output", sos_targets([])._add_groups(self.substep_results(self.output_groups)))
+            env.sos_dict.set("step_depends", sos_targets([])._add_groups(self.substep_results(self.depends_groups)))
 
             # if there exists an option shared, the variable would be treated as
             # provides=sos_variable(), and then as step_output
             if "shared" in self.step.options:
-                self.shared_vars = evaluate_shared(self.shared_vars, self.step.options["shared"])
+                self.shared_vars = evaluate_shared(
+                    [self.shared_vars[idx] for idx in range(len(self._substeps))], self.step.options["shared"])
                 env.sos_dict.quick_update(self.shared_vars)
             missing = self.verify_output()
             self.log(
@@ -99,18 +99,6 @@ def execute_substep(
     assert "_index" in proc_vars
     assert "result_push_socket" in config["sockets"]
 
-    # this should not happen but check nevertheless
-    if (env.result_socket_port is not None and
-            env.result_socket_port != config["sockets"]["result_push_socket"]):
-        close_socket(env.result_socket)
-        env.result_socket = None
-
-    if env.result_socket is None:
-        env.result_socket = create_socket(env.zmq_context, zmq.PUSH)
-        env.result_socket_port = config["sockets"]["result_push_socket"]
-        # the result_socket_port contains IP of the worker that request the substep
-        env.result_socket.connect(env.result_socket_port)
-
     res = _execute_substep(
         stmt=stmt,
         global_def=global_def,
@@ -122,7 +110,46 @@ def execute_substep(
         config=config,
         cwd=cwd,
     )
-    env.result_socket.send(encode_msg(res))
+    _get_result_socket(config["sockets"]["result_push_socket"]).send(
+        encode_msg(res))
+
+
+def execute_substeps(substeps):
+    """Execute a batch of substeps (keyword arguments of execute_substep) one
+    after another. Results are sent back as a list for each step, namely
+    each result_push_socket, after all substeps are completed."""
+    results = {}
+    for substep in substeps:
+        assert "result_push_socket" in substep["config"]["sockets"]
+        res = _execute_substep(
+            stmt=substep["stmt"],
+            global_def=substep["global_def"],
+            global_vars=substep["global_vars"],
+            task=substep.get("task", ""),
+            task_params=substep.get("task_params", ""),
+            proc_vars=substep.get("proc_vars", {}),
+            shared_vars=substep.get("shared_vars", []),
+            config=substep["config"],
+            cwd=substep.get("cwd", None),
+        )
+        results.setdefault(substep["config"]["sockets"]["result_push_socket"],
+                           []).append(res)
+    for port, res in results.items():
+        _get_result_socket(port).send(encode_msg(res))
+
+
+def _get_result_socket(port):
+    # substeps of different steps return results to different sockets
+    if env.result_socket_port is not None and env.result_socket_port != port:
+        close_socket(env.result_socket)
+        env.result_socket = None
+
+    if env.result_socket is None:
+        env.result_socket = create_socket(env.zmq_context, zmq.PUSH)
+        env.result_socket_port = port
+        # the result_socket_port contains IP of the worker that request the substep
+        env.result_socket.connect(env.result_socket_port)
+    return env.result_socket
 
 
 def _execute_substep(stmt, global_def, global_vars, task, task_params,
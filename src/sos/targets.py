@@ -11,7 +11,9 @@ import shlex
 import shutil
 import subprocess
 import sys
-from collections.abc import Iterable, Sequence
+from collections import defaultdict
+from collections.abc import Iterable, MutableSequence, Sequence
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from itertools import combinations, tee
 from pathlib import Path, PosixPath, WindowsPath
@@ -25,8 +27,8 @@ from .controller import (request_answer_from_controller,
                          send_message_to_controller)
 from .eval import get_config, interpolate
 from .pattern import extract_pattern
-from .utils import (Error, env, fileMD5, objectMD5, pickleable, short_repr,
-                    stable_repr, textMD5)
+from .utils import (Error, env, fileMD5, file_signature_cache, objectMD5,
+                    pickleable, short_repr, stable_repr, textMD5)
 
 __all__ = ["dynamic", "executable", "env_variable", "sos_variable"]
 
@@ -134,6 +136,10 @@ class BaseTarget(object):
         return self._dict.get(name, default)
 
     def __getattr__(self, name):
+        if name == "_dict":
+            # _dict is not set when the object is being unpickled
+            raise AttributeError(
+                f"{self.__class__.__name__} object has no attribute {name}")
         try:
             return self._dict[name]
         except Exception as e:
@@ -888,6 +894,107 @@ class file_target(path, BaseTarget):
         ])
 
 
+_sig_pool = None
+_sig_pool_key = None
+
+
+def _get_sig_pool():
+    global _sig_pool
+    global _sig_pool_key
+    # threads of a pool do not survive fork so a forked process needs a new pool
+    key = (os.getpid(), max(1, int(env.config.get("sig_threads", None) or 1)))
+    if _sig_pool is None or _sig_pool_key != key:
+        if _sig_pool is not None and _sig_pool_key[0] == key[0]:
+            _sig_pool.shutdown(wait=False)
+        _sig_pool = ThreadPoolExecutor(max_workers=key[1], thread_name_prefix="sos_sig")
+        _sig_pool_key = key
+    return _sig_pool
+
+
+def _call_or_exception(func, *args):
+    try:
+        return func(*args)
+    except Exception as e:
+        return e
+
+
+def batch_call(func, targets, *args):
+    """Call func(target, *arg) for each target and items of args and return
+    the results in the order of targets. Exceptions raised by func are returned
+    in place of results. Calls on file targets are made from a pool of
+    env.config["sig_threads"] threads because hashing releases the GIL and
+    reading multiple files concurrently helps on network file systems. Other
+    targets (e.g. R_library that might install packages) are handled in the
+    calling thread."""
+    items = list(zip(targets, *args))
+    results = [None] * len(items)
+    in_pool = []
+    for idx, item in enumerate(items):
+        if isinstance(item[0], file_target):
+            in_pool.append(idx)
+        else:
+            results[idx] = _call_or_exception(func, *item)
+    if len(in_pool) <= 1 or (env.config.get("sig_threads", None) or 1) <= 1:
+        for idx in in_pool:
+            results[idx] = _call_or_exception(func, *items[idx])
+    else:
+        for idx, res in zip(
+                in_pool,
+                _get_sig_pool().map(
+                    lambda idx: _call_or_exception(func, *items[idx]),
+                    in_pool)):
+            results[idx] = res
+    # signatures calculated in this batch are made available to other processes
+    if in_pool:
+        file_signature_cache.flush()
+    return results
+
+
+def _batch_call_with_remote(query, func, targets):
+    # remote targets on the same host are queried in one request to the
+    # host, and other targets are handled by batch_call
+    targets = list(targets)
+    results = [None] * len(targets)
+    hosts = defaultdict(list)
+    for idx, target in enumerate(targets):
+        if isinstance(target, remote) and (target._host or env.config["default_queue"]):
+            hosts[target._host if target._host else env.config["default_queue"]].append(idx)
+    for host, indexes in hosts.items():
+        try:
+            from .hosts import Host
+
+            h = Host(host)
+            res = (h.batch_target_exists if query == "exists" else h.batch_target_signature)(
+                [sos_targets(targets[idx]._target) for idx in indexes])
+        except Exception as e:
+            env.logger.debug(f"Failed to check {query} of remote targets on {host}: {e}")
+            res = [True if query == "exists" else textMD5(targets[idx].target_name()) for idx in indexes]
+        for idx, r in zip(indexes, res):
+            results[idx] = r
+    queried = {idx for indexes in hosts.values() for idx in indexes}
+    others = [idx for idx in range(len(targets)) if idx not in queried]
+    for idx, r in zip(others, batch_call(func, [targets[idx] for idx in others])):
+        results[idx] = r
+    return results
+
+
+def batch_target_signature(targets):
+    """Return signatures of targets, or exceptions for targets whose signatures
+    cannot be calculated, in the order of targets."""
+    return _batch_call_with_remote("signature", lambda x: x.target_signature(), targets)
+
+
+def batch_validate(targets, sigs):
+    """Validate targets against signatures and return a list of True, False or
+    exceptions in the order of targets."""
+    return batch_call(lambda x, sig: x.validate(sig), targets, sigs)
+
+
+def batch_target_exists(targets, mode="any"):
+    """Return a list of True, False or exceptions for the existence of targets"""
+    return _batch_call_with_remote("exists", lambda x: x.target_exists(mode), targets)
+
+
 class sos_tempfile(file_target):
 
     def __new__(cls, path=None, name=None, suffix=None, prefix=None, dir=None):
@@ -1003,12 +1110,114 @@ class paths(Sequence, os.PathLike):
         return self.__format__("")
 
 
+class _TargetList(MutableSequence):
+    """A list of targets of sos_targets. File targets that are created from
+    names (strings, paths and patterns) are saved as interned strings, and
+    file_target objects are created only when they are accessed, so a large
+    number of files uses much less memory and is pickled and copied much
+    faster. Targets can be copied between lists (e.g. to groups) without
+    being created."""
+
+    __slots__ = ("_items",)
+
+    # compact storage can be disabled with environment variable
+    # SOS_COMPACT_TARGETS=0, mostly for benchmarking
+    compact = os.environ.get("SOS_COMPACT_TARGETS", "1") != "0"
+
+    def __init__(self, items=None):
+        self._items = [] if items is None else items
+
+    def add_names(self, names):
+        """Add file targets with names"""
+        if self.compact:
+            self._items.extend(sys.intern(x) if isinstance(x, str) else sys.intern(str(x)) for x in names)
+        else:
+            self._items.extend(file_target(x) for x in names)
+
+    def take(self, indexes):
+        """Return a list of targets at indexes"""
+        if isinstance(indexes, range) and indexes.step == 1:
+            return _TargetList(self._items[indexes.start:indexes.stop])
+        items = self._items
+        return _TargetList([items[x] for x in indexes])
+
+    def objects(self):
+        """Return index and targets that have been created as objects"""
+        return [(idx, x) for idx, x in enumerate(self._items) if x.__class__ is not str]
+
+    def instance_of(self, types):
+        """Return if each target is an instance of types, without creating
+        file targets"""
+        is_file = issubclass(file_target, types)
+        return [is_file if x.__class__ is str else isinstance(x, types) for x in self._items]
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return _TargetList(self._items[i])
+        item = self._items[i]
+        if item.__class__ is str:
+            item = self._items[i] = file_target(item)
+        return item
+
+    def __iter__(self):
+        items = self._items
+        for idx, item in enumerate(items):
+            if item.__class__ is str:
+                item = items[idx] = file_target(item)
+            yield item
+
+    def __setitem__(self, i, value):
+        self._items[i] = list(value) if isinstance(i, slice) else value
+
+    def __delitem__(self, i):
+        del self._items[i]
+
+    def insert(self, i, value):
+        self._items.insert(i, value)
+
+    def append(self, value):
+        self._items.append(value)
+
+    def extend(self, values):
+        self._items.extend(values._items if isinstance(values, _TargetList) else values)
+
+    def __add__(self, other):
+        ret = _TargetList(list(self._items))
+        ret.extend(other)
+        return ret
+
+    def __eq__(self, other):
+        if not isinstance(other, (_TargetList, list)) or len(self) != len(other):
+            return False
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def __reduce__(self):
+        return (_TargetList, (self._items,))
+
+
+def _as_target_list(targets):
+    return targets if isinstance(targets, _TargetList) else _TargetList(list(targets))
+
+
+def _target_key(target):
+    # file targets are equal if they have the same absolute path
+    return (file_target, os.path.abspath(target)) if isinstance(
+        target, file_target) else target
+
+
 class _sos_group(BaseTarget):
     """A type that is similar to sos_targets but saves index of objects """
 
     def __init__(self, indexes, labels=None, parent=None):
         super().__init__()
-        self._indexes = list(indexes)
+        # a range of indexes is kept as a range until it is extended
+        self._indexes = indexes if isinstance(indexes, range) else list(indexes)
         if labels is not None:
             if isinstance(labels, str):
                 self._labels = [labels] * len(indexes)
@@ -1024,6 +1233,8 @@ class _sos_group(BaseTarget):
     def add_last(self, n, parent):
         # add the last n elements of parent to group
         # this has to be called after the elements have been appended
+        if isinstance(self._indexes, range):
+            self._indexes = list(self._indexes)
         self._indexes.extend(
             range(len(parent._targets) - n, len(parent._targets)))
         self._labels.extend(parent._labels[len(parent._targets) -
@@ -1031,6 +1242,8 @@ class _sos_group(BaseTarget):
         return self
 
     def extend(self, grp, start, parent):
+        if isinstance(self._indexes, range):
+            self._indexes = list(self._indexes)
         self._indexes.extend([x + start for x in grp._indexes])
         self._labels.extend([parent._labels[x + start] for x in grp._indexes])
         self._dict.update(grp._dict)
@@ -1041,7 +1254,7 @@ class _sos_group(BaseTarget):
 
     def idx_to_targets(self, parent):
         ret = sos_targets([])
-        ret._targets = [parent._targets[x] for x in self._indexes]
+        ret._targets = parent._targets.take(self._indexes)
         ret._labels = self._labels
         ret._dict = self._dict
         return ret
@@ -1059,6 +1272,32 @@ class _sos_group(BaseTarget):
         self._dict = sdict["properties"]
 
 
+class _sos_groups(Sequence):
+    """Groups of a sos_targets that are created as sos_targets only when
+    they are accessed, so that steps with many substeps do not keep all
+    input groups in memory"""
+
+    __slots__ = ("_parent",)
+
+    def __init__(self, parent):
+        self._parent = parent
+
+    def __len__(self):
+        return len(self._parent._groups)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[x] for x in range(*index.indices(len(self)))]
+        return self._parent._groups[index].idx_to_targets(self._parent)
+
+    def __iter__(self):
+        for grp in self._parent._groups:
+            yield grp.idx_to_targets(self._parent)
+
+    def __repr__(self):
+        return f"_sos_groups({self._parent!r}, groups={len(self)})"
+
+
 class sos_targets(BaseTarget, Sequence, os.PathLike):
     """A collection of targets.
     If verify_existence is True, an UnknownTarget exception
@@ -1082,7 +1321,7 @@ class sos_targets(BaseTarget, Sequence, os.PathLike):
         **kwargs,
     ):
         super().__init__()
-        self._targets: List = []
+        self._targets = _TargetList()
         self._labels: List = []
         self._groups: List = []
         if isinstance(_undetermined, (bool, str)):
@@ -1095,7 +1334,8 @@ class sos_targets(BaseTarget, Sequence, os.PathLike):
         for src, value in kwargs.items():
             self.__append__(
                 value, source=src, verify_existence=_verify_existence)
-        for t in self._targets:
+        # targets saved as names are file targets
+        for _, t in self._targets.objects():
             if isinstance(t, sos_targets):
                 raise RuntimeError(
                     f"Nested sos_targets {t} were introduced by {args}")
@@ -1146,12 +1386,16 @@ class sos_targets(BaseTarget, Sequence, os.PathLike):
                    verify_existence=False):
         src = source if source else default_source
         if isinstance(arg, paths):
-            self._targets.extend([file_target(x) for x in arg._paths])
+            self._targets.add_names(arg._paths)
             self._labels.extend([src] * len(arg._paths))
             for g in self._groups:
                 g.add_last(len(arg._paths), parent=self)
         elif isinstance(arg, path):
-            self._targets.append(file_target(arg))
+            if isinstance(arg, file_target) and arg._md5:
+                # keep calculated signature
+                self._targets.append(file_target(arg))
+            else:
+                self._targets.add_names([arg])
             self._labels.append(src)
             for g in self._groups:
                 g.add_last(1, parent=self)
@@ -1159,7 +1403,7 @@ class sos_targets(BaseTarget, Sequence, os.PathLike):
             if self.wildcard.search(arg):
                 matched = sorted(glob.glob(os.path.expanduser(arg)))
                 if matched:
-                    self._targets.extend([file_target(x) for x in matched])
+                    self._targets.add_names(matched)
                     self._labels.extend([src] * len(matched))
                     for g in self._groups:
                         g.add_last(len(matched), parent=self)
@@ -1168,7 +1412,7 @@ class sos_targets(BaseTarget, Sequence, os.PathLike):
                 else:
                     env.logger.debug(f"Pattern {arg} does not match any file")
             else:
-                self._targets.append(file_target(arg))
+                self._targets.add_names([arg])
                 self._labels.append(src)
                 for g in self._groups:
                     g.add_last(1, parent=self)
@@ -1194,7 +1438,15 @@ class sos_targets(BaseTarget, Sequence, os.PathLike):
                 g.add_last(1, parent=self)
         elif isinstance(arg, Iterable):
             # in case arg is a Generator, check its type will exhaust it
-            for t in list(arg):
+            arg = list(arg)
+            if all(x.__class__ is str and not self.wildcard.search(x) for x in arg):
+                # a list of file names
+                self._targets.add_names(arg)
+                self._labels.extend([src] * len(arg))
+                for g in self._groups:
+                    g.add_last(len(arg), parent=self)
+                return
+            for t in arg:
                 self.__append__(t, source=src)
         elif arg is not None:
             raise RuntimeError(
@@ -1220,6 +1472,9 @@ class sos_targets(BaseTarget, Sequence, os.PathLike):
     def _get_group(self, index):
         return self._groups[index].idx_to_targets(self)
 
+    def _lazy_groups(self):
+        return _sos_groups(self)
+
     # def targets(self):
     #    return [x.target_name() if isinstance(x, file_target) else x for x in self._targets]
 
@@ -1315,32 +1570,32 @@ class sos_targets(BaseTarget, Sequence, os.PathLike):
     def __setstate__(self, state) -> None:
         if isinstance(state, tuple):
             if len(state) == 2:
-                self._targets = state[0]
+                self._targets = _as_target_list(state[0])
                 self._labels = [""] * len(self._targets)
                 self._undetermined = state[1]
                 self._groups = []
                 self._dict = {}
             elif len(state) == 3:
-                self._targets = state[0]
+                self._targets = _as_target_list(state[0])
                 self._labels = state[1]
                 self._undetermined = state[2]
                 self._groups = []
                 self._dict = {}
             elif len(state) == 4:
-                self._targets = state[0]
+                self._targets = _as_target_list(state[0])
                 self._labels = state[1]
                 self._undetermined = state[2]
                 self._groups = state[3]
                 self._dict = {}
             elif len(state) == 5:
-                self._targets = state[0]
+                self._targets = _as_target_list(state[0])
                 self._labels = state[1]
                 self._undetermined = state[2]
                 self._groups = state[3]
                 self._dict = state[4]
         else:
             # older version of sig file might only saved targets
-            self._targets = state
+            self._targets = _as_target_list(state)
             self._labels = [""] * len(self._targets)
             self._undetermined = False
             self._groups = []
@@ -1354,15 +1609,9 @@ class sos_targets(BaseTarget, Sequence, os.PathLike):
         if isinstance(i, str):
             ret = sos_targets()
             ret._undetermined = self._undetermined
-            ret._targets = [
-                x for x, y in zip(self._targets, self._labels) if y == i
-            ]
-            index_map = {
-                o_idx: n_idx for n_idx, o_idx in zip(
-                    range(len(ret._targets)),
-                    [x for x, y in enumerate(self._labels) if y == i],
-                )
-            }
+            selected = [x for x, y in enumerate(self._labels) if y == i]
+            ret._targets = self._targets.take(selected)
+            index_map = {o_idx: n_idx for n_idx, o_idx in enumerate(selected)}
             ret._labels = [i] * len(ret._targets)
             ret._groups = []
             for grp in self._groups:
@@ -1379,7 +1628,7 @@ class sos_targets(BaseTarget, Sequence, os.PathLike):
         if isinstance(i, (tuple, list)):
             ret = sos_targets()
             ret._undetermined = self._undetermined
-            ret._targets = [self._targets[x] for x in i]
+            ret._targets = self._targets.take(i)
             ret._labels = [self._labels[x] for x in i]
             ret._groups = []
             return ret
@@ -1389,7 +1638,7 @@ class sos_targets(BaseTarget, Sequence, os.PathLike):
                 return self
             ret = sos_targets()
             ret._undetermined = self._undetermined
-            ret._targets = [self._targets[x] for x in kept]
+            ret._targets = self._targets.take(kept)
             ret._labels = [self._labels[x] for x in kept]
             ret._groups = []
             if not self._groups:
@@ -1411,7 +1660,7 @@ class sos_targets(BaseTarget, Sequence, os.PathLike):
             return ret
         ret = sos_targets()
         ret._undetermined = self._undetermined
-        ret._targets = ([self._targets[i]]
+        ret._targets = (self._targets.take([i])
                         if isinstance(i, int) else self._targets[i])
         ret._labels = [self._labels[i]] if isinstance(
             i, int) else self._labels[i]
@@ -1422,15 +1671,9 @@ class sos_targets(BaseTarget, Sequence, os.PathLike):
         if isinstance(i, str):
             ret = sos_targets()
             ret._undetermined = self._undetermined
-            ret._targets = [
-                x for x, y in zip(self._targets, self._labels) if y == i
-            ]
-            index_map = {
-                o_idx: n_idx for n_idx, o_idx in zip(
-                    range(len(ret._targets)),
-                    [x for x, y in enumerate(self._labels) if y == i],
-                )
-            }
+            selected = [x for x, y in enumerate(self._labels) if y == i]
+            ret._targets = self._targets.take(selected)
+            index_map = {o_idx: n_idx for n_idx, o_idx in enumerate(selected)}
             ret._labels = [i] * len(ret._targets)
             ret._groups = []
             for grp in self._groups:
@@ -1449,14 +1692,18 @@ class sos_targets(BaseTarget, Sequence, os.PathLike):
         return self._targets[i]
 
     def target_signature(self):
-        return tuple((x.target_signature(), y)
-                     for x, y in zip(self._targets, self._labels))
+        sigs = batch_target_signature(self._targets)
+        for sig in sigs:
+            if isinstance(sig, Exception):
+                raise sig
+        return tuple(zip(sigs, self._labels))
 
     def validate(self, sig):
-        return (isinstance(sig, tuple) and len(sig) == len(self._targets) and
-                all(
-                    x.validate(sig[0]) and src == sig[1]
-                    for x, src, sig in zip(self._targets, self._labels, sig)))
+        if not isinstance(sig, tuple) or len(sig) != len(self._targets):
+            return False
+        if any(src != x[1] for src, x in zip(self._labels, sig)):
+            return False
+        return all(x is True for x in batch_validate(self._targets, [x[0] for x in sig]))
 
     def target_exists(self, mode="any"):
         return all(x.target_exists(mode) for x in self._targets)
@@ -1517,12 +1764,12 @@ class sos_targets(BaseTarget, Sequence, os.PathLike):
         """Remove targets of certain type"""
         if kept is None:
             kept = [
-                i for i, x in enumerate(self._targets)
-                if not isinstance(x, type)
+                i for i, x in enumerate(self._targets.instance_of(type))
+                if not x
             ]
         if len(kept) == len(self._targets):
             return self
-        self._targets = [self._targets[x] for x in kept]
+        self._targets = self._targets.take(kept)
         self._labels = [self._labels[x] for x in kept]
         if not self._groups:
             return self
@@ -1540,7 +1787,7 @@ class sos_targets(BaseTarget, Sequence, os.PathLike):
 
     def resolve_remote(self):
         """If target is of remote type, resolve it"""
-        for idx, target in enumerate(self._targets):
+        for idx, target in self._targets.objects():
             if isinstance(target, remote):
                 resolved = target.resolve()
                 if isinstance(resolved, str):
@@ -1614,6 +1861,28 @@ class sos_targets(BaseTarget, Sequence, os.PathLike):
     def _num_groups(self):
         return len(self._groups)
 
+    def _label_indexes(self):
+        """Return indexes of targets of each label, in the order labels
+        first appear"""
+        indexes = {}
+        for idx, label in enumerate(self._labels):
+            try:
+                indexes[label].append(idx)
+            except KeyError:
+                indexes[label] = [idx]
+        return indexes
+
+    def _target_indexes(self):
+        """Return index of the first appearance of each target"""
+        indexes = {}
+        for idx, target in enumerate(self._targets):
+            try:
+                indexes.setdefault(_target_key(target), idx)
+            except TypeError:
+                # unhashable targets are looked up from the list
+                pass
+        return indexes
+
     def _group(self, by):
         if by is None:
             return self
@@ -1623,15 +1892,14 @@ class sos_targets(BaseTarget, Sequence, os.PathLike):
 
         if by == "single":
             self._groups = [
-                _sos_group([x], parent=self) for x in range(len(self))
+                _sos_group(range(x, x + 1), parent=self) for x in range(len(self))
             ]
         elif by == "all":
             # default option
             self._groups = [_sos_group(range(len(self)), self._labels)]
         elif isinstance(by, str) and (by.startswith("pairsource") or
                                       by.startswith("pairlabel")):
-            labels = list(dict.fromkeys(self.labels))
-            if len(labels) == 1:
+            if len(set(self._labels)) == 1:
                 raise ValueError("Cannot pairlabel input with a single label.")
             if by == "pairsource" or by == "pairlabel":
                 grp_size = 1
@@ -1643,27 +1911,25 @@ class sos_targets(BaseTarget, Sequence, os.PathLike):
                         grp_size = int(by[9:])
                 except Exception as e:
                     raise ValueError(f"Invalid pairsource option {by}") from e
-            src_sizes = {s: self.labels.count(s) for s in labels}
+            lookups = self._label_indexes()
+            src_sizes = {s: len(x) for s, x in lookups.items()}
             if max(src_sizes.values()) % grp_size != 0:
                 raise ValueError(
                     f"Cannot use group size {grp_size} (option {by}) for source of size {src_sizes}"
                 )
             n_groups = max(src_sizes.values()) // grp_size
             indexes = [[] for x in range(n_groups)]
-            for s in labels:
-                lookup = [
-                    idx for idx, src in enumerate(self.labels) if src == s
-                ]
+            for s, lookup in lookups.items():
                 if src_sizes[s] > n_groups and src_sizes[s] % n_groups == 0:
                     gs = src_sizes[s] // n_groups
                     for i in range(n_groups):
                         # (0, 1, 2), (3, 4, 5), (6, 7, 8) ...
                         indexes[i].extend(lookup[i * gs:(i + 1) * gs])
                 elif n_groups >= src_sizes[s] and n_groups % src_sizes[s] == 0:
+                    rep = n_groups // src_sizes[s]
                     for i in range(n_groups):
                         # (0 ), (0, ), (1, ), (1, ) ...
-                        indexes[i].append(lookup[i //
-                                                 (n_groups // src_sizes[s])])
+                        indexes[i].append(lookup[i // rep])
                 else:
                     raise ValueError(
                         f'Cannot use group size {grp_size} (by="{by}") for source of size {src_sizes}'
@@ -1744,10 +2010,9 @@ class sos_targets(BaseTarget, Sequence, os.PathLike):
                 for x in combinations(range(len(self)), grp_size)
             ]
         elif by == "source" or by == "label":
-            labels = list(dict.fromkeys(self.labels))
             self._groups = [
-                _sos_group([i for i, x in enumerate(self._labels) if x == src],
-                           parent=self) for src in labels
+                _sos_group(indexes, parent=self)
+                for indexes in self._label_indexes().values()
             ]
         elif isinstance(by, int) or (isinstance(by, str) and by.isdigit()):
             by = int(by)
@@ -1772,7 +2037,8 @@ class sos_targets(BaseTarget, Sequence, os.PathLike):
                     raise ValueError(
                         f"Customized grouping method should return a list. {idx} of type {idx.__class__.__name__} is returned."
                     ) from e
-                for grp in by(self):
+                target_indexes = None
+                for grp in idx:
                     if isinstance(grp, Sequence) and all(
                             isinstance(x, int) for x in grp):
                         if any(x < 0 or x >= len(self._targets) for x in grp):
@@ -1781,10 +2047,15 @@ class sos_targets(BaseTarget, Sequence, os.PathLike):
                             )
                         self._groups.append(_sos_group(grp, parent=self))
                     else:
+                        if target_indexes is None:
+                            target_indexes = self._target_indexes()
                         index = []
                         for x in sos_targets(grp):
                             try:
-                                index.append(self._targets.index(x))
+                                try:
+                                    index.append(target_indexes[_target_key(x)])
+                                except (KeyError, TypeError):
+                                    index.append(self._targets.index(x))
                             except Exception as e:
                                 raise ValueError(
                                     f"Returned target is not one of the targets. {x}"
@@ -1979,25 +2250,21 @@ class sos_targets(BaseTarget, Sequence, os.PathLike):
                 n_grps = 1
             self._duplicate_groups(loop_size)
             #
-            for vidx in range(loop_size):
-                for idx in range(n_grps):
-                    for var_name, values in zip(fe_iter_names, fe_values):
-                        if isinstance(values, Sequence):
-                            self._groups[n_grps * vidx + idx].set(
-                                var_name, values[vidx])
-                        elif isinstance(values, pd.DataFrame):
-                            self._groups[n_grps * vidx + idx].set(
-                                var_name, values.iloc[vidx])
-                        elif isinstance(values, pd.Series):
-                            self._groups[n_grps * vidx + idx].set(
-                                var_name, values.iloc[vidx])
-                        elif isinstance(values, pd.Index):
-                            self._groups[n_grps * vidx + idx].set(
-                                var_name, values[vidx])
-                        else:
-                            raise ValueError(
-                                f"Failed to iterate through for_each variable {short_repr(values)}"
-                            )
+            for var_name, values in zip(fe_iter_names, fe_values):
+                if isinstance(values, Sequence):
+                    get_value = values.__getitem__
+                elif isinstance(values, (pd.DataFrame, pd.Series)):
+                    get_value = values.iloc.__getitem__
+                elif isinstance(values, pd.Index):
+                    get_value = values.__getitem__
+                else:
+                    raise ValueError(
+                        f"Failed to iterate through for_each variable {short_repr(values)}"
+                    )
+                for vidx in range(loop_size):
+                    value = get_value(vidx)
+                    for grp in self._groups[n_grps * vidx:n_grps * (vidx + 1)]:
+                        grp.set(var_name, value)
 
     def __hash__(self):
         return hash(repr(self))
@@ -2141,33 +2408,25 @@ class InMemorySignature:
             env.log_to_file(
                 "TARGET",
                 f'Set undetermined output files to {env.sos_dict["_output"]}')
-        input_sig = {}
-        for f in self.input_files:
-            try:
-                input_sig[str(f)] = f.target_signature()
-            except Exception:
-                env.logger.debug(
-                    f"Failed to create signature: input target {f} does not exist"
-                )
-                return False
-        output_sig = {}
-        for f in self.output_files:
-            try:
-                output_sig[str(f)] = f.target_signature()
-            except Exception:
-                env.logger.debug(
-                    f"Failed to create signature: output target {f} does not exist"
-                )
-                return False
-        dependent_sig = {}
-        for f in self.dependent_files:
-            try:
-                dependent_sig[str(f)] = f.target_signature()
-            except Exception:
+        # signatures of all targets are calculated in one batch
+        all_files = (
+            self.input_files._targets + self.output_files._targets +
+            self.dependent_files._targets)
+        all_sigs = batch_target_signature(all_files)
+        sigs = {"input": {}, "output": {}, "dependent": {}}
+        for f, sig, sig_type in zip(
+                all_files, all_sigs, ["input"] * len(self.input_files) +
+            ["output"] * len(self.output_files) +
+            ["dependent"] * len(self.dependent_files)):
+            if isinstance(sig, Exception):
                 env.logger.debug(
-                    f"Failed to create signature: dependent target {f} does not exist"
+                    f"Failed to create signature: {sig_type} target {f} does not exist"
                 )
                 return False
+            sigs[sig_type][str(f)] = sig
+        input_sig = sigs["input"]
+        output_sig = sigs["output"]
+        dependent_sig = sigs["dependent"]
         init_context_sig = {
             var: objectMD5(self.init_signature[var])
             for var in self.init_signature
@@ -2202,8 +2461,8 @@ class InMemorySignature:
         sig_files = (
             self.input_files._targets + self.output_files._targets +
             self.dependent_files._targets)
-        for x in sig_files:
-            if not x.target_exists("any"):
+        for x, exists in zip(sig_files, batch_target_exists(sig_files)):
+            if exists is not True:
                 return f"Missing target {x}"
         #
 
@@ -2238,6 +2497,8 @@ class InMemorySignature:
 
         res["vars"].update(signature["end_context"])
         #
+        # targets are created first and validated in one batch
+        to_be_validated = []
         for cur_type in ["input", "output", "depends"]:
             for f, m in signature[cur_type].items():
                 try:
@@ -2262,13 +2523,22 @@ class InMemorySignature:
                         freal = eval(f, {target_type: target_class})
                     else:
                         freal = file_target(f)
-                    if not freal.validate(m):
-                        return f"Target {f} does not exist or does not match saved signature {m}"
-                    res[cur_type].append(freal.target_name(
-                    ) if isinstance(freal, file_target) else freal)
-                    files_checked[freal.target_name()] = True
+                    to_be_validated.append((cur_type, f, freal, m))
                 except Exception as e:
                     env.logger.debug(f"Wrong md5 in signature: {e}")
+        validated = batch_validate([x[2] for x in to_be_validated],
+                                   [x[3] for x in to_be_validated])
+        for (cur_type, f, freal, m), valid in zip(to_be_validated, validated):
+            try:
+                if isinstance(valid, Exception):
+                    raise valid
+                if not valid:
+                    return f"Target {f} does not exist or does not match saved signature {m}"
+                res[cur_type].append(freal.target_name(
+                ) if isinstance(freal, file_target) else freal)
+                files_checked[freal.target_name()] = True
+            except Exception as e:
+                env.logger.debug(f"Wrong md5 in signature: {e}")
         #
         if not all(files_checked.values()):
             return f'No MD5 signature for {", ".join(x for x,y in files_checked.items() if not y)}'
@@ -2410,6 +2680,8 @@ class RuntimeInfo(InMemorySignature):
                 f"write signature {self.sig_id} with output {self.output_files}",
             )
         ret = super().write()
+        # save access times and hit counts of the signature cache
+        file_signature_cache.flush()
         if ret is False:
             env.logger.debug(f"Failed to write signature {self.sig_id}")
             return ret
@@ -8,15 +8,67 @@ import os
 import subprocess
 import threading
 import time
-from collections import OrderedDict, defaultdict
+import weakref
+from collections import OrderedDict, defaultdict, deque
+
+import zmq
 
 from .eval import cfg_interpolate
-from .messages import encode_msg
+from .messages import decode_msg, encode_msg
 from .targets import sos_targets
 from .tasks import TaskFile
 from .utils import env, expand_time
 
 
+class TaskStatusListener(threading.Thread):
+    '''Receive status of tasks sent by locally executed tasks (see
+    tasks.notify_task_status) and pass them to registered task engines.'''
+
+    def __init__(self):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.engines = weakref.WeakSet()
+        self.address = None
+        self._ready = threading.Event()
+
+    def start(self):
+        threading.Thread.start(self)
+        self._ready.wait()
+
+    def run(self):
+        # use a separate context because env.zmq_context is terminated
+        # after the completion of the workflow
+        context = zmq.Context()
+        socket = context.socket(zmq.PULL)
+        port = socket.bind_to_random_port('tcp://127.0.0.1')
+        self.address = f'tcp://127.0.0.1:{port}'
+        self._ready.set()
+        while True:
+            try:
+                task_id, status, _ = decode_msg(socket.recv())
+            except Exception as e:
+                env.logger.debug(f'Failed to receive status of task: {e}')
+                continue
+            for engine in list(self.engines):
+                engine.notify_task_status(task_id, status)
+
+
+_task_status_listener = None
+
+
+def get_task_status_listener():
+    '''Return a listener of task status for the current process, whose
+    address is passed to locally executed tasks as environment variable
+    SOS_TASK_NOTIFY.'''
+    global _task_status_listener
+    if _task_status_listener is None or \
+            _task_status_listener.pid != os.getpid():
+        _task_status_listener = TaskStatusListener()
+        _task_status_listener.pid = os.getpid()
+        _task_status_listener.start()
+    return _task_status_listener
+
+
 class TaskEngine(threading.Thread):
 
     def __init__(self, agent):
@@ -90,6 +142,18 @@ class TaskEngine(threading.Thread):
         self.batch_size = 1
         # let us report the status of task engine from time to time
         self.last_report = time.time()
+        #
+        # status of tasks sent by the tasks, which are executed locally. The
+        # status of tasks are still polled in case the notification is lost.
+        self._notified_status = deque()
+        # set when there are new or notified tasks, or when submissions or status
+        # checks complete, so that the engine does not poll for them
+        self._wakeup = threading.Event()
+
+    def close(self):
+        '''Stop receiving status of tasks from the task status listener'''
+        if _task_status_listener is not None:
+            _task_status_listener.engines.discard(self)
 
     def notify_controller(self, msg):
         if env.config['exec_mode']:
@@ -141,6 +205,32 @@ class TaskEngine(threading.Thread):
                           (x, 'missing', '') for x in missing_tasks
                       ]
 
+    def notify_task_status(self, task_id, status):
+        # called from the thread of listener, with status processed in run()
+        self._notified_status.append((task_id, status))
+        self._wakeup.set()
+
+    def process_notified_status(self):
+        deferred = []
+        while self._notified_status:
+            task_id, status = self._notified_status.popleft()
+            if any(task_id in x for x in self.submitting_tasks):
+                # the task is executed before its submission is confirmed
+                deferred.append((task_id, status))
+            elif task_id in self.running_tasks or task_id in self.running_pending_tasks:
+                env.log_to_file('TASK', f'Task {task_id} notified status {status}')
+                # dates of task are set only by status query
+                self.task_info[task_id].setdefault('date', [None, None, None])
+                self.update_task_status(task_id, status)
+        self._notified_status.extend(deferred)
+
+    def _wake_up(self, *args):
+        self._wakeup.set()
+
+    def _wait_for_events(self, timeout):
+        self._wakeup.wait(timeout)
+        self._wakeup.clear()
+
     def get_tasks(self):
         with threading.Lock():
             pending = copy.deepcopy(self.pending_tasks +
@@ -177,6 +267,8 @@ class TaskEngine(threading.Thread):
         self._last_status_check = time.time()
         self.engine_ready.set()
         while True:
+            if self._notified_status:
+                self.process_notified_status()
             # if there are running tasks or pending tasks, we need to monitor the status of the queue
             if (self.running_tasks or self.running_pending_tasks or
                     self.pending_tasks) and time.time(
@@ -189,9 +281,11 @@ class TaskEngine(threading.Thread):
                         check_all=False,
                         verbosity=3,
                         numeric_times=True)
+                    self._status_checker.add_done_callback(self._wake_up)
                     continue
-                if self._status_checker.running():
-                    time.sleep(0.01)
+                # the checker could be waiting for the submission of tasks
+                if not self._status_checker.done():
+                    self._wait_for_events(self.status_check_interval)
                     continue
                 status_output = self._status_checker.result()
                 self._status_checker = None
@@ -223,9 +317,13 @@ class TaskEngine(threading.Thread):
                 self.summarize_status()
                 self._last_status_check = time.time()
             else:
-                # if nothing to do, sleep to avoid empty loop. This will reduce CPU usage from 100% to 0.3%
-                # sleeping longer will slightly reduce CPU usage but decrease responsiveness by a bit
-                time.sleep(0.01)
+                # if nothing to do, wait for new or notified tasks, completed submissions,
+                # or the next status check of monitored tasks
+                if self.running_tasks or self.running_pending_tasks or self.pending_tasks:
+                    self._wait_for_events(
+                        max(0, self.status_check_interval - (time.time() - self._last_status_check)))
+                else:
+                    self._wait_for_events(1)
 
             if self.submitting_tasks:
                 with threading.Lock():
@@ -354,6 +452,8 @@ class TaskEngine(threading.Thread):
                     self.submitting_tasks[tuple(
                         slot)] = self._thread_workers.submit(
                             self.execute_tasks, slot)
+                    self.submitting_tasks[tuple(slot)].add_done_callback(
+                        self._wake_up)
 
             elif self.running_tasks or self.running_pending_tasks:
                 if time.time() - self.last_report > 60:
@@ -450,6 +550,7 @@ class TaskEngine(threading.Thread):
                 'update_only': False,
                 'tags': self.task_info[task_id].get('tags', '')
             })
+            self._wakeup.set()
             return 'pending'
 
     def summarize_status(self):
@@ -742,6 +843,15 @@ class BackgroundProcess_TaskEngine(TaskEngine):
         else:
             # default allow stacking of up to 1000 jobs
             self.batch_size = 1000
+        #
+        # tasks executed by local processes notify the engine of status changes
+        if self.config.get('status_notification', True) and getattr(
+                agent, 'address', None) == 'localhost':
+            listener = get_task_status_listener()
+            listener.engines.add(self)
+            self.task_env = dict(os.environ, SOS_TASK_NOTIFY=listener.address)
+        else:
+            self.task_env = None
 
     def execute_tasks(self, task_ids):
         if not super().execute_tasks(task_ids):
@@ -760,9 +870,15 @@ class BackgroundProcess_TaskEngine(TaskEngine):
         cmd = f"sos execute {' '.join(task_ids)} -v {env.verbosity} -s {env.config['sig_mode']} -m {env.config['run_mode']}"
         env.log_to_file('TASK',
                         f'Execute "{cmd}" (waiting={self.wait_for_task})')
-        self.agent.run_command(cmd, wait_for_task=self.wait_for_task)
+        self.run_task_command(cmd)
         return True
 
+    def run_task_command(self, cmd):
+        if self.task_env is None:
+            self.agent.run_command(cmd, wait_for_task=self.wait_for_task)
+        else:
+            self.agent.run_command(cmd, wait_for_task=self.wait_for_task, env=self.task_env)
+
     def _submit_task_with_template(self, task_ids):
         '''Submit tasks by interpolating a shell script defined in task_template'''
         runtime = self.config
@@ -816,7 +932,7 @@ class BackgroundProcess_TaskEngine(TaskEngine):
         try:
             cmd = f'bash ~/.sos/tasks/{filename}'
             env.log_to_file('TASK', f'Execute "{cmd}" with script {job_text}')
-            self.agent.run_command(cmd, wait_for_task=self.wait_for_task)
+            self.run_task_command(cmd)
         except Exception as e:
             raise RuntimeError(f'Failed to submit task {task_ids}: {e}') from e
         return True
@@ -20,10 +20,11 @@ from .controller import (Controller, close_socket, connect_controllers, create_s
 from .eval import SoS_eval, SoS_exec
 from .executor_utils import (__null_func__, clear_output, get_traceback_msg, prepare_env)
 from .messages import decode_msg
-from .monitor import TaskMonitor
+from .monitor import NodeMonitorClient, TaskMonitor
 from .step_executor import parse_shared_vars
 from .targets import (InMemorySignature, dynamic, file_target, path, sos_step, sos_targets)
-from .tasks import (TaskFile, combine_results, monitor_interval, remove_task_files, resource_monitor_interval)
+from .tasks import (TaskFile, combine_results, monitor_interval, notify_task_status, remove_task_files,
+                    resource_monitor_interval)
 from .utils import (ProcessKilled, StopInputGroup, env, get_localhost_ip, pickleable)
 
 
@@ -31,6 +32,26 @@ def signal_handler(*args, **kwargs):
     raise ProcessKilled()
 
 
+#
+# The common dictionary of a master task executed in parallel is pickled once
+# and passed to each process of the pool when the process is started. It is
+# unpickled for each subtask so that subtasks do not share mutable values.
+#
+_common_data = None
+
+
+def _init_subtask_process(common_data):
+    global _common_data
+    _common_data = common_data
+
+
+def _execute_subtask(args):
+    idx, executor, sub_id, sub_params, sub_runtime, sub_sig = args
+    if _common_data is not None:
+        sub_params.sos_dict.update(pickle.loads(_common_data))
+    return idx, executor.execute_single_task(sub_id, sub_params, sub_runtime, sub_sig, True)
+
+
 class BaseTaskExecutor(object):
     """Task executor used to execute specified tasks. Any customized task executor
     should derive from this class.
@@ -39,12 +60,17 @@ class BaseTaskExecutor(object):
     def __init__(self):
         pass
 
+    def set_task_status(self, tf, status):
+        """Set the status of task and notify the task engine of the change"""
+        tf.status = status
+        notify_task_status(tf.task_id, status)
+
     def execute(self, task_id):
         """Execute single or master task, return a dictionary"""
         tf = TaskFile(task_id)
 
         # this will automatically create a pulse file
-        tf.status = "running"
+        self.set_task_status(tf, "running")
         # write result file
         try:
             signal.signal(signal.SIGTERM, signal_handler)
@@ -71,7 +97,7 @@ class BaseTaskExecutor(object):
             if "_runtime" not in runtime:
                 runtime["_runtime"] = {}
 
-            m = TaskMonitor(
+            m = (NodeMonitorClient if env.config.get("node_monitor", False) else TaskMonitor)(
                 task_id,
                 monitor_interval=monitor_interval,
                 resource_monitor_interval=resource_monitor_interval,
@@ -88,14 +114,18 @@ class BaseTaskExecutor(object):
             else:
                 res = self.execute_single_task(task_id, params, runtime, sig_content)
         except KeyboardInterrupt:
-            tf.status = "aborted"
+            self.set_task_status(tf, "aborted")
             raise
         except ProcessKilled as e:
-            tf.status = "aborted"
+            self.set_task_status(tf, "aborted")
             raise ProcessKilled("task interrupted") from e
         finally:
             signal.signal(signal.SIGTERM, signal.SIG_DFL)
 
+        if isinstance(m, NodeMonitorClient) and "peak_cpu" in res:
+            # resource usage is recorded by the node monitor
+            res.update(m.peak_usage())
+
         if res["ret_code"] != 0 and "exception" in res:
             with open(
                     os.path.join(os.path.expanduser("~"), ".sos", "tasks", task_id + ".soserr"),
@@ -105,13 +135,13 @@ class BaseTaskExecutor(object):
 
         if res.get("skipped", False):
             # a special mode for skipped to set running time to zero
-            tf.status = "skipped"
+            self.set_task_status(tf, "skipped")
         else:
             tf.add_outputs()
             tf.add_result(res)
 
             # this will remove pulse and other files
-            tf.status = "completed" if res["ret_code"] == 0 else "failed"
+            self.set_task_status(tf, "completed" if res["ret_code"] == 0 else "failed")
 
         return res["ret_code"]
 
@@ -392,28 +422,46 @@ class BaseTaskExecutor(object):
         return combine_results(task_id, results)
 
     def execute_master_task_in_parallel(self, params, master_runtime, sig_content, n_workers):
-        # multiple workers, concurrent execution using a pool
+        # multiple workers, concurrent execution
         from multiprocessing.pool import Pool
 
-        p = Pool(n_workers)
-        results = []
-        for sub_id, sub_params in params.task_stack:
-            if hasattr(params, "common_dict"):
-                sub_params.sos_dict.update(params.common_dict)
-            sub_runtime = {x: master_runtime.get(x, {}) for x in ("_runtime", sub_id)}
-            sub_sig = {sub_id: sig_content.get(sub_id, {})}
-            res = p.apply_async(
-                self.execute_single_task,
-                (sub_id, sub_params, sub_runtime, sub_sig, True),
-                callback=self._append_subtask_outputs,
-            )
-            results.append(res)
+        common_data = pickle.dumps(params.common_dict) if getattr(params, "common_dict", None) else None
+
+        def subtasks():
+            for idx, (sub_id, sub_params) in enumerate(params.task_stack):
+                sub_runtime = {x: master_runtime.get(x, {}) for x in ("_runtime", sub_id)}
+                sub_sig = {sub_id: sig_content.get(sub_id, {})}
+                yield (idx, self, sub_id, sub_params, sub_runtime, sub_sig)
 
-        for idx, r in enumerate(results):
-            results[idx] = r.get()
-            self._cache_subresult(params.ID, results[idx])
-        p.close()
-        p.join()
+        results = [None] * len(params.task_stack)
+        # results are returned as they are completed and are cached in batches
+        batch = []
+        last_cached = time.time()
+        pool = Pool(n_workers, initializer=_init_subtask_process, initargs=(common_data,))
+        try:
+            for idx, res in pool.imap_unordered(
+                    _execute_subtask,
+                    subtasks(),
+                    chunksize=max(1, min(8, len(params.task_stack) // (n_workers * 4))),
+            ):
+                results[idx] = res
+                try:
+                    self._append_subtask_outputs(res)
+                except Exception as e:
+                    env.logger.warning(f"Failed to copy result of subtask {res.get('task', '')}: {e}")
+                batch.append(res)
+                if len(batch) >= n_workers or time.time() - last_cached > 1:
+                    self._cache_subresults(params.ID, batch)
+                    batch = []
+                    last_cached = time.time()
+            pool.close()
+        except BaseException:
+            # stop running subtasks
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+            self._cache_subresults(params.ID, batch)
         return results
 
     def execute_master_task_sequentially(self, params, master_runtime, sig_content):
@@ -497,9 +545,15 @@ class BaseTaskExecutor(object):
         return results
 
     def _cache_subresult(self, master_id, sub_result):
+        self._cache_subresults(master_id, [sub_result])
+
+    def _cache_subresults(self, master_id, sub_results):
+        if not sub_results:
+            return
         cache_file = os.path.join(os.path.expanduser("~"), ".sos", "tasks", master_id + ".cache")
         with open(cache_file, "ab") as cache:
-            pickle.dump(sub_result, cache)
+            for sub_result in sub_results:
+                pickle.dump(sub_result, cache)
 
     def _parse_num_workers(self, num_workers):
         # return number of nodes and workers
@@ -2,11 +2,14 @@
 #
 # Copyright (c) Bo Peng and the University of Texas MD Anderson Cancer Center
 # Distributed under the terms of the 3-clause BSD License.
+import atexit
 import copy
-import lzma
+import fnmatch
 import math
 import os
 import pickle
+import socket
+import sqlite3
 import struct
 import time
 from collections import namedtuple
@@ -16,10 +19,12 @@ from enum import Enum
 from typing import Dict, List, Union
 
 import fasteners
+import zmq
 
+from .messages import encode_msg
 from .targets import sos_targets
-from .utils import (DelayedAction, env, expand_size, expand_time, format_duration, format_HHMMSS, linecount_of_file,
-                    pretty_size, sample_lines, short_repr, tail_of_file)
+from .utils import (DelayedAction, compress_blob, decompress_blob, env, expand_size, expand_time, format_duration,
+                    format_HHMMSS, linecount_of_file, pretty_size, sample_lines, short_repr, tail_of_file)
 
 monitor_interval = 5
 resource_monitor_interval = 60
@@ -307,6 +312,9 @@ class TaskFile(object):
     5. compressed stdout
     6. compressed stderr
     7. compressed pickled signatures
+
+    Blocks are compressed by codec task_codec and can be read regardless of
+    the codec that compresses them.
     """
 
     TaskHeader_v1 = namedtuple(
@@ -349,6 +357,9 @@ class TaskFile(object):
         self.task_id = task_id
         self.task_file = os.path.join(os.path.expanduser("~"), ".sos", "tasks", task_id + ".task")
 
+    def _compress(self, data):
+        return compress_blob(data, env.config["task_codec"] or "lzma")
+
     def save(self, params):
         if os.path.isfile(self.task_file):
             if self.status == "running":
@@ -364,7 +375,7 @@ class TaskFile(object):
         now = time.time()
         # we keep in both places because params.tags is the only place to have it for subtasks
         tags = params.tags
-        params_block = lzma.compress(pickle.dumps(params))
+        params_block = self._compress(pickle.dumps(params))
         # env.logger.error(f'saving {self.task_id} params of size {len(params_block)}')
         header = self.TaskHeader(
             version=3,
@@ -391,6 +402,7 @@ class TaskFile(object):
             with open(self.task_file, "wb+") as fh:
                 self._write_header(fh, header)
                 fh.write(params_block)
+        get_task_index().update(self.task_id, tags=tags)
 
     def exists(self):
         return os.path.isfile(self.task_file)
@@ -426,7 +438,8 @@ class TaskFile(object):
         # remove result, input, output etc and set the status of the task to new
         with fasteners.InterProcessLock(os.path.join(env.temp_dir, self.task_id + ".lck")):
             with open(self.task_file, "r+b") as fh:
-                self._reset(fh)
+                header = self._reset(fh)
+        get_task_index().update(self.task_id)
 
     def _read_header(self, fh):
         fh.seek(0, 0)
@@ -468,7 +481,7 @@ class TaskFile(object):
                 content += fh.read()
         if not content:
             return b""
-        return lzma.compress(content)
+        return self._compress(content)
 
     def add_outputs(self, keep_result=False):
         # get header
@@ -560,8 +573,8 @@ class TaskFile(object):
         signature = result.get("signature", {})
         result.pop("signature", None)
         #
-        result_block = lzma.compress(pickle.dumps(result))
-        signature_block = lzma.compress(pickle.dumps(signature)) if signature else b""
+        result_block = self._compress(pickle.dumps(result))
+        signature_block = self._compress(pickle.dumps(signature)) if signature else b""
         with fasteners.InterProcessLock(os.path.join(env.temp_dir, self.task_id + ".lck")):
             with open(self.task_file, "r+b") as fh:
                 header = self._read_header(fh)
@@ -583,6 +596,7 @@ class TaskFile(object):
     def _set_info(self, info):
         with open(self.task_file, "r+b") as fh:
             fh.write(struct.pack(self.header_fmt, *info))
+        get_task_index().update(self.task_id)
 
     info = property(_get_info, _set_info)
 
@@ -613,12 +627,12 @@ class TaskFile(object):
             if header.params_size == 0:
                 return {}
             try:
-                return pickle.loads(lzma.decompress(fh.read(header.params_size)))
+                return pickle.loads(decompress_blob(fh.read(header.params_size)))
             except Exception as e:
                 raise RuntimeError(f"Failed to obtain params of task {self.task_id}: {e}") from e
 
     def _set_params(self, params):
-        params_block = lzma.compress(pickle.dumps(params))
+        params_block = self._compress(pickle.dumps(params))
         # env.logger.error(f'updating {self.task_id} params of size {len(params_block)}')
         with fasteners.InterProcessLock(os.path.join(env.temp_dir, self.task_id + ".lck")):
             with open(self.task_file, "r+b") as fh:
@@ -665,13 +679,13 @@ class TaskFile(object):
                 return {}
             fh.seek(self.header_size + header.params_size, 0)
             try:
-                return pickle.loads(lzma.decompress(fh.read(header.runtime_size)))
+                return pickle.loads(decompress_blob(fh.read(header.runtime_size)))
             except Exception as e:
                 env.logger.error(f"Failed to obtain runtime of task {self.task_id}: {e}")
                 return {"_runtime": {}}
 
     def _set_runtime(self, runtime):
-        runtime_block = lzma.compress(pickle.dumps(runtime))
+        runtime_block = self._compress(pickle.dumps(runtime))
         # env.logger.error(f'updating {self.task_id} params of size {len(params_block)}')
         with fasteners.InterProcessLock(os.path.join(env.temp_dir, self.task_id + ".lck")):
             with open(self.task_file, "r+b") as fh:
@@ -720,7 +734,7 @@ class TaskFile(object):
                 params = {}
             else:
                 try:
-                    params = pickle.loads(lzma.decompress(fh.read(header.params_size)))
+                    params = pickle.loads(decompress_blob(fh.read(header.params_size)))
                 except Exception as e:
                     env.logger.error(f"Failed to obtain params with runtime of task {self.task_id}: {e}")
                     params = {}
@@ -728,7 +742,7 @@ class TaskFile(object):
                 params.sos_dict["_runtime"] = {}
             if header.runtime_size > 0:
                 try:
-                    runtime = pickle.loads(lzma.decompress(fh.read(header.runtime_size)))
+                    runtime = pickle.loads(decompress_blob(fh.read(header.runtime_size)))
                 except Exception as e:
                     env.logger.error(f"Failed to obtain runtime of task {self.task_id}: {e}")
                     runtime = {"_runtime": {}}
@@ -748,6 +762,7 @@ class TaskFile(object):
                 f"Incompatible task file {self.task_file} is removed. This might was most likely generated by a previous version of SoS but please report a bug if you can reproduce this warning message: {e}"
             )
             os.remove(self.task_file)
+            get_task_index().remove([self.task_id])
 
     def _get_version(self):
         with open(self.task_file, "rb") as fh:
@@ -806,6 +821,7 @@ class TaskFile(object):
                     # from the current location, move by status
                     fh.seek(sts * 8, 1)
                     fh.write(struct.pack("!d", now))
+            get_task_index().update(self.task_id)
             # if restarting the task, make sure all irrelevant files
             # are removed or finishing tasks.
             if status in ("aborted", "completed", "failed", "pending"):
@@ -844,6 +860,7 @@ class TaskFile(object):
             ver = struct.unpack("!h", fh.read(2))[0]
             fh.seek(self.tags_offset[ver - 1], 0)
             fh.write(" ".join(sorted(tags)).ljust(self.tags_size[ver - 1]).encode())
+        get_task_index().update(self.task_id, tags=tags)
 
     tags = property(_get_tags, _set_tags)
 
@@ -854,7 +871,7 @@ class TaskFile(object):
                 return ""
             fh.seek(self.header_size + header.params_size + header.runtime_size, 0)
             try:
-                return lzma.decompress(fh.read(header.shell_size)).decode()
+                return decompress_blob(fh.read(header.shell_size)).decode()
             except Exception as e:
                 env.logger.warning(f"Failed to decode shell: {e}")
                 return ""
@@ -862,6 +879,8 @@ class TaskFile(object):
     shell = property(_get_shell)
 
     def _get_pulse(self):
+        from .monitor import pulse_text
+
         with open(self.task_file, "rb") as fh:
             header = self._read_header(fh)
             if header.pulse_size == 0:
@@ -871,7 +890,7 @@ class TaskFile(object):
                 0,
             )
             try:
-                return lzma.decompress(fh.read(header.pulse_size)).decode()
+                return pulse_text(decompress_blob(fh.read(header.pulse_size)))
             except Exception as e:
                 env.logger.warning(f"Failed to decode pulse: {e}")
                 return ""
@@ -888,7 +907,7 @@ class TaskFile(object):
                 0,
             )
             try:
-                return lzma.decompress(fh.read(header.stdout_size)).decode()
+                return decompress_blob(fh.read(header.stdout_size)).decode()
             except Exception as e:
                 env.logger.warning(f"Failed to decode stdout: {e}")
                 return ""
@@ -906,7 +925,7 @@ class TaskFile(object):
                 0,
             )
             try:
-                return lzma.decompress(fh.read(header.stderr_size)).decode()
+                return decompress_blob(fh.read(header.stderr_size)).decode()
             except Exception as e:
                 env.logger.warning(f"Failed to decode stderr: {e}")
                 return ""
@@ -924,7 +943,7 @@ class TaskFile(object):
                 0,
             )
             try:
-                return pickle.loads(lzma.decompress(fh.read(header.result_size)))
+                return pickle.loads(decompress_blob(fh.read(header.result_size)))
             except Exception as e:
                 env.logger.warning(f"Failed to decode result: {e}")
                 return {"ret_code": 1}
@@ -942,7 +961,7 @@ class TaskFile(object):
                 0,
             )
             try:
-                return pickle.loads(lzma.decompress(fh.read(header.signature_size)))
+                return pickle.loads(decompress_blob(fh.read(header.signature_size)))
             except Exception as e:
                 env.logger.warning(f"Failed to decode signature: {e}")
                 return {"ret_code": 1}
@@ -1007,6 +1026,290 @@ def remove_task_files(task: str, exts: list):
                     pass
 
 
+class TaskDirectoryIndex(object):
+    """Locate tasks by scanning ~/.sos/tasks directly. This is the original
+    behavior of SoS and is used when the task index is disabled with
+    environment variable SOS_TASK_INDEX=file."""
+
+    def __init__(self):
+        self.task_dir = os.path.join(os.path.expanduser("~"), ".sos", "tasks")
+
+    def match(self, patterns=None):
+        """Return a list of (task_id, last_modified) of tasks that start with
+        any of the patterns, or of all tasks if no pattern is specified."""
+        import glob
+
+        if not patterns:
+            patterns = [""]
+        matched = []
+        for pattern in patterns:
+            matched.extend(glob.glob(os.path.join(self.task_dir, f"{pattern}*.task")))
+        return [(os.path.basename(x)[:-5], os.path.getmtime(x)) for x in sorted(set(matched))]
+
+    def with_tags(self, tasks, tags):
+        """Return tasks with any of the tags"""
+        return [x for x in tasks if TaskFile(x).exists() and any(y in tags for y in TaskFile(x).tags.split())]
+
+    def update(self, task_id, tags=None):
+        pass
+
+    def remove(self, tasks):
+        pass
+
+    def clear(self):
+        pass
+
+
+class TaskIndex(TaskDirectoryIndex):
+    """An sqlite index of the tasks under ~/.sos/tasks with their tags and
+    modification times so that tasks can be listed and filtered without
+    opening and stating every task file. TaskFile keeps the index updated
+    on the host that created the index. Task files that are changed by
+    other means (e.g. copied from a remote host, executed on another host
+    that shares the home directory, or created by an earlier version of
+    SoS) are reindexed the next time the task directory is changed, by
+    comparing the modification time, size and inode of the task files
+    with the index."""
+
+    # the index is rebuilt from the task files if its schema is changed
+    version = "2"
+
+    _db_structure = [
+        """CREATE TABLE IF NOT EXISTS tasks (
+            task_id text PRIMARY KEY,
+            last_modified real,
+            mtime_ns integer,
+            size integer,
+            inode integer
+        )""",
+        """CREATE TABLE IF NOT EXISTS task_tags (
+            task_id text,
+            tag text,
+            PRIMARY KEY (task_id, tag)
+        )""",
+        """CREATE TABLE IF NOT EXISTS meta (
+            key text PRIMARY KEY,
+            value text
+        )""",
+        "CREATE INDEX IF NOT EXISTS task_last_modified ON tasks (last_modified)",
+        "CREATE INDEX IF NOT EXISTS task_tag ON task_tags (tag)",
+    ]
+
+    def __init__(self):
+        super().__init__()
+        self.db_file = os.path.join(os.path.expanduser("~"), ".sos", "task_index.db")
+        self._conn = None
+        self._pid = None
+        self._owner = False
+
+    def _get_conn(self):
+        # a connection cannot be shared by forked processes
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.db_file, timeout=60)
+            self._pid = os.getpid()
+            res = self._conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='meta'").fetchone()
+            if res and self._get_meta("version") != self.version:
+                for table in ("tasks", "task_tags", "meta"):
+                    self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+            for stmt in self._db_structure:
+                self._conn.execute(stmt)
+            self._conn.execute("INSERT OR IGNORE INTO meta VALUES ('version', ?)", (self.version,))
+            self._conn.execute("INSERT OR IGNORE INTO meta VALUES ('hostname', ?)", (socket.gethostname(),))
+            self._conn.commit()
+            # task executors on other hosts that share the home directory
+            # do not write to the index, which is updated by sync()
+            self._owner = self._get_meta("hostname") == socket.gethostname()
+        return self._conn
+
+    conn = property(_get_conn)
+
+    def _get_meta(self, key):
+        res = self._conn.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+        return res[0] if res else None
+
+    def _select(self, columns, patterns=None):
+        """Return columns of tasks that start with any of the patterns, or of
+        all tasks if no pattern is specified."""
+        cur = self.conn.cursor()
+        if not patterns:
+            cur.execute(f"SELECT {columns} FROM tasks ORDER BY task_id")
+            return cur.fetchall()
+        matched = set()
+        for pattern in patterns:
+            if any(x in pattern for x in "*?["):
+                cur.execute(f"SELECT {columns} FROM tasks WHERE task_id GLOB ?", (pattern + "*",))
+            else:
+                # prefix match as a range query so that the primary key is used
+                cur.execute(
+                    f"SELECT {columns} FROM tasks WHERE task_id >= ? AND task_id < ?",
+                    (pattern, pattern + "\U0010ffff"),
+                )
+            matched |= set(cur.fetchall())
+        return sorted(matched)
+
+    def sync(self, patterns=None):
+        """Reindex task files that are added, changed or removed from the task
+        directory since the last sync, only those that start with any of the
+        patterns if patterns are specified."""
+        try:
+            dir_mtime = str(os.stat(self.task_dir).st_mtime_ns)
+        except FileNotFoundError:
+            return
+        conn = self.conn
+        if self._get_meta("dir_mtime") == dir_mtime:
+            return
+        # side files of running tasks also change the directory, but only task
+        # files that are added or changed are opened, and only task files that
+        # match the patterns are compared with the index
+        if patterns:
+            prefixes = tuple(x for x in patterns if not any(y in x for y in "*?["))
+            wildcards = [x + "*" for x in patterns if any(y in x for y in "*?[")]
+        indexed = {x[0]: x[1:] for x in self._select("task_id, mtime_ns, size, inode", patterns)}
+        on_disk = set()
+        for entry in os.scandir(self.task_dir):
+            if not entry.name.endswith(".task"):
+                continue
+            task_id = entry.name[:-5]
+            if patterns and not task_id.startswith(prefixes) and not any(
+                    fnmatch.fnmatchcase(task_id, x) for x in wildcards):
+                continue
+            on_disk.add(task_id)
+            try:
+                st = entry.stat()
+                if indexed.get(task_id) == (st.st_mtime_ns, st.st_size, st.st_ino):
+                    continue
+                # tags are read again only if the task file is new or replaced
+                tags = None
+                if task_id not in indexed or indexed[task_id][1:] != (st.st_size, st.st_ino):
+                    tags = TaskFile(task_id).tags.split()
+                self._update(conn, task_id, st, tags)
+            except Exception as e:
+                env.logger.debug(f"Failed to index task {task_id}: {e}")
+        removed = indexed.keys() - on_disk
+        if removed:
+            self._remove(conn, removed)
+        if not patterns:
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('dir_mtime', ?)", (dir_mtime,))
+        conn.commit()
+
+    def _update(self, conn, task_id, st, tags=None):
+        conn.execute(
+            "INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?, ?)",
+            (task_id, st.st_mtime, st.st_mtime_ns, st.st_size, st.st_ino),
+        )
+        if tags is not None:
+            conn.execute("DELETE FROM task_tags WHERE task_id=?", (task_id,))
+            conn.executemany("INSERT OR IGNORE INTO task_tags VALUES (?, ?)", [(task_id, x) for x in tags])
+
+    def _remove(self, conn, tasks):
+        conn.executemany("DELETE FROM tasks WHERE task_id=?", [(x,) for x in tasks])
+        conn.executemany("DELETE FROM task_tags WHERE task_id=?", [(x,) for x in tasks])
+
+    def update(self, task_id, tags=None):
+        try:
+            conn = self.conn
+            if not self._owner:
+                return
+            st = os.stat(os.path.join(self.task_dir, task_id + ".task"))
+            # tasks should not wait for the index, which is corrected by
+            # sync() if the update fails
+            conn.execute("PRAGMA busy_timeout = 1000")
+            try:
+                self._update(conn, task_id, st, tags)
+                conn.commit()
+            finally:
+                conn.execute("PRAGMA busy_timeout = 60000")
+        except (OSError, sqlite3.DatabaseError) as e:
+            env.logger.debug(f"Failed to update index of task {task_id}: {e}")
+
+    def remove(self, tasks):
+        try:
+            self._remove(self.conn, tasks)
+            self.conn.commit()
+        except sqlite3.DatabaseError as e:
+            env.logger.debug(f"Failed to remove {len(tasks)} tasks from task index: {e}")
+
+    def clear(self):
+        try:
+            self.conn.execute("DELETE FROM tasks")
+            self.conn.execute("DELETE FROM task_tags")
+            self.conn.execute("DELETE FROM meta WHERE key='dir_mtime'")
+            self.conn.commit()
+        except sqlite3.DatabaseError as e:
+            env.logger.debug(f"Failed to clear task index: {e}")
+
+    def match(self, patterns=None):
+        try:
+            self.sync(patterns)
+            return self._select("task_id, last_modified", patterns)
+        except sqlite3.DatabaseError as e:
+            env.logger.debug(f"Failed to query task index, scanning task directory instead: {e}")
+            return super().match(patterns)
+
+    def with_tags(self, tasks, tags):
+        try:
+            # a few tasks (e.g. from sos status task_id --tags) are checked
+            # individually, and otherwise the entire task directory
+            self.sync(tasks if len(tasks) <= 100 else None)
+            cur = self.conn.cursor()
+            tagged = set()
+            for tag in tags:
+                cur.execute("SELECT task_id FROM task_tags WHERE tag=?", (tag,))
+                tagged |= {x[0] for x in cur.fetchall()}
+            return [x for x in tasks if x in tagged]
+        except sqlite3.DatabaseError as e:
+            env.logger.debug(f"Failed to query task index, reading task files instead: {e}")
+            return super().with_tags(tasks, tags)
+
+
+_task_index = None
+
+
+def get_task_index():
+    global _task_index
+    if _task_index is None:
+        if os.environ.get("SOS_TASK_INDEX", "sqlite") == "file":
+            _task_index = TaskDirectoryIndex()
+        else:
+            _task_index = TaskIndex()
+    return _task_index
+
+
+# socket used to send status of tasks, created once per process and address
+_notify_socket = None
+
+
+def _close_notify_socket():
+    if _notify_socket is not None and _notify_socket[0][0] == os.getpid():
+        # wait at most LINGER for the delivery of pending messages
+        _notify_socket[1].close()
+        _notify_socket[2].term()
+
+
+def notify_task_status(task_id, status):
+    """Send the status of a task to the task engine that submitted it, which
+    listens to address SOS_TASK_NOTIFY if the task is executed locally."""
+    global _notify_socket
+    address = os.environ.get("SOS_TASK_NOTIFY", "")
+    if not address:
+        return
+    try:
+        if _notify_socket is None or _notify_socket[0] != (os.getpid(), address):
+            if _notify_socket is None:
+                atexit.register(_close_notify_socket)
+            else:
+                _close_notify_socket()
+            context = zmq.Context()
+            socket = context.socket(zmq.PUSH)
+            # wait at most 0.2 seconds for the delivery of messages
+            socket.LINGER = 200
+            socket.connect(address)
+            _notify_socket = ((os.getpid(), address), socket, context)
+        _notify_socket[1].send(encode_msg([task_id, status, time.time()]), zmq.NOBLOCK)
+    except Exception as e:
+        env.logger.debug(f"Failed to send status of task {task_id} to {address}: {e}")
+
+
 def check_task(task, hint={}) -> Dict[str, Union[str, Dict[str, float]]]:
     # when testing. if the timestamp is 0, the file does not exist originally, it should
     # still does not exist. Otherwise the file should exist and has the same timestamp
@@ -1213,16 +1516,15 @@ def print_task_status(
     #     ]
     import glob
 
+    task_index = get_task_index()
     all_tasks: List = []
     if check_all:
-        tasks = glob.glob(os.path.join(os.path.expanduser("~"), ".sos", "tasks", "*.task"))
-        all_tasks = [(os.path.basename(x)[:-5], os.path.getmtime(x)) for x in tasks]
+        all_tasks = task_index.match()
         if not all_tasks:
             return
     else:
         for t in tasks:
-            matched_names = glob.glob(os.path.join(os.path.expanduser("~"), ".sos", "tasks", f"{t}*.task"))
-            matched = [(os.path.basename(x)[:-5], os.path.getmtime(x)) for x in matched_names]
+            matched = task_index.match([t])
             if not matched:
                 all_tasks.append((t, None))
             else:
@@ -1237,9 +1539,8 @@ def print_task_status(
     all_tasks = sorted(list(set(all_tasks)), key=lambda x: 0 if x[1] is None else x[1])
 
     if tags:
-        all_tasks = [
-            x for x in all_tasks if TaskFile(x[0]).exists() and any(y in tags for y in TaskFile(x[0]).tags.split())
-        ]
+        tagged = set(task_index.with_tags([x[0] for x in all_tasks], tags))
+        all_tasks = [x for x in all_tasks if x[0] in tagged]
 
     if not all_tasks:
         env.logger.debug("No matching tasks are identified.")
@@ -1334,7 +1635,7 @@ def print_task_status(
             elif s == "running":
                 pulse_file = os.path.join(os.path.expanduser("~"), ".sos", "tasks", t + ".pulse")
                 if os.path.isfile(pulse_file):
-                    with open(pulse_file) as pulse:
+                    with open(pulse_file, "rb") as pulse:
                         pulse_content = pulse.read()
                         summary = summarizeExecution(t, pulse_content, status=s)
                         if summary:
@@ -1590,7 +1891,7 @@ showResourceFigure_""" + t + """()
                 pulse_file = os.path.join(os.path.expanduser("~"), ".sos", "tasks", t + ".pulse")
                 if os.path.isfile(pulse_file):
                     print("EXECUTION STATS:\n================")
-                    with open(pulse_file) as pulse:
+                    with open(pulse_file, "rb") as pulse:
                         print(summarizeExecution(t, pulse.read(), status=s))
 
             # if there are other files such as job file, print them.
@@ -1637,22 +1938,19 @@ showResourceFigure_""" + t + """()
 
 def kill_tasks(tasks, tags=None):
     #
-    import glob
-
+    task_index = get_task_index()
     if not tasks:
-        tasks = glob.glob(os.path.join(os.path.expanduser("~"), ".sos", "tasks", "*.task"))
-        all_tasks = [os.path.basename(x)[:-5] for x in tasks]
+        all_tasks = [x[0] for x in task_index.match()]
     else:
         all_tasks = []
         for t in tasks:
-            matched = glob.glob(os.path.join(os.path.expanduser("~"), ".sos", "tasks", f"{t}*.task"))
-            matched = [os.path.basename(x)[:-5] for x in matched]
+            matched = [x[0] for x in task_index.match([t])]
             if not matched:
                 env.logger.warning(f"{t} does not match any existing task")
             else:
                 all_tasks.extend(matched)
     if tags:
-        all_tasks = [x for x in all_tasks if any(x in tags for x in TaskFile(x).tags.split())]
+        all_tasks = task_index.with_tags(all_tasks, tags)
 
     if not all_tasks:
         env.logger.debug("No task to kill")
@@ -1693,17 +1991,16 @@ def purge_tasks(tasks, purge_all=None, age=None, status=None, tags=None, verbosi
     #     ]
     import glob
 
+    task_index = get_task_index()
     if tasks:
         all_tasks = []
         for t in tasks:
-            matched = glob.glob(os.path.join(os.path.expanduser("~"), ".sos", "tasks", f"{t}*.task"))
-            matched = [(os.path.basename(x)[:-5], os.path.getmtime(x)) for x in matched]
+            matched = task_index.match([t])
             if not matched:
                 print(f"{t}\tmissing")
             all_tasks.extend(matched)
     elif purge_all or age or status or tags:
-        tasks = glob.glob(os.path.join(os.path.expanduser("~"), ".sos", "tasks", "*.task"))
-        all_tasks = [(os.path.basename(x)[:-5], os.path.getmtime(x)) for x in tasks]
+        all_tasks = task_index.match()
     else:
         raise ValueError("Please specify either tasks or one or more of --all, --status, --tags--age")
     #
@@ -1720,7 +2017,8 @@ def purge_tasks(tasks, purge_all=None, age=None, status=None, tags=None, verbosi
         all_tasks = [x for x in all_tasks if task_status[x[0]]["status"] in status]
 
     if tags:
-        all_tasks = [x for x in all_tasks if any(x in tags for x in TaskFile(x[0]).tags.split())]
+        tagged = set(task_index.with_tags([x[0] for x in all_tasks], tags))
+        all_tasks = [x for x in all_tasks if x[0] in tagged]
     #
     # remoe all task files
     all_tasks = set([x[0] for x in all_tasks])
@@ -1759,6 +2057,7 @@ def purge_tasks(tasks, purge_all=None, age=None, status=None, tags=None, verbosi
             status_cache.pop(task, None)
             if removed and verbosity > 1:
                 print(f"{task}\tpurged")
+        task_index.remove(all_tasks)
         with fasteners.InterProcessLock(cache_file + "_"):
             with open(cache_file, "wb") as cache:
                 pickle.dump(status_cache, cache)
@@ -1784,6 +2083,7 @@ def purge_tasks(tasks, purge_all=None, age=None, status=None, tags=None, verbosi
                 except Exception as e:
                     if verbosity > 0:
                         env.logger.warning(f"Failed to remove {e}")
+        task_index.clear()
         if count > 0 and verbosity > 1:
             env.logger.info(f"{count} other files and directories are removed.")
     return ""
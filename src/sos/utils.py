@@ -5,15 +5,18 @@
 
 import argparse
 import ast
+import atexit
 import base64
 import copy
 import getpass
 import logging
+import lzma
 import math
 import os
 import pickle
 import re
 import socket
+import sqlite3
 import sys
 import tempfile
 import threading
@@ -23,6 +26,7 @@ import types
 import urllib
 import urllib.parse
 import urllib.request
+import zlib
 from collections import defaultdict
 from collections.abc import KeysView, Mapping, Sequence, Set
 from hashlib import md5 as full_md5
@@ -300,6 +304,54 @@ def objectMD5(obj):
         return ""
 
 
+#
+# Signatures and blocks of task files are saved as blobs compressed by a
+# codec. Blobs start with a one-byte tag of their codec, except for blobs
+# compressed by lzma, which are recognized by the magic of lzma streams so
+# that they can still be read by earlier versions of SoS.
+#
+LZMA_MAGIC = b"\xfd7zXZ\x00"
+# name -> (tag, compress, decompress)
+blob_codecs = {"lzma": (None, lzma.compress, lzma.decompress)}
+_blob_decompressors = {}
+
+
+def register_blob_codec(name, tag, compress, decompress):
+    """Register a codec with a tag of a single byte, which is saved at the
+    beginning of compressed blobs so that blobs can be decompressed without
+    knowing the codec that compresses them."""
+    if not isinstance(tag, bytes) or len(tag) != 1 or tag == LZMA_MAGIC[:1]:
+        raise ValueError(f"Invalid tag {tag!r} for codec {name}: a single byte other than {LZMA_MAGIC[:1]!r} is expected")
+    if tag in _blob_decompressors and blob_codecs.get(name, (None,))[0] != tag:
+        raise ValueError(f"Tag {tag!r} of codec {name} is already used by another codec")
+    blob_codecs[name] = (tag, compress, decompress)
+    _blob_decompressors[tag] = decompress
+
+
+register_blob_codec("zlib", b"\x01", lambda data: zlib.compress(data, 1), zlib.decompress)
+register_blob_codec("none", b"\x00", bytes, bytes)
+
+
+def compress_blob(data, codec="lzma"):
+    """Compress data with codec, which is one of blob_codecs"""
+    try:
+        tag, compress, _ = blob_codecs[codec]
+    except KeyError as e:
+        raise ValueError(f"Unknown codec {codec}: one of {', '.join(blob_codecs)} is expected") from e
+    return compress(data) if tag is None else tag + compress(data)
+
+
+def decompress_blob(blob):
+    """Decompress a blob compressed by any codec"""
+    if blob.startswith(LZMA_MAGIC):
+        return lzma.decompress(blob)
+    try:
+        decompress = _blob_decompressors[blob[:1]]
+    except KeyError as e:
+        raise ValueError(f"Blob compressed by an unknown codec with tag {blob[:1]!r}") from e
+    return decompress(blob[1:])
+
+
 def fileMD5(filename, sig_type="partial"):
     """Calculate partial MD5, basically the first and last 8M
     of the file for large files. This should signicicantly reduce
@@ -307,7 +359,12 @@ def fileMD5(filename, sig_type="partial"):
     when dealing with large bioinformat ics datasets. If sig_type="full",
     the complete md5 signature will be returned. If sig_type="both", both
     partial and full signatures will be returned as a tuple."""
-    filesize = os.path.getsize(filename)
+    stat = os.stat(filename)
+    if sig_type == "partial":
+        partial_md5 = file_signature_cache.get(stat)
+        if partial_md5 is not None:
+            return partial_md5
+    filesize = stat.st_size
     # calculate md5 for specified file
     partial_sig = hash_md5() if sig_type in ('partial', 'both') else None
     full_sig = full_md5() if sig_type in ('full', 'both') else None
@@ -386,6 +443,8 @@ def fileMD5(filename, sig_type="partial"):
                         partial_sig.update(data[-overlap_size:])
     except IOError as e:
         sys.exit(f"Failed to read {filename}: {e}")
+    if partial_sig:
+        file_signature_cache.set(stat, partial_sig.hexdigest())
     if full_sig and partial_sig:
         return partial_sig.hexdigest(), full_sig.hexdigest()
     if full_sig:
@@ -393,6 +452,196 @@ def fileMD5(filename, sig_type="partial"):
     return partial_sig.hexdigest()
 
 
+class FileSignatureCache(object):
+    """A persistent cache of partial MD5 signatures of files shared by all SoS
+    processes on the same machine so that unchanged files are not hashed again
+    by every worker, task executor and workflow. Files are identified by
+    device, inode, size and modification time (in nanoseconds) so any
+    change to a file invalidates its cached signature. The cache is bounded
+    to max_entries entries with least recently used entries evicted first."""
+
+    _db_structure = [
+        """CREATE TABLE IF NOT EXISTS signatures (
+            st_dev integer,
+            st_ino integer,
+            st_size integer,
+            st_mtime_ns integer,
+            md5 text,
+            last_access real,
+            PRIMARY KEY (st_dev, st_ino, st_size, st_mtime_ns)
+        )""",
+        "CREATE INDEX IF NOT EXISTS signature_last_access ON signatures (last_access)",
+        """CREATE TABLE IF NOT EXISTS counters (
+            name text PRIMARY KEY,
+            value integer
+        )""",
+    ]
+
+    def __init__(self, db_file=None, max_entries=1000000):
+        # the default database is located when it is first used because
+        # HOME can be changed after the module is imported
+        self._db_file = db_file
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._pid = None
+        self._accessed = []
+        self._inserted = {}
+        self._counted = [0, 0]
+        self._num_inserted = 0
+        # the cache is disabled if the database cannot be opened
+        self.disabled = False
+        # signatures can be calculated from multiple threads
+        self._lock = threading.RLock()
+        atexit.register(self.flush)
+
+    def _get_db_file(self):
+        if self._db_file is None:
+            return os.path.join(os.path.expanduser("~"), ".sos", "signatures", "file_signatures.db")
+        return self._db_file
+
+    db_file = property(_get_db_file)
+
+    def _get_conn(self):
+        # a connection (and a lock) cannot be shared by forked processes
+        if self._pid != os.getpid():
+            self._lock = threading.RLock()
+            self._conn = None
+            self._pid = os.getpid()
+        with self._lock:
+            if self._conn is None:
+                if self.disabled:
+                    raise RuntimeError("File signature cache is disabled")
+                try:
+                    self._conn = sqlite3.connect(self.db_file, timeout=60, check_same_thread=False)
+                    for stmt in self._db_structure:
+                        self._conn.execute(stmt)
+                    self._conn.commit()
+                except Exception as e:
+                    self._conn = None
+                    self.disabled = True
+                    env.logger.debug(f"File signature cache {self.db_file} is disabled: {e}")
+                    raise
+                self._accessed = []
+                self._inserted = {}
+                self._counted = [self.hits, self.misses]
+            return self._conn
+
+    conn = property(_get_conn)
+
+    def _key(self, stat):
+        return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def get(self, stat):
+        """Return cached signature of a file with given os.stat_result, or None"""
+        if self.disabled:
+            return None
+        try:
+            conn = self.conn
+            with self._lock:
+                key = self._key(stat)
+                if key in self._inserted:
+                    self.hits += 1
+                    return self._inserted[key][0]
+                res = conn.execute(
+                    "SELECT md5 FROM signatures WHERE st_dev=? AND st_ino=? AND st_size=? AND st_mtime_ns=?",
+                    key).fetchone()
+                if res is None:
+                    self.misses += 1
+                    return None
+                self.hits += 1
+                # access times are updated in batch
+                self._accessed.append((time.time(),) + key)
+        except Exception as e:
+            env.logger.debug(f"Failed to read file signature cache: {e}")
+            return None
+        if len(self._accessed) >= 1000:
+            self.flush()
+        return res[0]
+
+    def set(self, stat, md5):
+        # a file that was modified very recently could be modified again without
+        # changing its mtime on file systems with coarse time resolution
+        if self.disabled or time.time() - stat.st_mtime < 2:
+            return
+        # new signatures are written in batch, and at the end of batch_call
+        # or when the process exits
+        try:
+            self._get_conn()
+        except Exception as e:
+            env.logger.debug(f"Failed to write file signature cache: {e}")
+            return
+        with self._lock:
+            self._inserted[self._key(stat)] = (md5, time.time())
+        if len(self._inserted) >= 100:
+            self.flush()
+
+    def _evict(self):
+        count = self.conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM signatures WHERE rowid IN (SELECT rowid FROM signatures ORDER BY last_access LIMIT ?)",
+                (count - self.max_entries,))
+
+    def flush(self):
+        """Write new signatures, access times and hit counts to the database"""
+        # nothing to write if the cache has not been used
+        if self.disabled or self._conn is None:
+            return
+        try:
+            conn = self.conn
+            with self._lock:
+                if self._inserted:
+                    conn.executemany("INSERT OR REPLACE INTO signatures VALUES (?, ?, ?, ?, ?, ?)",
+                                     [x + y for x, y in self._inserted.items()])
+                    if (self._num_inserted + len(self._inserted)) // 1000 > self._num_inserted // 1000:
+                        self._evict()
+                    self._num_inserted += len(self._inserted)
+                    self._inserted = {}
+                if self._accessed:
+                    conn.executemany(
+                        "UPDATE signatures SET last_access=? WHERE st_dev=? AND st_ino=? AND st_size=? AND st_mtime_ns=?",
+                        self._accessed)
+                    self._accessed = []
+                for name, value, counted in (("hits", self.hits, self._counted[0]), ("misses", self.misses,
+                                                                                   self._counted[1])):
+                    if value > counted:
+                        conn.execute("INSERT OR IGNORE INTO counters VALUES (?, 0)", (name,))
+                        conn.execute("UPDATE counters SET value = value + ? WHERE name=?", (value - counted, name))
+                self._counted = [self.hits, self.misses]
+                conn.commit()
+        except Exception as e:
+            env.logger.debug(f"Failed to update file signature cache: {e}")
+
+    def stats(self):
+        """Return number of hits, misses and hit rate of the cache, accumulated
+        from all processes"""
+        self.flush()
+        try:
+            conn = self.conn
+            with self._lock:
+                counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+        except Exception:
+            counters = {}
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        return {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses) if hits + misses else 0}
+
+    def clear(self):
+        try:
+            conn = self.conn
+            with self._lock:
+                conn.execute("DELETE FROM signatures")
+                conn.execute("DELETE FROM counters")
+                conn.commit()
+        except Exception as e:
+            env.logger.debug(f"Failed to clear file signature cache: {e}")
+
+
+file_signature_cache = FileSignatureCache()
+
+
 #
 # Runtime environment
 #
@@ -510,6 +759,25 @@ class RuntimeEnvironments(object):
             # determined later
             "master_id": "",
             "SOS_DEBUG": set(),
+            # number of threads used to calculate signatures of targets
+            "sig_threads": int(os.environ.get("SOS_SIG_THREADS", min(8, os.cpu_count() or 1))),
+            # maximum number of substeps sent to a worker at a time
+            "max_substep_batch": int(os.environ.get("SOS_MAX_SUBSTEP_BATCH", 64)),
+            # start all local workers in advance, with modules imported
+            "warm_workers": os.environ.get("SOS_WARM_WORKERS", "0") not in ("", "0"),
+            "worker_preload": [x for x in os.environ.get("SOS_WORKER_PRELOAD", "").split(",") if x],
+            # monitor tasks on a node with a single process instead of a thread for each task
+            "node_monitor": os.environ.get("SOS_NODE_MONITOR", "0") not in ("", "0"),
+            # journal mode of signature databases, which can be set to DELETE
+            # for file systems that do not support WAL mode (e.g. NFS)
+            "signature_journal_mode": os.environ.get("SOS_SIGNATURE_JOURNAL_MODE", "WAL"),
+            # codecs that compress step signatures and blocks of task files, which
+            # remain lzma by default so that task files can be read by earlier
+            # versions of SoS on remote hosts
+            "signature_codec": os.environ.get("SOS_SIGNATURE_CODEC", "zlib"),
+            "task_codec": os.environ.get("SOS_TASK_CODEC", "lzma"),
+            # keep analysis of sections in ~/.sos/workflows/section_analysis.db
+            "analysis_cache": os.environ.get("SOS_ANALYSIS_CACHE", "1") not in ("", "0"),
         })
         if "SOS_DEBUG" in os.environ:
             self.config["SOS_DEBUG"] = set([x for x in os.environ["SOS_DEBUG"].split(",") if "." not in x and x != "-"])
@@ -3,11 +3,13 @@
 # Copyright (c) Bo Peng and the University of Texas MD Anderson Cancer Center
 # Distributed under the terms of the 3-clause BSD License.
 
+import importlib
 import multiprocessing as mp
 import os
 import pickle
 import signal
 import time
+from collections import deque
 from typing import Any, Dict, Optional
 
 import zmq
@@ -15,7 +17,7 @@ import zmq
 from .controller import (close_socket, connect_controllers, create_socket,
                          disconnect_controllers)
 from .executor_utils import kill_all_subprocesses, prepare_env
-from .messages import decode_msg, encode_msg
+from .messages import encode_msg, forget_peer, recv_msg, send_msg
 from .utils import (ProcessKilled, env, get_localhost_ip,
                     get_open_files_and_connections, short_repr)
 
@@ -194,6 +196,7 @@ class SoS_Worker(mp.Process):
             pr = cProfile.Profile()
             pr.enable()
 
+        self.preload_modules()
         env.zmq_context = connect_controllers()
 
         # create controller socket
@@ -240,9 +243,9 @@ class SoS_Worker(mp.Process):
                 # avilable ports to the controller. We also need to send a flag to let the
                 # controller know if we have any pending job, and the controller might decide
                 # to kill this worker.
-                env.ctrl_socket.send(
-                    encode_msg([self.num_pending()] + self.available_ports()))
-                reply = decode_msg(env.ctrl_socket.recv())
+                send_msg(env.ctrl_socket,
+                         [self.num_pending()] + self.available_ports())
+                reply = recv_msg(env.ctrl_socket)
 
                 if reply is None:
                     if len(wr) != 0:
@@ -268,6 +271,14 @@ class SoS_Worker(mp.Process):
                     f"WORKER {self.name} ({os.getpid()}, {self.num_pending()} pending) receives {self._type_of_work(reply)} request {self._name_of_work(reply)} with master port {self._master_ports[new_idx]}",
                 )
 
+                if "substeps" in reply:
+                    self.run_substeps(reply["substeps"])
+                    env.log_to_file(
+                        "WORKER",
+                        f"WORKER {self.name} ({os.getpid()}) completes {self._name_of_work(reply)}",
+                    )
+                    self._runners[new_idx] = True
+                    continue
                 if "task" in reply:
                     self.run_substep(reply)
                     env.log_to_file(
@@ -332,6 +343,17 @@ class SoS_Worker(mp.Process):
                 f"Execution profile of worker process {os.getpid()} is saved to {pr_file}"
             )
 
+    def preload_modules(self):
+        # import modules before the worker asks for jobs so that jobs do not
+        # have to wait for them
+        if env.config.get("warm_workers", False):
+            from . import step_executor, substep_executor, workflow_executor  # noqa: F401
+        for module in env.config.get("worker_preload", []):
+            try:
+                importlib.import_module(module)
+            except Exception as e:
+                env.logger.warning(f"Failed to preload module {module}: {e}")
+
     def _type_of_work(self, work):
         if "section" in work:
             return "step"
@@ -339,6 +361,8 @@ class SoS_Worker(mp.Process):
             return "workflow"
         if "task_id" in work:
             return "task"
+        if "substeps" in work:
+            return "substeps"
         return "substep"
 
     def _name_of_work(self, work):
@@ -348,6 +372,8 @@ class SoS_Worker(mp.Process):
             return work["workflow_id"]
         if "task_id" in work:
             return work["task_id"]
+        if "substeps" in work:
+            return f'{len(work["substeps"])} substeps'
         return "substep"
 
     def run_workflow(self, workflow_id, wf, targets, args, shared, config,
@@ -429,6 +455,11 @@ class SoS_Worker(mp.Process):
 
         execute_substep(**work)
 
+    def run_substeps(self, works):
+        from .substep_executor import execute_substeps
+
+        execute_substeps(works)
+
     def run_task(self, work):
         from .task_executor import BaseTaskExecutor
 
@@ -454,6 +485,9 @@ class SoS_Worker(mp.Process):
 class WorkerManager(object):
     # manager worker processes
 
+    # expected time in seconds for a worker to execute a batch of substeps
+    SUBSTEP_BATCH_DURATION = 0.2
+
     def __init__(self, worker_procs, backend_socket):
         if isinstance(worker_procs, (int, str)):
             self._worker_procs = [str(worker_procs)]
@@ -506,7 +540,11 @@ class WorkerManager(object):
         self._local_worker_alive_time = time.time()
         # self._last_pending_time = {}
 
-        self._substep_requests = []
+        self._substep_requests = deque()
+        # number of substeps sent to each worker at a time, and the time
+        # and number of substeps of the last batch sent to the worker
+        self._substep_batch_size = {}
+        self._substep_batches = {}
         self._task_requests = []
         self._step_requests = {}
 
@@ -517,12 +555,18 @@ class WorkerManager(object):
 
         self._available_ports = set()
         self._claimed_ports = set()
+        # requests of idle workers, which are replied when there are jobs
+        # for them instead of letting the workers ask again and again
+        self._idle_workers = {}
 
         self._last_pending_msg = {}
 
         # start a worker, note that we do not start all workers for performance
-        # considerations
+        # considerations, unless a pool of warm workers is requested
         self.start_worker()
+        if env.config.get("warm_workers", False):
+            while self._num_workers[0] < self._max_workers[0]:
+                self.start_worker()
 
     def report(self, msg):
         if "WORKER" in env.config["SOS_DEBUG"] or "ALL" in env.config[
@@ -533,20 +577,36 @@ class WorkerManager(object):
             )
 
     def add_request(self, msg_type, msg):
-        self._n_requested += 1
-        if msg_type == "substep":
-            self._substep_requests.insert(0, msg)
+        if msg_type == "substeps":
+            self._n_requested += len(msg)
+            self._substep_requests.extendleft(msg)
+            self.report(f"{len(msg)} substeps requested")
+        elif msg_type == "substep":
+            self._n_requested += 1
+            self._substep_requests.appendleft(msg)
             self.report("Substep requested")
         elif msg_type == "task":
+            self._n_requested += 1
             self._task_requests.insert(0, msg)
             self.report("Task requested")
         else:
+            self._n_requested += 1
             port = msg["config"]["sockets"]["master_port"]
             self._step_requests[port] = msg
             self.report(f"Step {port} requested")
 
         if sum(self._num_workers) < sum(self._max_workers):
             self.start_worker()
+        self.dispatch_to_idle_workers()
+
+    def dispatch_to_idle_workers(self):
+        """Send requested steps, substeps and tasks to idle workers"""
+        for port, ports in list(self._idle_workers.items()):
+            if not self._step_requests and not self._task_requests and not self._substep_requests:
+                break
+            self._idle_workers.pop(port)
+            # the worker is parked again if there is no job for it
+            self.process_request(0, ports)
 
     def worker_available(self, blocking, excluded):
         if self._available_ports:
@@ -569,7 +629,7 @@ class WorkerManager(object):
         while True:
             if not self._worker_backend_socket.poll(5000):
                 raise RuntimeError("No worker is started after 5 seconds")
-            msg = decode_msg(self._worker_backend_socket.recv())
+            msg = recv_msg(self._worker_backend_socket)
             port = self.process_request(msg[0], msg[1:], request_blocking=True)
             if port is None or port in excluded:
                 continue
@@ -580,6 +640,27 @@ class WorkerManager(object):
             )
             return port
 
+    def substep_batch_size(self, worker):
+        """Number of substeps to be sent to worker. The number is adjusted
+        from the time the worker spent on its last batch so that each batch
+        takes about SUBSTEP_BATCH_DURATION seconds, and is limited by option
+        max_substep_batch and a fair share of pending substeps."""
+        max_batch = env.config.get("max_substep_batch", 1) or 1
+        size = min(self._substep_batch_size.get(worker, 1), max_batch)
+        if worker in self._substep_batches:
+            start, count = self._substep_batches.pop(worker)
+            # expected duration of a batch of the current size
+            duration = (time.time() - start) / count * size
+            if duration < self.SUBSTEP_BATCH_DURATION / 2:
+                size = min(size * 2, max_batch)
+            elif duration > self.SUBSTEP_BATCH_DURATION * 2:
+                size = max(size // 2, 1)
+        self._substep_batch_size[worker] = size
+        return max(
+            1,
+            min(size, -(-len(self._substep_requests) // max(sum(self._num_workers), 1)),
+                len(self._substep_requests)))
+
     def process_request(self, num_pending, ports, request_blocking=False):
         """port is the open port at the worker, num_pending is the num_pending of stack.
         A non-zero num_pending means that the worker is pending on something while
@@ -588,8 +669,8 @@ class WorkerManager(object):
         if any(port in self._step_requests for port in ports):
             # if the port is available
             port = [x for x in ports if x in self._step_requests][0]
-            self._worker_backend_socket.send(
-                encode_msg(self._step_requests.pop(port)))
+            send_msg(self._worker_backend_socket, self._step_requests.pop(port),
+                     peer=ports[0])
             self._n_processed += 1
             self.report(f"Step {port} processed")
             # port should be in claimed ports
@@ -598,7 +679,10 @@ class WorkerManager(object):
             #     self._last_pending_time.pop(ports[0])
         elif any(port in self._claimed_ports for port in ports):
             # the port is claimed, but the real message is not yet available
-            self._worker_backend_socket.send(encode_msg({}))
+            if num_pending == 0:
+                self._idle_workers[ports[0]] = ports
+            else:
+                send_msg(self._worker_backend_socket, {}, peer=ports[0])
             self.report(f"pending with claimed {ports}")
         # elif any(port in self._blocking_ports for port in ports):
         #     # in block list but appear to be idle, kill it
@@ -617,7 +701,7 @@ class WorkerManager(object):
         elif self._task_requests:
             # port is not claimed, free to use for substep worker
             msg = self._task_requests.pop()
-            self._worker_backend_socket.send(encode_msg(msg))
+            send_msg(self._worker_backend_socket, msg, peer=ports[0])
             self._n_processed += 1
             self.report(f"Task processed with {ports[0]}")
             # port can however be in available ports
@@ -628,10 +712,17 @@ class WorkerManager(object):
                 #     self._last_pending_time.pop(port)
         elif self._substep_requests:
             # port is not claimed, free to use for substep worker
-            msg = self._substep_requests.pop()
-            self._worker_backend_socket.send(encode_msg(msg))
-            self._n_processed += 1
-            self.report(f"Substep processed with {ports[0]}")
+            n = self.substep_batch_size(ports[0])
+            if n == 1:
+                msg = self._substep_requests.pop()
+            else:
+                msg = {
+                    "substeps": [self._substep_requests.pop() for _ in range(n)]
+                }
+            self._substep_batches[ports[0]] = (time.time(), n)
+            send_msg(self._worker_backend_socket, msg, peer=ports[0])
+            self._n_processed += n
+            self.report(f"{n} substeps processed with {ports[0]}")
             # port can however be in available ports
             for port in ports:
                 if port in self._available_ports:
@@ -639,7 +730,7 @@ class WorkerManager(object):
                 # if port in self._last_pending_time:
                 #     self._last_pending_time.pop(port)
         elif request_blocking:
-            self._worker_backend_socket.send(encode_msg({}))
+            send_msg(self._worker_backend_socket, {}, peer=ports[0])
             return ports[0]
         # elif num_pending == 0 and self._num_local_workers > 1 and ports[
         #         0] in self._last_pending_time and time.time(
@@ -656,7 +747,12 @@ class WorkerManager(object):
             # if num_pending == 0 and ports[0] not in self._last_pending_time:
             #     self._last_pending_time[ports[0]] = time.time()
             self._available_ports.add(ports[0])
-            self._worker_backend_socket.send(encode_msg({}))
+            if num_pending == 0:
+                # the worker has nothing to do and will be replied when a job arrives
+                self._idle_workers[ports[0]] = ports
+            else:
+                # the worker needs to check its pending jobs
+                send_msg(self._worker_backend_socket, {}, peer=ports[0])
             ports = tuple(ports)
             if (
                     ports,
@@ -749,9 +845,16 @@ class WorkerManager(object):
     def kill_all(self):
         """Kill all workers"""
         total_num_workers = sum(self._num_workers)
+        for port in self._idle_workers:
+            send_msg(self._worker_backend_socket, None, peer=port)
+            forget_peer(self._worker_backend_socket, port)
+            total_num_workers -= 1
+            self.report(f"Kill {port}")
+        self._idle_workers = {}
         while total_num_workers > 0 and self._worker_backend_socket.poll(1000):
-            msg = decode_msg(self._worker_backend_socket.recv())
-            self._worker_backend_socket.send(encode_msg(None))
+            msg = recv_msg(self._worker_backend_socket)
+            send_msg(self._worker_backend_socket, None, peer=msg[1])
+            forget_peer(self._worker_backend_socket, msg[1])
             total_num_workers -= 1
             self.report(f"Kill {msg[1:]}")
         # join all local processes
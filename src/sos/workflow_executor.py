@@ -27,12 +27,19 @@ from .hosts import Host
 from .messages import decode_msg, encode_msg
 from .parser import SoS_Workflow
 from .pattern import extract_pattern
-from .section_analyzer import analyze_section
+from .section_analyzer import analyze_section, clear_analysis_cache
 from .targets import (BaseTarget, RemovedTarget, UnavailableLock, UnknownTarget, file_target, invalid_target,
                       named_output, path, paths, sos_step, sos_targets, sos_variable)
-from .utils import env, get_localhost_ip, pickleable, short_repr, textMD5
+from .utils import env, file_signature_cache, get_localhost_ip, pickleable, short_repr, textMD5
 from .workflow_report import render_report
 
+# milliseconds the master waits for messages from steps before it checks
+# again if a worker is available for queued steps, checks the status of
+# tasks, or, if there is nothing to check, checks anything else
+WORKER_WAIT_INTERVAL = 10
+TASK_WAIT_INTERVAL = 100
+IDLE_WAIT_INTERVAL = 1000
+
 __all__ = []
 
 # try:
@@ -80,8 +87,8 @@ class ProcInfo(object):
 
 class ExecutionManager(object):
     """
-    Execution manager that manages sockets and corresponding steps.
-    For nested workflows (dummy=True), a poller will be created.
+    Execution manager that manages sockets and corresponding steps, with
+    a poller for the sockets to wait for messages from any of the steps.
     """
 
     # this class managers workers and their status ...
@@ -94,7 +101,7 @@ class ExecutionManager(object):
         # on the master process.
         self.step_queue = []
         self.workflow_queue = []
-        self.poller = zmq.Poller() if dummy else None
+        self.poller = zmq.Poller()
         self._dummy = dummy
 
     def report(self, msg=""):
@@ -172,8 +179,32 @@ class ExecutionManager(object):
             master_socket.connect(master_port)
             # we need to create a ProcInfo to keep track of the step
             self.procs.append(ProcInfo(socket=master_socket, port=master_port, step=runnable))
+        self.poller.register(self.procs[-1].socket, zmq.POLLIN)
         return True
 
+    def wait(self) -> None:
+        """Wait till any of the steps sends a message, or for the interval of the
+        next check of available workers, status of tasks etc"""
+        if self.step_queue or self.workflow_queue:
+            timeout = WORKER_WAIT_INTERVAL
+        elif any(x is not None and x.in_status("task_pending") for x in self.procs):
+            timeout = TASK_WAIT_INTERVAL
+        else:
+            timeout = IDLE_WAIT_INTERVAL
+        # steps from nested workflows wait for their targets from child sockets
+        child_sockets = [
+            x.step._child_socket
+            for x in self.procs
+            if x is not None and x.in_status("target_pending") and hasattr(x.step, "_from_nested")
+        ]
+        for socket in child_sockets:
+            self.poller.register(socket, zmq.POLLIN)
+        try:
+            self.poller.poll(timeout)
+        finally:
+            for socket in child_sockets:
+                self.poller.unregister(socket)
+
     def _num_of_procs(self):
         return len([x for x in self.procs if x is not None])
 
@@ -195,6 +226,7 @@ class ExecutionManager(object):
         self.procs[idx] = None
 
     def mark_idle(self, idx: int) -> None:
+        self.poller.unregister(self.procs[idx].socket)
         self.pool.append(self.procs[idx])
         self.procs[idx] = None
 
@@ -763,6 +795,8 @@ class Base_Executor:
     def initialize_dag(self, targets: Optional[List[str]] = [], nested: bool = False) -> SoS_DAG:
         """Create a DAG by analyzing sections statically."""
         self.reset_dict()
+        # files could have been changed since sections were last analyzed
+        clear_analysis_cache()
 
         dag = SoS_DAG(name=self.md5)
         targets = sos_targets(targets)
@@ -869,6 +903,7 @@ class Base_Executor:
         dag.save(env.config["output_dag"])
 
     def handle_dependent_target(self, dag, targets, runnable) -> int:
+        clear_analysis_cache()
         total_added = 0
         resolved = 0
         while True:
@@ -920,9 +955,7 @@ class Base_Executor:
         if total_added:
             if runnable._depends_targets.valid():
                 runnable._depends_targets.extend(targets)
-            for target in targets:
-                if runnable not in dag._all_depends_files[target]:
-                    dag._all_depends_files[target].append(runnable)
+            dag.add_depends(runnable, targets)
             dag.build()
             #
             cycle = dag.circular_dependencies()
@@ -934,6 +967,7 @@ class Base_Executor:
         return total_added
 
     def handle_unknown_target(self, target, dag, runnable):
+        clear_analysis_cache()
         runnable._status = None
         dag.save(env.config["output_dag"])
 
@@ -942,8 +976,7 @@ class Base_Executor:
 
         if dag.regenerate_target(target):
             runnable._depends_targets.extend(target)
-            if runnable not in dag._all_depends_files[target]:
-                dag._all_depends_files[target].append(runnable)
+            dag.add_depends(runnable, sos_targets(target))
 
             dag.build()
             #
@@ -958,8 +991,7 @@ class Base_Executor:
                     f"Failed to regenerate or resolve {target}{dag.steps_depending_on(target, self.workflow)}.")
             if runnable._depends_targets.valid():
                 runnable._depends_targets.extend(target)
-            if runnable not in dag._all_depends_files[target]:
-                dag._all_depends_files[target].append(runnable)
+            dag.add_depends(runnable, sos_targets(target))
             dag.build()
             #
             cycle = dag.circular_dependencies()
@@ -1004,6 +1036,12 @@ class Base_Executor:
             else:
                 sts = "executed successfully"
             env.logger.info(f"Workflow {self.workflow.name} (ID={self.md5}) is {sts} with {self.describe_completed()}.")
+        if "TARGET" in env.config["SOS_DEBUG"] or "ALL" in env.config["SOS_DEBUG"]:
+            stats = file_signature_cache.stats()
+            env.log_to_file(
+                "TARGET",
+                f'File signature cache: {stats["hits"]} hits, {stats["misses"]} misses, hit rate {stats["hit_rate"]:.1%}',
+            )
         if env.config["output_dag"]:
             env.logger.info(f"Workflow DAG saved to {env.config['output_dag']}")
         workflow_info = {
@@ -1486,7 +1524,7 @@ class Base_Executor:
                         f'Master terminate because {"degration" if dag.degraded() else "" } {" all pending" if manager.all_pending() else ""}',
                     )
                     break
-                time.sleep(0.1)
+                manager.wait()
         except KeyboardInterrupt as e:
             if exec_error.errors:
                 pending_steps = dag.pending()[1]
@@ -1722,7 +1760,6 @@ class Base_Executor:
                     break
                 # elif dag.degraded() and manager.all_pending():
                 #     break
-                time.sleep(0.01)
         except KeyboardInterrupt as e:
             if exec_error.errors:
                 pending_steps = dag.pending()[1]
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) Bo Peng and the University of Texas MD Anderson Cancer Center
+# Distributed under the terms of the 3-clause BSD License.
+"""Time the calculation and validation of step signatures of many large files
+with different number of signature threads.
+
+    python bench_batch_signature.py [num_files] [file_size] [threads ...]
+
+The file signature cache is disabled by giving every run files with new
+modification times.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+home = tempfile.mkdtemp()
+os.environ["HOME"] = home
+
+from sos.targets import InMemorySignature, sos_targets  # noqa: E402
+from sos.utils import env  # noqa: E402
+
+if __name__ == "__main__":
+    num_files = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    file_size = int(sys.argv[2]) if len(sys.argv) > 2 else 2**25
+    threads = [int(x) for x in sys.argv[3:]] or [1, 2, 4, 8, 16]
+    env.config["sig_type"] = "partial"
+    data_dir = os.path.join(home, "data")
+    os.makedirs(data_dir)
+    try:
+        block = os.urandom(min(file_size, 2**20))
+        files = []
+        for i in range(num_files):
+            filename = os.path.join(data_dir, f"{i}.bam")
+            with open(filename, "wb") as bam:
+                for _ in range(file_size // len(block)):
+                    bam.write(block)
+                bam.write(block[:file_size % len(block)])
+            files.append(filename)
+        print(f'{"threads":>8} {"write":>10} {"validate":>10}')
+        for idx, num_threads in enumerate(threads):
+            env.config["sig_threads"] = num_threads
+            # a new mtime for each run so signatures are not read from the cache
+            for filename in files:
+                os.utime(filename, (time.time() - 60 - idx, time.time() - 60 - idx))
+            start = time.time()
+            sig = InMemorySignature(sos_targets(files), sos_targets([]), sos_targets([]))
+            content = sig.write()
+            write_time = time.time() - start
+            for filename in files:
+                os.utime(filename, (time.time() - 30 - idx, time.time() - 30 - idx))
+            start = time.time()
+            assert isinstance(sig.validate(content), dict)
+            validate_time = time.time() - start
+            print(f"{num_threads:>8} {write_time:>10.3f} {validate_time:>10.3f}")
+    finally:
+        shutil.rmtree(home)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) Bo Peng and the University of Texas MD Anderson Cancer Center
+# Distributed under the terms of the 3-clause BSD License.
+"""Measure the time to compress and decompress step signatures, task
+parameters and task output with each registered codec, and the size of
+compressed blobs.
+
+    python bench_blob_codecs.py [repeat]
+"""
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+
+home = tempfile.mkdtemp()
+os.environ["HOME"] = home
+os.chdir(home)
+
+from sos.targets import InMemorySignature, sos_targets  # noqa: E402
+from sos.tasks import TaskParams  # noqa: E402
+from sos.utils import blob_codecs, compress_blob, decompress_blob, env  # noqa: E402
+
+
+def step_signature():
+    for i in range(4):
+        with open(f"sample_{i}.fastq", "w") as fq:
+            fq.write("@read\nACGT\n+\nIIII\n" * 1000 * (i + 1))
+    for i in range(2):
+        with open(f"sample_{i}.bam", "w") as bam:
+            bam.write("BAM" * 10000)
+    sdict = {"i": 5, "params": {"threads": 8, "reference": "/ref/hg38.fa", "extra": list(range(20))}}
+    sig = InMemorySignature(
+        sos_targets([f"sample_{i}.fastq" for i in range(4)]),
+        sos_targets([f"sample_{i}.bam" for i in range(2)]),
+        sos_targets([]),
+        signature_vars={"i", "params"},
+        sdict=sdict,
+    )
+    return pickle.dumps(sig.write())
+
+
+def task_params():
+    sos_dict = {
+        "_input": sos_targets([f"sample_{i}.fastq" for i in range(4)]),
+        "_output": sos_targets([f"sample_{i}.bam" for i in range(2)]),
+        "_depends": sos_targets([]),
+        "_index": 5,
+        "step_name": "align_10",
+        "_runtime": {"cores": 8, "mem": 16 * 1024**3, "walltime": "10:00:00", "queue": "cluster"},
+        "CONFIG": {"hosts": {f"host{i}": {"address": f"host{i}.example.com", "paths": {"home": "/home/user"}}
+                             for i in range(10)}},
+        "reference": "/ref/hg38.fa",
+        "samples": [f"sample_{i}" for i in range(200)],
+    }
+    script = "bwa mem -t {threads} {reference} {_input} | samtools sort -o {_output[0]}\n" * 20
+    return pickle.dumps(TaskParams("t1", "import os\nthreads = 8\n", ("", {}, script), sos_dict, ["align"]))
+
+
+def task_stdout():
+    return "".join(f"[M::mem_process_seqs] Processed {i * 10000} reads in {i * 0.37:.3f} CPU sec\n"
+                   for i in range(5000)).encode()
+
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    env.exec_dir = home
+    payloads = [("signature", step_signature()), ("params", task_params()), ("stdout", task_stdout())]
+    print(f'{"payload":>10} {"codec":>6} {"size":>8} {"blob":>8} {"encode (us)":>12} {"decode (us)":>12}')
+    try:
+        for name, payload in payloads:
+            for codec in blob_codecs:
+                blob = compress_blob(payload, codec)
+                start = time.time()
+                for _ in range(repeat):
+                    compress_blob(payload, codec)
+                encode_time = (time.time() - start) / repeat
+                start = time.time()
+                for _ in range(repeat):
+                    decompress_blob(blob)
+                decode_time = (time.time() - start) / repeat
+                assert decompress_blob(blob) == payload
+                print(f"{name:>10} {codec:>6} {len(payload):>8} {len(blob):>8} "
+                      f"{encode_time * 1e6:>12.1f} {decode_time * 1e6:>12.1f}")
+    finally:
+        os.chdir("/")
+        shutil.rmtree(home)
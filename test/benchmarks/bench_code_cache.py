@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) Bo Peng and the University of Texas MD Anderson Cancer Center
+# Distributed under the terms of the 3-clause BSD License.
+"""Measure the time to execute the statements of substeps, to evaluate the
+expressions of their input and output statements, and to interpolate their
+scripts, with and without the cache of compiled code objects.
+
+    python bench_code_cache.py [num_substeps]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+home = tempfile.mkdtemp()
+os.environ["HOME"] = home
+
+from sos import eval as sos_eval  # noqa: E402
+from sos.eval import SoS_eval, SoS_exec, interpolate  # noqa: E402
+from sos.utils import env  # noqa: E402
+
+statement = '''\
+sample = samples[_index % len(samples)]
+prefix = f"{sample}_{_index}"
+size = len(prefix) * 2
+prefix
+'''
+expression = "f'{sample}.bam', f'{sample}.bai'"
+script = "bwa mem -t {threads} {reference} {sample}.fastq > {prefix}.sam\n"
+
+
+def run(num_substeps):
+    env.sos_dict.set("samples", [f"sample_{i}" for i in range(100)])
+    env.sos_dict.set("threads", 8)
+    env.sos_dict.set("reference", "/ref/hg38.fa")
+    start = time.time()
+    for idx in range(num_substeps):
+        env.sos_dict.set("_index", idx)
+        SoS_exec(statement)
+        SoS_eval(expression)
+        interpolate(script, env.sos_dict.dict())
+    return time.time() - start
+
+
+if __name__ == "__main__":
+    num_substeps = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    env.verbosity = 0
+    print(f'{"cache":>8} {"substeps":>10} {"time (s)":>10} {"us/substep":>10} {"hits":>10} {"misses":>8}')
+    try:
+        for size in (0, sos_eval.CODE_CACHE_SIZE):
+            sos_eval.code_cache.clear()
+            sos_eval.code_cache.size = size
+            elapsed = run(num_substeps)
+            info = sos_eval.code_cache.info()
+            print(f"{size:>8} {num_substeps:>10} {elapsed:>10.2f} {elapsed / num_substeps * 1e6:>10.1f} "
+                  f"{info['hits']:>10} {info['misses']:>8}")
+    finally:
+        shutil.rmtree(home)
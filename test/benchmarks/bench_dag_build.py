@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) Bo Peng and the University of Texas MD Anderson Cancer Center
+# Distributed under the terms of the 3-clause BSD License.
+"""Time the building of a target-driven DAG, with auxiliary steps added in
+batches and SoS_DAG.build() called after each batch, as the executor does when
+it resolves dangling targets.
+
+    python bench_dag_build.py [num_steps [batch_size]]
+
+The default is 10000 steps added in batches of 100 steps.
+"""
+import sys
+import time
+
+from sos.dag import SoS_DAG
+from sos.targets import sos_targets
+
+
+def build_dag(num_steps, batch_size):
+    dag = SoS_DAG()
+    dag.new_forward_workflow()
+    context = {
+        '__changed_vars__': set(),
+        '__signature_vars__': set(),
+        '__environ_vars__': set()
+    }
+    # the default step that depends on the output of the last auxiliary step
+    dag.add_step('default', 'default', 1, sos_targets([]),
+                 sos_targets(f'{num_steps - 1}.txt'), sos_targets([]),
+                 context)
+    dag.build()
+    # auxiliary steps n.txt depending on (n-1).txt and n/2.txt
+    for start in range(num_steps - 1, -1, -batch_size):
+        for n in range(start, max(start - batch_size, -1), -1):
+            depends = [f'{x}.txt' for x in {n - 1, n // 2} if 0 <= x < n]
+            dag.add_step('aux', f'aux {n}', None, sos_targets([]),
+                         sos_targets(depends), sos_targets(f'{n}.txt'), context)
+        dag.build()
+    return dag
+
+
+if __name__ == "__main__":
+    num_steps = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    start = time.time()
+    dag = build_dag(num_steps, batch_size)
+    elapsed = time.time() - start
+    assert dag.number_of_nodes() == num_steps + 1
+    print(f'{num_steps} steps, {dag.number_of_edges()} edges, '
+          f'{num_steps // batch_size} builds: {elapsed:.3f} seconds')
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) Bo Peng and the University of Texas MD Anderson Cancer Center
+# Distributed under the terms of the 3-clause BSD License.
+"""Time the scheduling of all nodes of a DAG, using the ready queue of SoS_DAG
+and a full scan of nodes and in-edges for each call of find_executable, which
+was how SoS_DAG found executable nodes before.
+
+    python bench_dag_scheduling.py [num_nodes ...]
+
+The full scan is quadratic and is only timed for DAGs with at most 10000 nodes.
+"""
+import sys
+import time
+
+from sos.dag import SoS_DAG, SoS_Node
+from sos.targets import sos_targets
+
+
+def create_dag(num_nodes):
+    dag = SoS_DAG()
+    nodes = [
+        SoS_Node(str(i), f'step_{i}', None, None, sos_targets([]),
+                 sos_targets([]), sos_targets([]), None)
+        for i in range(num_nodes)
+    ]
+    for node in nodes:
+        dag.add_node(node)
+    # a binary tree of dependencies, plus a chain of every tenth nodes
+    for i in range(1, num_nodes):
+        dag.add_edge(nodes[(i - 1) // 2], nodes[i])
+        if i % 10 == 0:
+            dag.add_edge(nodes[i - 10], nodes[i])
+    return dag
+
+
+def scan_executable(dag):
+    for node in dag.nodes():
+        if node._status is None and all(
+                x._status == 'completed' for x, _ in dag.in_edges(node)):
+            return node
+    return None
+
+
+def schedule(dag, find_executable):
+    # run each node as the executor does, with at most 8 running nodes
+    running = []
+    count = 0
+    while True:
+        node = find_executable(dag)
+        if node is not None and len(running) < 8:
+            node._status = 'running'
+            running.append(node)
+            continue
+        if not running:
+            break
+        running.pop(0)._status = 'completed'
+        count += 1
+        dag.running()
+    return count
+
+
+if __name__ == "__main__":
+    sizes = [int(x) for x in sys.argv[1:]] or [1000, 10000, 100000]
+    print(f'{"nodes":>10} {"build":>10} {"scan":>10} {"queue":>10}')
+    for size in sizes:
+        start = time.time()
+        dag = create_dag(size)
+        build_time = time.time() - start
+        if size <= 10000:
+            start = time.time()
+            assert schedule(dag, scan_executable) == size
+            scan_time = f'{time.time() - start:>10.3f}'
+            dag = create_dag(size)
+        else:
+            scan_time = f'{"-":>10}'
+        start = time.time()
+        assert schedule(dag, SoS_DAG.find_executable) == size
+        queue_time = time.time() - start
+        print(f'{size:>10} {build_time:>10.3f} {scan_time} {queue_time:>10.3f}')
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) Bo Peng and the University of Texas MD Anderson Cancer Center
+# Distributed under the terms of the 3-clause BSD License.
+"""Time the calculation of signatures of unchanged files with a cold and a
+warm file signature cache.
+
+    python bench_file_signature_cache.py [num_files] [file_size]
+
+Files and the cache are created under a temporary directory.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+home = tempfile.mkdtemp()
+os.environ["HOME"] = home
+
+from sos.targets import file_target  # noqa: E402
+from sos.utils import env, file_signature_cache  # noqa: E402
+
+if __name__ == "__main__":
+    num_files = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    file_size = int(sys.argv[2]) if len(sys.argv) > 2 else 2**25
+    env.config["sig_type"] = "partial"
+    data_dir = os.path.join(home, "data")
+    os.makedirs(data_dir)
+    try:
+        block = os.urandom(min(file_size, 2**20))
+        files = []
+        for i in range(num_files):
+            filename = os.path.join(data_dir, f"{i}.bam")
+            with open(filename, "wb") as bam:
+                for _ in range(file_size // len(block)):
+                    bam.write(block)
+                bam.write(block[:file_size % len(block)])
+            # files that are modified in the last few seconds are not cached
+            os.utime(filename, (time.time() - 60, time.time() - 60))
+            files.append(filename)
+        for run in ("cold", "warm", "warm"):
+            hits = file_signature_cache.hits
+            misses = file_signature_cache.misses
+            start = time.time()
+            for filename in files:
+                file_target(filename).target_signature()
+            elapsed = time.time() - start
+            print(f"{run}: {num_files} files in {elapsed:.3f}s, "
+                  f"{file_signature_cache.hits - hits} hits, {file_signature_cache.misses - misses} misses")
+        print(file_signature_cache.stats())
+    finally:
+        shutil.rmtree(home)
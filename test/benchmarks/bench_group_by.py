@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) Bo Peng and the University of Texas MD Anderson Cancer Center
+# Distributed under the terms of the 3-clause BSD License.
+"""Measure the time to group labeled sos_targets with every group_by option,
+and to pair and expand them with paired_with, group_with and for_each.
+Targets have one label for every 100 targets, and combinations are
+calculated for at most 1000 targets because the number of groups grows
+quadratically.
+
+    python bench_group_by.py [num_targets ...]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+home = tempfile.mkdtemp()
+os.environ["HOME"] = home
+
+from sos.targets import sos_targets  # noqa: E402
+from sos.utils import env  # noqa: E402
+
+LABEL_SIZE = 100
+
+
+def labeled_targets(num_targets):
+    targets = sos_targets(
+        [f"data/chunk_{i:07d}.fastq.gz" for i in range(num_targets)])
+    targets.labels = [f"s{i // LABEL_SIZE}" for i in range(num_targets)]
+    return targets
+
+
+def by_targets(targets):
+    return [[x] for x in targets]
+
+
+def group_by(by, max_targets=None):
+
+    def run(num_targets):
+        targets = labeled_targets(min(num_targets, max_targets or num_targets))
+        start = time.time()
+        targets._group(by)
+        return time.time() - start, targets._num_groups()
+
+    return run
+
+
+def paired_with(num_targets):
+    targets = labeled_targets(num_targets)
+    start = time.time()
+    targets.paired_with("_value", list(range(num_targets)))
+    return time.time() - start, targets._num_groups()
+
+
+def group_with(num_targets):
+    targets = labeled_targets(num_targets)._group(1)
+    start = time.time()
+    targets.group_with("_value", list(range(num_targets)))
+    return time.time() - start, targets._num_groups()
+
+
+def for_each(num_targets):
+    targets = labeled_targets(num_targets)._group("source")
+    env.sos_dict.set("values", list(range(LABEL_SIZE)))
+    start = time.time()
+    targets._handle_for_each("values")
+    return time.time() - start, targets._num_groups()
+
+
+CASES = [
+    ("all", group_by("all")),
+    ("single", group_by("single")),
+    ("2", group_by(2)),
+    ("pairs", group_by("pairs")),
+    ("pairs2", group_by("pairs2")),
+    ("pairwise", group_by("pairwise")),
+    ("pairwise2", group_by("pairwise2")),
+    ("combinations", group_by("combinations", max_targets=1000)),
+    ("source", group_by("source")),
+    ("pairsource", group_by("pairsource")),
+    ("pairlabel2", group_by("pairlabel2")),
+    ("callable", group_by(by_targets)),
+    ("paired_with", paired_with),
+    ("group_with", group_with),
+    ("for_each", for_each),
+]
+
+if __name__ == "__main__":
+    sizes = [int(x) for x in sys.argv[1:]] or [10000, 100000, 1000000]
+    print(f'{"targets":>10} {"group_by":>14} {"groups":>10} {"time":>10}')
+    try:
+        for size in sizes:
+            for name, case in CASES:
+                elapsed, num_groups = case(size)
+                print(f"{size:>10} {name:>14} {num_groups:>10} {elapsed:>10.3f}",
+                      flush=True)
+    finally:
+        shutil.rmtree(home)
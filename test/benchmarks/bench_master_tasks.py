@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) Bo Peng and the University of Texas MD Anderson Cancer Center
+# Distributed under the terms of the 3-clause BSD License.
+"""Measure the number of subtasks executed per second when a process executes
+a chain of master tasks (e.g. sos execute t1 t2 ... on a cluster node), with
+subtasks of 1 second executed by a pool of trunk_workers processes.
+
+    python bench_master_tasks.py [num_master_tasks [trunk_size [trunk_workers]]]
+
+Tasks are created by a workflow and executed again by this process under a
+temporary HOME and working directory.
+"""
+import glob
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+home = tempfile.mkdtemp()
+os.environ["HOME"] = home
+os.chdir(home)
+
+from sos import execute_workflow  # noqa: E402
+from sos.task_executor import BaseTaskExecutor  # noqa: E402
+from sos.utils import env  # noqa: E402
+
+script = '''
+[1]
+common = {{f'key_{{i}}': f'value_{{i}}' for i in range(10000)}}
+input: for_each=dict(i=range({num_subtasks}))
+task: trunk_size={trunk_size}, trunk_workers={trunk_workers}
+import time
+time.sleep(1)
+print(f'subtask {{i}}')
+'''
+
+if __name__ == "__main__":
+    num_master_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    trunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    trunk_workers = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    try:
+        execute_workflow(
+            script.format(
+                num_subtasks=num_master_tasks * trunk_size,
+                trunk_size=trunk_size,
+                trunk_workers=trunk_workers),
+            options={
+                'sig_mode': 'force',
+                'verbosity': 0,
+                'default_queue': 'localhost',
+                'max_running_jobs': 1,
+            })
+        master_ids = [
+            os.path.basename(x)[:-5] for x in glob.glob(
+                os.path.join(home, '.sos', 'tasks', f't{trunk_size}*.task'))
+        ]
+        env.config['sig_mode'] = 'force'
+        env.config['verbosity'] = 0
+        start = time.time()
+        for master_id in master_ids:
+            BaseTaskExecutor().execute(master_id)
+        elapsed = time.time() - start
+        num_subtasks = len(master_ids) * trunk_size
+        print(f'{len(master_ids)} master tasks with {num_subtasks} subtasks and '
+              f'{trunk_workers} workers: {elapsed:.3f} seconds, '
+              f'{num_subtasks / elapsed:.2f} subtasks per second')
+    finally:
+        os.chdir('/')
+        shutil.rmtree(home)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) Bo Peng and the University of Texas MD Anderson Cancer Center
+# Distributed under the terms of the 3-clause BSD License.
+"""Compare the size of pulse files and the time to summarize them (as sos
+status -v4 does for running tasks) in the text format of earlier versions
+of SoS and in the binary format of fixed size.
+
+    python bench_pulse.py [num_samples ...]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+home = tempfile.mkdtemp()
+os.environ["HOME"] = home
+
+from sos.monitor import PulseFile, summarizeExecution  # noqa: E402
+
+
+def samples(num_samples):
+    for i in range(num_samples):
+        yield (1.6e9 + i, 99.5, 1024 * 1024 * (i % 1000), 4, 350.25, 4096 * 1024 * 1024)
+
+
+def write_text(filename, num_samples):
+    with open(filename, "w") as pd:
+        pd.write("#time\tproc_cpu\tproc_mem\tchildren\tchildren_cpu\tchildren_mem\n")
+        for t, cpu, mem, nch, ch_cpu, ch_mem in samples(num_samples):
+            pd.write(f"{t}\t{cpu:.2f}\t{mem}\t{nch}\t{ch_cpu}\t{ch_mem}\n")
+
+
+def write_binary(filename, num_samples):
+    pulse = PulseFile(filename)
+    pulse.create()
+    for sample in samples(num_samples):
+        pulse.add_sample(*sample)
+
+
+def summarize(filename):
+    with open(filename, "rb") as pd:
+        return summarizeExecution("t", pd.read(), status="running")
+
+
+if __name__ == "__main__":
+    sizes = [int(x) for x in sys.argv[1:]] or [1000, 10000, 100000]
+    print(f'{"samples":>10} {"format":>8} {"write":>10} {"size":>10} {"summarize":>10}')
+    try:
+        for size in sizes:
+            for fmt, writer in (("text", write_text), ("binary", write_binary)):
+                filename = os.path.join(home, f"{fmt}.pulse")
+                start = time.time()
+                writer(filename, size)
+                write_time = time.time() - start
+                start = time.time()
+                for _ in range(10):
+                    summarize(filename)
+                summarize_time = (time.time() - start) / 10
+                print(f"{size:>10} {fmt:>8} {write_time:>10.3f} {os.path.getsize(filename):>10} "
+                      f"{summarize_time:>10.5f}")
+    finally:
+        shutil.rmtree(home)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) Bo Peng and the University of Texas MD Anderson Cancer Center
+# Distributed under the terms of the 3-clause BSD License.
+"""Measure the time to build the DAG of a script with many auxiliary steps
+that are added backward to generate targets, for a first run (with an empty
+section analysis database), a repeated run, and a run without the database.
+
+    python bench_section_analysis.py [num_steps ...]
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def create_script(num_steps):
+    global_stmts = "".join(f"par_{i} = {i}\ndef func_{i}(x):\n    return x + par_{i}\n" for i in range(50))
+    steps = [f"[global]\n{global_stmts}\n"]
+    for i in range(num_steps):
+        steps.append(f"""
+[step_{i}]
+parameter: n_{i} = {i}
+input: f'out_{i - 1}_{{n_{i} - 1}}.txt'
+output: name_{i}=f'out_{i}_{{n_{i}}}.txt'
+a = func_{i % 50}(n_{i})
+b = [par_{i % 50}, a]
+_output.touch()
+""")
+    steps.append("[default]\ndepends: " + ", ".join(f"named_output('name_{i}')" for i in range(num_steps)) + "\n")
+    return "".join(steps)
+
+
+def measure(num_steps):
+    from sos.parser import SoS_Script
+    from sos.workflow_executor import Base_Executor
+
+    with open("out_-1_-1.txt", "w"):
+        pass
+    wf = SoS_Script(create_script(num_steps)).workflow("default")
+    executor = Base_Executor(wf, config={"output_dag": "", "sig_mode": "ignore"})
+    start = time.time()
+    executor.initialize_dag()
+    return time.time() - start
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--measure":
+        print(f"{measure(int(sys.argv[2])):.2f}")
+        sys.exit(0)
+    sizes = [int(x) for x in sys.argv[1:]] or [50, 200, 500]
+    print(f'{"steps":>8} {"no db (s)":>14} {"first (s)":>10} {"repeated (s)":>14}')
+    for size in sizes:
+        # each measurement runs in its own process, with the same HOME
+        # for the first and repeated run
+        home = tempfile.mkdtemp()
+        try:
+            times = []
+            for cache in ("0", "1", "1"):
+                times.append(
+                    subprocess.run([sys.executable, os.path.abspath(__file__), "--measure",
+                                    str(size)],
+                                   env=dict(os.environ, HOME=home, SOS_ANALYSIS_CACHE=cache),
+                                   cwd=home,
+                                   check=True,
+                                   stdout=subprocess.PIPE).stdout.decode().strip())
+            print(f"{size:>8} {times[0]:>14} {times[1]:>10} {times[2]:>14}", flush=True)
+        finally:
+            shutil.rmtree(home)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) Bo Peng and the University of Texas MD Anderson Cancer Center
+# Distributed under the terms of the 3-clause BSD License.
+"""Measure the time for several sos processes to write workflow and step
+signatures to the signature databases of the same project at the same
+time, and the time to look up records of a workflow while they write,
+with the signature databases in WAL and DELETE (rollback) journal modes.
+
+    python bench_signature_db.py [num_writers [num_records [commit_every]]]
+"""
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+home = tempfile.mkdtemp()
+os.environ["HOME"] = home
+
+from sos.signatures import StepSignatures, WorkflowSignatures  # noqa: E402
+from sos.utils import env  # noqa: E402
+
+
+def writer(journal_mode, writer_id, num_records, commit_every, start_event):
+    env.exec_dir = home
+    env.config["signature_journal_mode"] = journal_mode
+    env.config["master_id"] = f"workflow_{writer_id}"
+    workflow_sigs = WorkflowSignatures()
+    step_sigs = StepSignatures()
+    # create the databases before all writers start
+    workflow_sigs.commit()
+    step_sigs.commit()
+    start_event.wait()
+    for i in range(num_records):
+        workflow_sigs.write("tracked_files", f"step_{writer_id}_{i}", repr({"input": [f"a_{i}.txt"]}))
+        step_sigs.set(f"step_{writer_id}_{i}", {"input": [f"a_{i}.txt"], "output": [f"b_{i}.txt"]})
+        if i % commit_every == commit_every - 1:
+            # sent by the step executor after each step
+            workflow_sigs.commit()
+            step_sigs.commit()
+    workflow_sigs.close()
+    step_sigs.close()
+
+
+def reader(journal_mode, num_writers, stop_event, result):
+    env.exec_dir = home
+    env.config["signature_journal_mode"] = journal_mode
+    workflow_sigs = WorkflowSignatures(read_only=True)
+    lookups = []
+    while not stop_event.is_set():
+        start = time.time()
+        workflow_sigs.records(f"workflow_{len(lookups) % num_writers}")
+        lookups.append(time.time() - start)
+        time.sleep(0.01)
+    result.put((len(lookups), max(lookups) if lookups else 0, sum(lookups) / max(len(lookups), 1)))
+
+
+def measure(journal_mode, num_writers, num_records, commit_every):
+    for db in os.listdir(home):
+        if db.endswith((".db", ".db-wal", ".db-shm", ".db-journal")):
+            os.remove(os.path.join(home, db))
+    start_event = mp.Event()
+    stop_event = mp.Event()
+    result = mp.Queue()
+    writers = [
+        mp.Process(target=writer, args=(journal_mode, i, num_records, commit_every, start_event))
+        for i in range(num_writers)
+    ]
+    for proc in writers:
+        proc.start()
+    # wait for the databases to be created
+    time.sleep(1)
+    lookup = mp.Process(target=reader, args=(journal_mode, num_writers, stop_event, result))
+    lookup.start()
+    start = time.time()
+    start_event.set()
+    for proc in writers:
+        proc.join()
+    elapsed = time.time() - start
+    stop_event.set()
+    num_lookups, max_lookup, avg_lookup = result.get()
+    lookup.join()
+    print(f"{journal_mode:>8} {num_writers:>8} {num_writers * num_records:>10} {elapsed:>10.2f} "
+          f"{num_lookups:>8} {avg_lookup * 1000:>10.2f} {max_lookup * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    num_writers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    num_records = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    commit_every = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    print(f'{"journal":>8} {"writers":>8} {"records":>10} {"write (s)":>10} '
+          f'{"lookups":>8} {"avg (ms)":>10} {"max (ms)":>10}')
+    try:
+        for mode in ("DELETE", "WAL"):
+            measure(mode, num_writers, num_records, commit_every)
+    finally:
+        shutil.rmtree(home)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) Bo Peng and the University of Texas MD Anderson Cancer Center
+# Distributed under the terms of the 3-clause BSD License.
+"""Measure the time to create, pickle and copy sos_targets with many files,
+grouped by one file per substep, and the memory and pickle size they use,
+with compact storage of targets (the default) and with SOS_COMPACT_TARGETS=0.
+
+    python bench_sos_targets.py [num_targets ...]
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+
+def measure(num_targets):
+    import copy
+    import pickle
+    import resource
+    import time
+    import tracemalloc
+
+    from sos.targets import sos_targets
+
+    names = [
+        f"data/sample_{i:07d}/chunk_{i:07d}.fastq.gz"
+        for i in range(num_targets)
+    ]
+    start = time.time()
+    targets = sos_targets(names, group_by=1)
+    create_time = time.time() - start
+    # memory is measured separately because tracing slows down creation
+    tracemalloc.start()
+    sos_targets(names, group_by=1)
+    memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    start = time.time()
+    pickled = pickle.dumps(targets)
+    pickle_time = time.time() - start
+    start = time.time()
+    copy.deepcopy(targets)
+    copy_time = time.time() - start
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    mode = "list" if os.environ.get("SOS_COMPACT_TARGETS") == "0" else "compact"
+    print(
+        f"{num_targets:>10} {mode:>8} {create_time:>8.2f} {memory / 1e6:>10.1f} "
+        f"{len(pickled) / 1e6:>10.1f} {pickle_time:>8.2f} {copy_time:>9.2f} {rss / 1e3:>9.0f}",
+        flush=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--measure":
+        measure(int(sys.argv[2]))
+        sys.exit(0)
+    sizes = [int(x) for x in sys.argv[1:]] or [100000, 1000000]
+    print(f'{"targets":>10} {"mode":>8} {"create":>8} {"memory MB":>10} '
+          f'{"pickle MB":>10} {"pickle":>8} {"deepcopy":>9} {"RSS MB":>9}')
+    home = tempfile.mkdtemp()
+    try:
+        for size in sizes:
+            for compact in ("1", "0"):
+                # each measurement runs in its own process so that the
+                # peak RSS of one mode does not affect the other
+                subprocess.run(
+                    [sys.executable, __file__, "--measure",
+                     str(size)],
+                    env=dict(os.environ, HOME=home, SOS_COMPACT_TARGETS=compact),
+                    check=True)
+    finally:
+        shutil.rmtree(home)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) Bo Peng and the University of Texas MD Anderson Cancer Center
+# Distributed under the terms of the 3-clause BSD License.
+"""Measure the latency of the master process to hand off a step to the next
+one in a chain of steps that do nothing, and the CPU time used by the master
+process while its only step is sleeping.
+
+    python bench_step_handoff.py [num_steps [idle_seconds]]
+"""
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def chained_steps(num_steps):
+    # each step depends on the previous one
+    return "".join(f"[chain_{i + 1}]\n_output = None\n" for i in range(num_steps))
+
+
+def measure(num_steps, idle_seconds):
+    from sos import execute_workflow
+
+    options = {'sig_mode': 'ignore', 'verbosity': 0, 'worker_procs': ['2']}
+    # warm up workers
+    execute_workflow("[chain_1]\n", workflow="chain", options=options)
+    start = time.time()
+    execute_workflow(chained_steps(num_steps), workflow="chain", options=options)
+    handoff = (time.time() - start) / num_steps
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = usage.ru_utime + usage.ru_stime
+    start = time.time()
+    execute_workflow(f"[idle]\nimport time\ntime.sleep({idle_seconds})\n", workflow="idle", options=options)
+    elapsed = time.time() - start
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    idle_cpu = (usage.ru_utime + usage.ru_stime - cpu) / elapsed
+    print(f'{num_steps:>8} {handoff * 1000:>14.1f} {idle_cpu * 100:>14.1f}', flush=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--measure":
+        measure(int(sys.argv[2]), float(sys.argv[3]))
+        sys.exit(0)
+    num_steps = sys.argv[1] if len(sys.argv) > 1 else "200"
+    idle_seconds = sys.argv[2] if len(sys.argv) > 2 else "10"
+    print(f'{"steps":>8} {"handoff (ms)":>14} {"idle CPU (%)":>14}')
+    home = tempfile.mkdtemp()
+    try:
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--measure", num_steps, idle_seconds],
+                       env=dict(os.environ, HOME=home),
+                       cwd=home,
+                       stderr=subprocess.DEVNULL,
+                       check=True)
+    finally:
+        shutil.rmtree(home)
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) Bo Peng and the University of Texas MD Anderson Cancer Center
+# Distributed under the terms of the 3-clause BSD License.
+"""Measure the peak memory (RSS) of workers that execute a step with many
+concurrent substeps created by for_each, which should not grow much with the
+number of substeps.
+
+    python bench_step_memory.py [num_substeps ...]
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+script = '''
+[1]
+input: for_each=dict(i=range({num_substeps}))
+output: f'{{i}}.out'
+_output.touch()
+'''
+
+
+def measure(num_substeps):
+    import resource
+    import time
+
+    from sos import execute_workflow
+
+    start = time.time()
+    execute_workflow(
+        script.format(num_substeps=num_substeps),
+        options={
+            'sig_mode': 'ignore',
+            'verbosity': 0,
+            'worker_procs': ['4']
+        })
+    elapsed = time.time() - start
+    # peak RSS of the largest worker, which is the one that executes the step
+    rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    print(f'{num_substeps:>10} {elapsed:>10.1f} {rss / 1e3:>10.0f}', flush=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--measure":
+        measure(int(sys.argv[2]))
+        sys.exit(0)
+    sizes = [int(x) for x in sys.argv[1:]] or [1000, 10000, 50000]
+    print(f'{"substeps":>10} {"time":>10} {"RSS MB":>10}')
+    for size in sizes:
+        # each measurement runs in its own process and directory
+        home = tempfile.mkdtemp()
+        try:
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--measure",
+                            str(size)],
+                           env=dict(os.environ, HOME=home),
+                           cwd=home,
+                           check=True)
+        finally:
+            shutil.rmtree(home)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) Bo Peng and the University of Texas MD Anderson Cancer Center
+# Distributed under the terms of the 3-clause BSD License.
+"""Measure the number of concurrent substeps executed per second with
+different maximum number of substeps sent to a worker at a time (option
+max_substep_batch, 1 for no batching).
+
+    python bench_substep_batch.py [num_substeps [workers [batch_sizes]]]
+
+where batch_sizes is a comma separated list of batch sizes (default to
+1,4,16,64).
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+home = tempfile.mkdtemp()
+os.environ["HOME"] = home
+os.chdir(home)
+
+from sos import execute_workflow  # noqa: E402
+
+script = '''
+[1]
+input: for_each=dict(i=range({num_substeps}))
+value = i * i
+'''
+
+if __name__ == "__main__":
+    num_substeps = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    workers = sys.argv[2] if len(sys.argv) > 2 else '4'
+    batch_sizes = [
+        int(x) for x in (sys.argv[3] if len(sys.argv) > 3 else '1,4,16,64').split(',')
+    ]
+    print(f'{"batch":>8} {"seconds":>8} {"substeps/s":>10}')
+    try:
+        for batch_size in batch_sizes:
+            start = time.time()
+            execute_workflow(
+                script.format(num_substeps=num_substeps),
+                options={
+                    'sig_mode': 'ignore',
+                    'verbosity': 0,
+                    'worker_procs': [workers],
+                    'max_substep_batch': batch_size
+                })
+            elapsed = time.time() - start
+            print(f'{batch_size:>8} {elapsed:>8.3f} {num_substeps / elapsed:>10.1f}')
+    finally:
+        os.chdir('/')
+        shutil.rmtree(home)
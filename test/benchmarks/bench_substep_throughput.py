@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) Bo Peng and the University of Texas MD Anderson Cancer Center
+# Distributed under the terms of the 3-clause BSD License.
+"""Measure the number of concurrent substeps executed per second, which are
+sent from the step executor to the controller, and from the WorkerManager of
+the controller to workers.
+
+    python bench_substep_throughput.py [num_substeps [global_size [workers]]]
+
+The step uses a global variable of global_size items (default to 10000) so
+that substep requests carry large global definitions and variables.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+home = tempfile.mkdtemp()
+os.environ["HOME"] = home
+os.chdir(home)
+
+from sos import execute_workflow  # noqa: E402
+
+script = '''
+[global]
+lookup = {{f'key_{{i}}': f'value_{{i}}' for i in range({global_size})}}
+
+def get_value(values, i):
+    return values[f'key_{{i}}']
+
+[1]
+input: for_each=dict(i=range({num_substeps}))
+value = get_value(lookup, i)
+'''
+
+if __name__ == "__main__":
+    num_substeps = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    global_size = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    workers = sys.argv[3] if len(sys.argv) > 3 else '4'
+    try:
+        start = time.time()
+        execute_workflow(
+            script.format(num_substeps=num_substeps, global_size=global_size),
+            options={
+                'sig_mode': 'ignore',
+                'verbosity': 0,
+                'worker_procs': [workers]
+            })
+        elapsed = time.time() - start
+        print(f'{num_substeps} substeps with {workers} workers: {elapsed:.3f} '
+              f'seconds, {num_substeps / elapsed:.1f} substeps per second')
+    finally:
+        os.chdir('/')
+        shutil.rmtree(home)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) Bo Peng and the University of Texas MD Anderson Cancer Center
+# Distributed under the terms of the 3-clause BSD License.
+"""Compare the time to list and filter tasks by scanning ~/.sos/tasks and by
+querying the task index. Column "first" is the first query that imports
+existing task files, "index" is a query on an unchanged task directory, and
+"busy" is a query after running tasks have changed their side files and
+status, which makes the index compare the task files with the index.
+
+    python bench_task_index.py [num_tasks ...]
+
+Tasks are created under a temporary HOME directory, so the benchmark does not
+touch existing tasks.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+home = tempfile.mkdtemp()
+os.environ["HOME"] = home
+
+from sos.tasks import (TaskDirectoryIndex, TaskFile, TaskIndex,  # noqa: E402
+                       TaskParams)
+
+
+def create_tasks(num_tasks):
+    task_dir = os.path.join(home, ".sos", "tasks")
+    shutil.rmtree(task_dir, ignore_errors=True)
+    os.makedirs(task_dir)
+    TaskFile("0" * 16).save(
+        TaskParams(name="0" * 16, global_def=None, task="a = 1", sos_dict={"a": 1}, tags=["bench"]))
+    with open(os.path.join(task_dir, "0" * 16 + ".task"), "rb") as tf:
+        content = tf.read()
+    for i in range(1, num_tasks):
+        with open(os.path.join(task_dir, f"{i:016x}.task"), "wb") as tf:
+            tf.write(content)
+    # start from an empty index so that the first query imports existing task files
+    TaskIndex().clear()
+
+
+def run_tasks(num_tasks):
+    # tasks executed on another host create and remove their side files and
+    # change their status without updating the index
+    task_dir = os.path.join(home, ".sos", "tasks")
+    for i in range(num_tasks):
+        task_id = f"{i:016x}"
+        with open(os.path.join(task_dir, task_id + ".pulse"), "w"):
+            pass
+        os.utime(os.path.join(task_dir, task_id + ".task"))
+        os.remove(os.path.join(task_dir, task_id + ".pulse"))
+
+
+def timeit(func):
+    start = time.time()
+    res = func()
+    return time.time() - start, res
+
+
+def status_query(index):
+    # sos status -a --tags bench
+    tasks = index.match()
+    return index.with_tags([x[0] for x in tasks], ["bench"])
+
+
+def prefix_query(index):
+    # sos status 0000000000000f
+    return index.match(["0000000000000f"])
+
+
+if __name__ == "__main__":
+    sizes = [int(x) for x in sys.argv[1:]] or [10000, 100000, 1000000]
+    print(f'{"tasks":>10} {"query":>8} {"directory":>10} {"first":>10} {"index":>10} {"busy":>10}')
+    try:
+        for size in sizes:
+            create_tasks(size)
+            for name, query in (("status", status_query), ("prefix", prefix_query)):
+                dir_time, dir_res = timeit(lambda: query(TaskDirectoryIndex()))
+                index = TaskIndex()
+                migrate_time, _ = timeit(lambda: query(index))
+                index_time, index_res = timeit(lambda: query(index))
+                run_tasks(100)
+                busy_time, busy_res = timeit(lambda: query(index))
+                assert len(dir_res) == len(index_res) == len(busy_res)
+                print(f"{size:>10} {name:>8} {dir_time:>10.3f} {migrate_time:>10.3f} {index_time:>10.3f} "
+                      f"{busy_time:>10.3f}")
+    finally:
+        shutil.rmtree(home)
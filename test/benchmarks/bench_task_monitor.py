@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) Bo Peng and the University of Texas MD Anderson Cancer Center
+# Distributed under the terms of the 3-clause BSD License.
+"""Measure the CPU time used to monitor concurrent tasks on a node, with a
+TaskMonitor thread for each task, or a single NodeMonitor for all tasks.
+
+    python bench_task_monitor.py [num_tasks [seconds]]
+
+Each task is a process with a child process. Tasks are monitored with short
+intervals (0.1 second for status and 0.5 second for resources) to make the
+overhead measurable.
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+home = tempfile.mkdtemp()
+os.environ["HOME"] = home
+os.chdir(home)
+
+from sos.monitor import NodeMonitor, NodeMonitorClient, TaskMonitor  # noqa: E402
+from sos.tasks import TaskFile, TaskParams  # noqa: E402
+
+monitor_interval = 0.1
+resource_monitor_interval = 0.5
+
+
+def start_tasks(num_tasks, seconds):
+    tasks = {}
+    for i in range(num_tasks):
+        task_id = f"{i:016x}"
+        tf = TaskFile(task_id)
+        tf.save(TaskParams(name=task_id, global_def=None, task="", sos_dict={}, tags=[]))
+        tf.status = "running"
+        tasks[task_id] = subprocess.Popen([
+            sys.executable, "-c",
+            f"import subprocess, time; p = subprocess.Popen(['sleep', '{seconds + 5}']); time.sleep({seconds + 5})"
+        ])
+    return tasks
+
+
+def stop_tasks(tasks):
+    for task_id, proc in tasks.items():
+        TaskFile(task_id).status = "completed"
+        proc.kill()
+        proc.wait()
+
+
+def measure(num_tasks, seconds, node_monitor):
+    tasks = start_tasks(num_tasks, seconds)
+    try:
+        if node_monitor:
+            for task_id, proc in tasks.items():
+                client = NodeMonitorClient(task_id, monitor_interval, resource_monitor_interval)
+                client.registration["pid"] = proc.pid
+                client.register()
+            monitors = [threading.Thread(target=NodeMonitor(idle_timeout=1).run, daemon=True)]
+        else:
+            monitors = []
+            for task_id, proc in tasks.items():
+                m = TaskMonitor(task_id, monitor_interval, resource_monitor_interval)
+                m.pid = proc.pid
+                monitors.append(m)
+        start = time.process_time()
+        for m in monitors:
+            m.start()
+        time.sleep(seconds)
+        return time.process_time() - start
+    finally:
+        stop_tasks(tasks)
+        for m in monitors:
+            m.join()
+
+
+if __name__ == "__main__":
+    num_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    seconds = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    try:
+        for node_monitor in (False, True):
+            cpu = measure(num_tasks, seconds, node_monitor)
+            print(f'{"NodeMonitor" if node_monitor else "TaskMonitor"} for {num_tasks} tasks: '
+                  f'{cpu:.2f} CPU seconds in {seconds} seconds ({cpu / seconds * 100:.1f}% of a core)')
+    finally:
+        os.chdir('/')
+        shutil.rmtree(home)
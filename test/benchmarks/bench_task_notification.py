@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) Bo Peng and the University of Texas MD Anderson Cancer Center
+# Distributed under the terms of the 3-clause BSD License.
+"""Measure the latency from the completion of a local task to the resumption
+of the step that waits for it, with status of tasks notified by the tasks and
+polled by the task engine.
+
+    python bench_task_notification.py [num_runs]
+
+Tasks are executed under a temporary HOME and working directory.
+"""
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+
+home = tempfile.mkdtemp()
+os.environ["HOME"] = home
+os.chdir(home)
+
+from sos import execute_workflow  # noqa: E402
+
+script = '''
+[1]
+task: queue='{queue}'
+import time
+time.sleep(0.5)
+with open('done.txt', 'w') as done:
+    done.write(repr(time.time()))
+
+[2]
+import time
+with open('latency.txt', 'a') as latency:
+    latency.write(f"{{time.time() - float(open('done.txt').read())}}\\n")
+'''
+
+config = {
+    'hosts': {
+        'notify': {
+            'address': 'localhost',
+            'status_notification': True
+        },
+        'poll': {
+            'address': 'localhost',
+            'status_notification': False
+        }
+    }
+}
+
+if __name__ == "__main__":
+    num_runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    print(f'{"queue":>8} {"mean":>8} {"median":>8} {"max":>8}')
+    try:
+        for queue in ('poll', 'notify'):
+            if os.path.isfile('latency.txt'):
+                os.remove('latency.txt')
+            for _ in range(num_runs):
+                execute_workflow(
+                    script.format(queue=queue),
+                    config=config,
+                    options={
+                        'sig_mode': 'force',
+                        'verbosity': 0
+                    })
+            with open('latency.txt') as latency:
+                values = [float(x) for x in latency]
+            print(f'{queue:>8} {statistics.mean(values):>8.3f} '
+                  f'{statistics.median(values):>8.3f} {max(values):>8.3f}')
+    finally:
+        os.chdir('/')
+        shutil.rmtree(home)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) Bo Peng and the University of Texas MD Anderson Cancer Center
+# Distributed under the terms of the 3-clause BSD License.
+"""Measure the start latency of workers, namely the time from the start of a
+workflow to the first substep executed by each worker, with workers started
+on demand or in advance (option warm_workers), and the time to set up the
+namespace of substeps from global definitions with and without the cache of
+executed global definitions.
+
+    python bench_warm_workers.py [workers [num_runs]]
+"""
+import os
+import pickle
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+home = tempfile.mkdtemp()
+os.environ["HOME"] = home
+os.chdir(home)
+
+from sos import execute_workflow  # noqa: E402
+from sos.eval import analyze_global_statements  # noqa: E402
+from sos.executor_utils import _global_def_cache, prepare_env  # noqa: E402
+
+global_stmt = '''
+import os
+import json
+from collections import defaultdict
+
+''' + '\n'.join(f'''
+def func_{i}(x):
+    return x + {i}
+''' for i in range(100))
+
+script = '''
+[1]
+input: for_each=dict(i=range({num_substeps}))
+import os, time
+with open('start_times.txt', 'a') as st:
+    st.write(f'{{os.getpid()}} {{time.time()}}\\n')
+time.sleep(0.5)
+'''
+
+
+def worker_latency(workers, warm):
+    if os.path.isfile('start_times.txt'):
+        os.remove('start_times.txt')
+    start = time.time()
+    execute_workflow(
+        script.format(num_substeps=int(workers) * 2),
+        options={
+            'sig_mode': 'ignore',
+            'verbosity': 0,
+            'worker_procs': [workers],
+            'warm_workers': warm,
+        })
+    first = {}
+    with open('start_times.txt') as st:
+        for line in st:
+            pid, stamp = line.split()
+            first[pid] = min(float(stamp), first.get(pid, float(stamp)))
+    return [x - start for x in first.values()]
+
+
+def setup_time(cached, repeat=200):
+    # without the cache, each substep unpickles and executes global_def,
+    # otherwise global_def is shared by substeps and is executed once
+    global_def, global_vars = analyze_global_statements(global_stmt)
+    data = pickle.dumps(global_def)
+    start = time.time()
+    for _ in range(repeat):
+        if not cached:
+            _global_def_cache.clear()
+            global_def = pickle.loads(data)
+        prepare_env(global_def, global_vars)
+    return (time.time() - start) / repeat
+
+
+if __name__ == "__main__":
+    workers = sys.argv[1] if len(sys.argv) > 1 else '4'
+    num_runs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    try:
+        for warm in (False, True):
+            latencies = sum((worker_latency(workers, warm) for _ in range(num_runs)), [])
+            print(f'{"warm" if warm else "cold"} workers: mean start latency {statistics.mean(latencies):.3f} '
+                  f'seconds, max {max(latencies):.3f} seconds')
+        for cached in (False, True):
+            print(f'substep setup {"with" if cached else "without"} global_def cache: '
+                  f'{setup_time(cached) * 1000:.3f} ms')
+    finally:
+        os.chdir('/')
+        shutil.rmtree(home)
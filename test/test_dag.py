@@ -8,8 +8,9 @@ from io import StringIO
 
 import pytest
 from sos import execute_workflow
+from sos.dag import SoS_DAG, SoS_Node
 from sos.parser import SoS_Script
-from sos.targets import file_target
+from sos.targets import file_target, sos_targets
 from sos.utils import env
 # if the test is imported under sos/test, test interacive executor
 from sos.workflow_executor import Base_Executor
@@ -364,6 +365,88 @@ def test_cycle():
         Base_Executor(wf).initialize_dag()
 
 
+def test_ready_queue():
+    '''Test the ready queue of DAG maintained by status changes of nodes'''
+    dag = SoS_DAG()
+    A, B, C, D = [
+        SoS_Node(x, x, None, None, sos_targets([]), sos_targets([]),
+                 sos_targets([]), None) for x in 'ABCD'
+    ]
+    for node in (A, B, C, D):
+        dag.add_node(node)
+    #  A -> C, B -> C, C -> D
+    dag.add_edge(A, C)
+    dag.add_edge(B, C)
+    dag.add_edge(C, D)
+    assert dag.find_executable() is A
+    assert dag.node_by_id(C._node_uuid) is C
+    A._status = 'running'
+    assert dag.find_executable() is B
+    assert dag.running() == [A]
+    B._status = 'running'
+    assert dag.find_executable() is None
+    A._status = 'completed'
+    assert dag.find_executable() is None
+    B._status = 'failed'
+    assert dag.find_executable() is None
+    assert dag.pending() == ([B], [C, D])
+    # re-run B
+    B._status = None
+    assert dag.find_executable() is B
+    B._status = 'completed'
+    assert dag.find_executable() is C
+    C._status = 'completed'
+    assert dag.find_executable() is D
+    # if C is to be re-executed, D has to wait
+    C._status = None
+    assert dag.find_executable() is C
+    # new dependency added after a node becomes ready
+    E = SoS_Node('E', 'E', None, None, sos_targets([]), sos_targets([]),
+                 sos_targets([]), None)
+    dag.add_edge(E, C)
+    assert dag.find_executable() is E
+    E._status = 'completed'
+    assert dag.find_executable() is C
+
+
+def test_incremental_build():
+    '''Test adding nodes and targets after a DAG is built'''
+    dag = SoS_DAG()
+
+    def context(changed=set(), used=set()):
+        return {
+            '__changed_vars__': changed,
+            '__signature_vars__': used,
+            '__environ_vars__': set()
+        }
+
+    dag.new_forward_workflow()
+    dag.add_step('A', 'A', 1, sos_targets([]), sos_targets([]),
+                 sos_targets('a.txt'), context({'a'}))
+    dag.add_step('B', 'B', 2, sos_targets([]), sos_targets([]),
+                 sos_targets([]), context())
+    dag.add_step('C', 'C', 3, sos_targets([]), sos_targets([]),
+                 sos_targets([]), context(used={'a'}))
+    dag.build()
+    A, B, C = dag.nodes()
+    assert set(dag.edges()) == {(A, C)}
+    # a step that depends on a.txt
+    dag.add_step('D', 'D', None, sos_targets([]), sos_targets('a.txt'),
+                  sos_targets('d.txt'), context())
+    D = list(dag.nodes())[-1]
+    dag.build()
+    assert set(dag.edges()) == {(A, C), (A, D)}
+    # another step that generates a.txt
+    dag.add_step('E', 'E', None, sos_targets([]), sos_targets([]),
+                 sos_targets('a.txt'), context())
+    E = list(dag.nodes())[-1]
+    # and a dependency added to an existing node
+    dag.add_depends(B, sos_targets('d.txt'))
+    dag.build()
+    assert set(dag.edges()) == {(A, C), (A, D), (E, D), (D, B)}
+    assert dag.find_executable() is A
+
+
 def test_long_chain(clear_now_and_after):
     '''Test long make file style dependencies.'''
     #
@@ -3,6 +3,7 @@
 # Copyright (c) Bo Peng and the University of Texas MD Anderson Cancer Center
 # Distributed under the terms of the 3-clause BSD License.
 
+import collections
 import glob
 import os
 import subprocess
@@ -176,6 +177,161 @@ def test_for_each(temp_factory):
     assert env.sos_dict["all_loop"] == "1 1 1 2 2 2 "
 
 
+@pytest.mark.parametrize("batch_size", [1, 8])
+def test_batched_substeps(clear_now_and_after, batch_size):
+    """Test substeps sent to workers in batches"""
+    clear_now_and_after([f"batch_{i}.out" for i in range(40)])
+    execute_workflow(
+        r"""
+        [0: shared={'res':'step_output'}]
+        input: for_each=dict(i=range(40))
+        output: f'batch_{i}.out'
+        _output.touch()
+        """,
+        options={
+            "max_substep_batch": batch_size,
+            "worker_procs": ["4"]
+        },
+    )
+    assert env.sos_dict["res"] == sos_targets([f"batch_{i}.out" for i in range(40)])
+    #
+    with pytest.raises(Exception):
+        execute_workflow(
+            r"""
+            input: for_each=dict(i=range(40))
+            if i == 25:
+                raise ValueError('failed substep')
+            """,
+            options={"max_substep_batch": batch_size},
+        )
+
+
+def test_global_vars_in_task_params(clear_now_and_after):
+    """Test global variables used only in task parameters of concurrent substeps"""
+    clear_now_and_after([f"tagged_{i}.out" for i in range(3)])
+    execute_workflow(
+        r"""
+        [global]
+        tag = 'abc'
+        wt = '1h'
+
+        [1]
+        input: for_each=dict(i=range(3))
+        output: f'tagged_{i}.out'
+        task: tags=tag, walltime=wt
+        _output.touch()
+        """,
+        options={"default_queue": "localhost"},
+    )
+    for i in range(3):
+        assert os.path.isfile(f"tagged_{i}.out")
+
+
+def test_warm_workers(clear_now_and_after):
+    """Test workers started in advance with preloaded modules"""
+    clear_now_and_after("warm_modules.txt")
+    execute_workflow(
+        r"""
+        [global]
+        import os
+
+        def module_loaded(name):
+            import sys
+            return name in sys.modules
+
+        [1]
+        input: for_each=dict(i=range(10))
+        loaded = module_loaded('wave')
+
+        with open('warm_modules.txt', 'a') as out:
+            out.write(f'{i} {loaded}\n')
+        """,
+        options={
+            "warm_workers": True,
+            "worker_preload": ["wave"],
+            "worker_procs": ["3"]
+        },
+    )
+    with open("warm_modules.txt") as out:
+        lines = out.read().split("\n")
+    assert sorted(lines[:-1]) == [f"{i} True" for i in range(10)]
+
+
+def test_growing_substep_batches(monkeypatch):
+    """Test that substeps are sent in batches that grow from one substep"""
+    import sos.step_executor
+    from sos.step_executor import Base_Step_Executor
+
+    sent = []
+    monkeypatch.setattr(sos.step_executor, "send_message_to_controller", sent.append)
+    monkeypatch.setitem(env.config, "max_substep_batch", 4)
+    executor = Base_Step_Executor.__new__(Base_Step_Executor)
+    executor._pending_substeps = []
+    executor._substep_batch_size = 1
+    for i in range(12):
+        executor.submit_substep(i)
+    executor.flush_substeps()
+    assert sent == [["substep", 0], ["substeps", [1, 2]], ["substeps", [3, 4, 5, 6]], ["substeps", [7, 8, 9, 10]],
+                    ["substep", 11]]
+
+
+def test_max_pending_substeps(monkeypatch):
+    """Test that the number of pending substeps depends on the number of workers"""
+    from sos.step_executor import get_max_pending_substeps
+
+    monkeypatch.setitem(env.config, "max_substep_batch", 64)
+    monkeypatch.setitem(env.config, "worker_procs", ["4"])
+    assert get_max_pending_substeps(True) == 512
+    monkeypatch.setitem(env.config, "worker_procs", ["4", "node1:8"])
+    assert get_max_pending_substeps(True) == 1536
+    monkeypatch.setitem(env.config, "max_substep_batch", 1)
+    assert get_max_pending_substeps(True) == 100
+    # option concurrent sets the number of pending substeps
+    assert get_max_pending_substeps(10) == 10
+
+
+def test_idle_workers(monkeypatch):
+    """Test that idle workers are replied when jobs arrive"""
+    import sos.workers
+    from sos.workers import WorkerManager
+
+    sent = []
+    monkeypatch.setattr(sos.workers, "send_msg", lambda socket, msg, peer: sent.append((peer, msg)))
+    manager = WorkerManager.__new__(WorkerManager)
+    manager.__dict__.update(
+        _num_workers=[2],
+        _max_workers=[2],
+        _n_requested=0,
+        _n_processed=0,
+        _substep_requests=collections.deque(),
+        _substep_batch_size={},
+        _substep_batches={},
+        _task_requests=[],
+        _step_requests={},
+        _worker_backend_socket=None,
+        _available_ports=set(),
+        _claimed_ports=set(),
+        _idle_workers={},
+        _last_pending_msg={},
+    )
+    # workers with pending jobs are replied at once, idle workers wait for jobs
+    manager.process_request(1, ["port1"])
+    manager.process_request(0, ["port2", "port3"])
+    assert sent == [("port1", {})]
+    assert manager._available_ports == {"port1", "port2"}
+    manager.add_request("substep", {"task": "t1"})
+    assert sent[-1] == ("port2", {"task": "t1"})
+    # a step is sent to the worker of the claimed port when it is requested
+    manager.process_request(0, ["port2", "port3"])
+    assert len(sent) == 2
+    assert manager.worker_available(False, ["port1"]) == "port2"
+    manager.process_request(0, ["port2", "port3"])
+    assert len(sent) == 2
+    manager.add_request("step", {"config": {"sockets": {"master_port": "port2"}}})
+    assert sent[-1] == ("port2", {"config": {"sockets": {"master_port": "port2"}}})
+    assert not manager._idle_workers
+
+
 def test_for_each_same_level(temp_factory):
     """Test for_each option of input"""
     temp_factory("a.txt", "b.txt", "a.pdf")
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) Bo Peng and the University of Texas MD Anderson Cancer Center
+# Distributed under the terms of the 3-clause BSD License.
+
+import io
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from sos import hosts
+from sos.hosts import RemoteHost
+from sos.targets import file_target, sos_targets
+
+
+@pytest.fixture
+def loopback_host(tmp_path, monkeypatch):
+    # a remote host with an agent started locally instead of through ssh,
+    # and with send and receive commands recorded instead of executed
+    transfers = []
+
+    def record_transfer(cmd, **kwargs):
+        files_from = None
+        if '--files-from=' in cmd:
+            files_from = cmd.split('--files-from=')[1].split()[0]
+            with open(files_from) as flist:
+                files_from = flist.read().split()
+        transfers.append((cmd, files_from))
+        return 0
+
+    monkeypatch.setattr(hosts.subprocess, 'call', record_transfer)
+    local_dir = tmp_path / 'local'
+    remote_dir = tmp_path / 'remote'
+    local_dir.mkdir()
+    # mapped paths on the "remote" host point to the same files
+    remote_dir.symlink_to(local_dir)
+    host = RemoteHost(
+        {
+            'alias': 'loopback',
+            'address': 'loopback',
+            'agent_cmd': 'sos preview --agent',
+            'path_map': f'{local_dir} -> {remote_dir}'
+        },
+        test_connection=False)
+    host.transfers = transfers
+    monkeypatch.chdir(local_dir)
+    yield host
+    if host._session:
+        host._session.close()
+
+
+def test_remote_agent_round_trips(loopback_host):
+    '''Test batched requests to remote agent'''
+    names = [f'file_{i}.txt' for i in range(200)]
+    for name in names:
+        with open(name, 'w') as ifile:
+            ifile.write(name)
+    # commands are executed under home or mapped working directory
+    assert loopback_host.check_output('pwd').strip() == os.path.expanduser(
+        '~')
+    assert loopback_host._session.round_trips == 1
+    assert os.path.realpath(
+        loopback_host.check_output('pwd', under_workdir=True).strip()
+    ) == os.path.realpath(loopback_host._map_var(os.getcwd()))
+    assert loopback_host._session.round_trips == 2
+    #
+    targets = [sos_targets(x) for x in names] + [sos_targets('missing.txt')]
+    assert loopback_host.batch_target_exists(targets) == [True] * 200 + [False]
+    assert loopback_host._session.round_trips == 3
+    sigs = loopback_host.batch_target_signature(targets[:-1])
+    assert sigs == [str(x.target_signature()) for x in targets[:-1]]
+    assert loopback_host._session.round_trips == 4
+    #
+    with pytest.raises(subprocess.CalledProcessError):
+        loopback_host.check_output('exit 3')
+    assert loopback_host.target_exists(sos_targets(names[0]))
+    assert loopback_host._session.round_trips == 6
+    # commands that time out do not block the agent
+    loopback_host.config['agent_timeout'] = 1
+    with pytest.raises(RuntimeError):
+        loopback_host.check_output('sleep 10')
+    assert loopback_host.check_output('echo ok').strip() == 'ok'
+    assert loopback_host._session.round_trips == 8
+
+
+def test_agent_errors(tmp_path, monkeypatch):
+    '''Test errors returned by the remote agent'''
+    from sos.hosts import _encode_targets, serve_remote_requests
+    from sos.targets import file_target
+
+    # fileMD5 exits if a file cannot be read
+    monkeypatch.setattr(file_target, 'target_signature',
+                        lambda self: sys.exit(f'Failed to read {self}'))
+    request = {
+        'ops': [['signature', _encode_targets(sos_targets('a.txt'))],
+                ['mkdir', str(tmp_path / 'newdir')]]
+    }
+    outstream = io.StringIO()
+    serve_remote_requests(io.StringIO(json.dumps(request) + '\n'), outstream)
+    results = json.loads(outstream.getvalue().splitlines()[-1])
+    assert results[0] == [False, 'Failed to read a.txt']
+    assert results[1] == [True, None] and (tmp_path / 'newdir').is_dir()
+
+
+def test_remote_targets(loopback_host, monkeypatch):
+    '''Test checking remote targets of a host in one request'''
+    from sos.hosts import Host
+    from sos.targets import (batch_target_exists, batch_target_signature,
+                             remote)
+
+    names = [f'file_{i}.txt' for i in range(20)]
+    for name in names:
+        with open(name, 'w') as ifile:
+            ifile.write(name)
+    monkeypatch.setattr(
+        Host, '__init__',
+        lambda self, *args, **kwargs: setattr(self, '_host_agent', loopback_host))
+    targets = [remote(x, host='loopback') for x in names + ['missing.txt']]
+    assert batch_target_exists(targets + [file_target(names[0])]) == [True] * 20 + [False, True]
+    assert loopback_host._session.round_trips == 1
+    assert batch_target_signature(targets[:-1]) == [
+        str(sos_targets(x).target_signature()) for x in names
+    ]
+    assert loopback_host._session.round_trips == 2
+
+
+def test_batched_transfer(loopback_host):
+    '''Test sending and receiving files with one rsync command'''
+    os.makedirs('data')
+    names = [f'data/file_{i}.txt' for i in range(2000)] + ['a.txt']
+    for name in names:
+        with open(name, 'w') as ifile:
+            ifile.write(name)
+    sent = loopback_host.send_to_host(names)
+    assert len(sent) == len(names)
+    # mkdir of the remote directory is sent to the agent
+    assert loopback_host._session.round_trips == 1
+    assert len(loopback_host.transfers) == 1
+    cmd, files = loopback_host.transfers[0]
+    assert cmd.startswith('rsync')
+    assert f'loopback:{loopback_host._map_var(os.getcwd())}/' in cmd
+    assert sorted(files) == sorted(names)
+    #
+    received = loopback_host.receive_from_host(names)
+    assert len(received) == len(names)
+    assert len(loopback_host.transfers) == 2
+    cmd, files = loopback_host.transfers[1]
+    assert f'loopback:{loopback_host._map_var(os.getcwd())}/' in cmd
+    assert sorted(files) == sorted(names)
+    # renamed files are still copied one by one
+    with open('renamed.txt', 'w') as ifile:
+        ifile.write('renamed')
+    loopback_host.path_map[os.path.abspath('renamed.txt')] = loopback_host._map_var(os.path.abspath('remote.txt'))
+    sent = loopback_host.send_to_host(['renamed.txt'])
+    assert list(sent.values()) == [loopback_host._map_var(os.path.abspath('remote.txt'))]
+    assert len(loopback_host.transfers) == 3
+    cmd, files = loopback_host.transfers[2]
+    assert files is None and 'remote.txt' in cmd
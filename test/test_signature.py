@@ -857,4 +857,49 @@ def test_signature_with_local_parameter(clear_signatures):
     assert open('constant-file-name.txt').read().strip() == '60'
 
     execute_workflow(script, args=['--n-mx', '80'])
-    assert open('constant-file-name.txt').read().strip() == '80'
\ No newline at end of file
+    assert open('constant-file-name.txt').read().strip() == '80'
+
+def test_signature_database(tmp_path, monkeypatch):
+    '''Test schema upgrade, queries and read-only access of signature databases'''
+    import sqlite3
+
+    from sos.signatures import WorkflowSignatures
+
+    monkeypatch.setattr(env, 'exec_dir', str(tmp_path))
+    monkeypatch.setitem(env.config, 'master_id', 'w1')
+    # database created by an earlier version of SoS, without indexes
+    conn = sqlite3.connect(str(tmp_path / 'workflow_signatures.db'))
+    conn.execute('''CREATE TABLE workflows (master_id text, entry_type text, id text, item text)''')
+    conn.execute("INSERT INTO workflows VALUES ('w0', 'placeholder', 'p', 'old.txt')")
+    conn.commit()
+    conn.close()
+    #
+    db = WorkflowSignatures()
+    db.write('placeholder', 'p', 'a.txt')
+    db.write('tracked_files', 'f', "{'b.txt': 1}")
+    monkeypatch.setitem(env.config, 'master_id', 'w"2')
+    db.write('placeholder', 'p', 'c.txt')
+    db.commit()
+    assert db.conn.execute('PRAGMA user_version').fetchone()[0] == 1
+    assert db.conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert {x[0] for x in db.conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")} == {
+        'workflows_master_id', 'workflows_entry_type'
+    }
+    assert sorted(db.placeholders()) == ['a.txt', 'c.txt', 'old.txt']
+    assert db.placeholders('w1') == ['a.txt']
+    # workflow ids are passed as parameters of queries
+    assert db.placeholders('w"2') == ['c.txt']
+    assert db.placeholders('" OR "1"="1') == []
+    assert db.records('w1') == [('placeholder', 'p', 'a.txt'), ('tracked_files', 'f', "{'b.txt': 1}")]
+    # readers do not wait for or block writers
+    reader = WorkflowSignatures(read_only=True)
+    assert reader.files() == [('f', {'b.txt': 1})]
+    db.write('placeholder', 'p', 'd.txt')
+    db.commit()
+    assert 'd.txt' in reader.placeholders()
+    db.close()
+    reader.close()
+    # read only databases are not created
+    monkeypatch.setattr(env, 'exec_dir', str(tmp_path / 'missing'))
+    assert WorkflowSignatures(read_only=True).placeholders() == []
+    assert not os.path.exists(tmp_path / 'missing' / 'workflow_signatures.db')
@@ -106,6 +106,26 @@ def test_target_group_by():
     assert len(res.groups) == 3
 
 
+def test_group_by_interleaved_labels():
+    """Test grouping of targets whose labels are not contiguous"""
+    res = sos_targets([f"{x}.txt" for x in range(6)])
+    res.labels = ["a", "b", "a", "c", "b", "a"]
+    assert [g._indexes for g in res._group("source")._groups
+           ] == [[0, 2, 5], [1, 4], [3]]
+    with pytest.raises(ValueError):
+        res._group("pairsource")
+    res.labels = ["a", "b", "a", "c", "b", "c"]
+    assert [g._indexes for g in res._group("pairsource")._groups
+           ] == [[0, 1, 3], [2, 4, 5]]
+    assert [g._labels for g in res._group("pairlabel")._groups
+           ] == [["a", "b", "c"], ["a", "b", "c"]]
+    # targets returned by customized grouping are found by path
+    res._group(lambda x: [["./5.txt", x[1]], [os.path.abspath("0.txt")]])
+    assert [g._indexes for g in res._groups] == [[5, 1], [0]]
+    with pytest.raises(ValueError):
+        res._group(lambda x: [["6.txt"]])
+
+
 def test_target_paired_with():
     """Test paired_with targets with vars"""
     res = sos_targets(
@@ -235,6 +255,51 @@ def test_iter_targets():
         assert str(i) == str(idx + 1)
 
 
+def test_compact_targets():
+    """Test that file targets are kept as names and created on access"""
+    import pickle
+    names = [f"chunk_{i}.fastq" for i in range(10)]
+    t = sos_targets(names, group_by=2)
+    assert all(isinstance(x, str) for x in t._targets._items)
+    assert isinstance(t[3], file_target)
+    assert t[3] == file_target("chunk_3.fastq")
+    # accessed targets are kept so that their properties are not lost
+    t[3].set("reads", 100)
+    assert t[3].get("reads") == 100
+    assert isinstance(t._targets._items[3], file_target)
+    assert len(t.groups) == 5
+    assert [str(x) for x in t.groups[1]] == ["chunk_2.fastq", "chunk_3.fastq"]
+    assert t.groups[1][1].get("reads") == 100
+    #
+    u = pickle.loads(pickle.dumps(t))
+    assert isinstance(u._targets._items[0], str)
+    assert u.labels == t.labels
+    assert len(u.groups) == 5
+    assert u[3].get("reads") == 100
+    #
+    v = copy.deepcopy(t)
+    v.extend(sos_targets(sos_step("more")))
+    assert len(v) == 11 and len(t) == 10
+    v.remove_targets(type=sos_step)
+    assert len(v) == 10
+    assert isinstance(v._targets._items[0], str)
+    assert v.groups[1] == ["chunk_2.fastq", "chunk_3.fastq"]
+
+
+def test_lazy_groups():
+    """Test groups of sos_targets that are created when accessed"""
+    t = sos_targets([f"{x}.txt" for x in range(6)], group_by=2)
+    groups = t._lazy_groups()
+    assert len(groups) == 3
+    assert groups[1] == ["2.txt", "3.txt"]
+    assert groups[-1] == ["4.txt", "5.txt"]
+    assert [len(x) for x in groups[:2]] == [2, 2]
+    assert list(groups) == t.groups
+    # groups reflect variables set to groups of sos_targets
+    t.group_with("name", ["a", "b", "c"])
+    assert [x.name for x in groups] == ["a", "b", "c"]
+
+
 def test_expand_wildcard():
     """test wildcard expansion of sos_targets"""
     a = sos_targets("*.py")
@@ -3,6 +3,7 @@
 # Copyright (c) Bo Peng and the University of Texas MD Anderson Cancer Center
 # Distributed under the terms of the 3-clause BSD License.
 
+import glob
 import os
 import shutil
 import subprocess
@@ -121,6 +122,14 @@ def test_task_file():
     assert a.has_stderr()
     assert a.has_pulse()
     assert a.has_shell()
+    # task files with blocks compressed by another codec can be read
+    env.config["task_codec"] = "zlib"
+    try:
+        a.add_result({"ret_code": 6})
+        assert a.result["ret_code"] == 6
+        assert a.params.task == "b=a"
+    finally:
+        env.config["task_codec"] = "lzma"
     #
     #
     a.reset()
@@ -133,6 +142,121 @@ def test_task_file():
     assert a.result["ret_code"] == 5
 
 
+def test_pulse_file(clear_now_and_after):
+    """Test binary pulse files of fixed size with summaries of all samples"""
+    from sos.monitor import PULSE_HEADER, PULSE_RECORD, PulseFile, pulse_summary, pulse_text, summarizeExecution
+
+    clear_now_and_after("test.pulse")
+    pulse = PulseFile("test.pulse", capacity=8)
+    pulse.create()
+    for i in range(100):
+        pulse.add_sample(1000 + i, i % 7, 1000 * i, i % 3, 1, 10)
+    assert os.path.getsize("test.pulse") <= PULSE_HEADER.size + 8 * PULSE_RECORD.size
+    summary = PulseFile("test.pulse").summary()
+    assert summary["samples"] == 100
+    assert summary["start_time"] == 1000 and summary["end_time"] == 1099
+    assert summary["peak_cpu"] == 7 and summary["peak_mem"] == 99010 and summary["peak_nch"] == 2
+    assert summary["total_cpu"] == sum(i % 7 + 1 for i in range(100))
+    # downsampled records cover the entire run
+    with open("test.pulse", "rb") as pd:
+        content = pd.read()
+    lines = pulse_text(content).splitlines()
+    assert lines[0].startswith("#time")
+    times = [float(x.split()[0]) for x in lines[1:]]
+    assert 4 <= len(times) <= 8 and times[0] == 1000 and times == sorted(times) and times[-1] >= 1080
+    assert pulse_summary(pulse_text(content))["samples"] == len(times)
+    assert "cpu_peak             7.0" in summarizeExecution("t", content)
+    # text pulse files of earlier versions can still be read
+    text = "#time\tproc_cpu\tproc_mem\tchildren\tchildren_cpu\tchildren_mem\n1000\t1.00\t100\t0\t0\t0\n"
+    with open("test.pulse", "w") as pd:
+        pd.write(text)
+    assert PulseFile("test.pulse").summary()["peak_mem"] == 100
+    assert pulse_text(text.encode()) == text
+
+
+def test_task_index():
+    """Test listing and filtering tasks with the task index"""
+    from sos.tasks import TaskIndex, remove_task_files
+
+    task_ids = ["eeeeeeeeeeeeeee1", "eeeeeeeeeeeeeee2"]
+    for task_id in task_ids:
+        TaskFile(task_id).save(
+            TaskParams(
+                name=task_id,
+                global_def=None,
+                task="b=a",
+                sos_dict={"a": 1},
+                tags=["index_test", task_id[-1]],
+            ))
+    index = TaskIndex()
+    assert [x[0] for x in index.match(["eeeeeeeeeeeeeee"])] == task_ids
+    assert [x[0] for x in index.match(["eeeeeeeeeeeeeee2"])] == task_ids[1:]
+    assert [x[0] for x in index.match(["eeeeeeeeeeeeeee*"])] == task_ids
+    assert index.with_tags(task_ids, ["2"]) == task_ids[1:]
+    assert index.with_tags(task_ids, ["index_test"]) == task_ids
+    task_dir = os.path.join(os.path.expanduser("~"), ".sos", "tasks")
+    task_file = os.path.join(task_dir, task_ids[1] + ".task")
+    assert index.match(task_ids[1:]) == [(task_ids[1], os.path.getmtime(task_file))]
+    # a task file that is changed in place (e.g. by a task executed on
+    # another host) is reindexed after the task directory is changed
+    os.utime(task_file, (time.time() - 86400, time.time() - 86400))
+    with open(os.path.join(task_dir, task_ids[1] + ".pulse"), "w"):
+        pass
+    assert index.match(task_ids[1:]) == [(task_ids[1], os.path.getmtime(task_file))]
+    remove_task_files(task_ids[1], [".pulse"])
+    # a task file that is replaced (e.g. by rsync) is reindexed with its tags
+    shutil.copy(os.path.join(task_dir, task_ids[0] + ".task"), task_file + ".tmp")
+    os.replace(task_file + ".tmp", task_file)
+    assert index.with_tags(task_ids, ["2"]) == []
+    assert index.with_tags(task_ids, ["1"]) == task_ids
+    # a task file that is removed without the index is dropped from the index
+    remove_task_files(task_ids[0], [".task"])
+    assert [x[0] for x in index.match(["eeeeeeeeeeeeeee"])] == task_ids[1:]
+    # and a task file that is copied in is added to the index
+    index.clear()
+    assert [x[0] for x in index.match(["eeeeeeeeeeeeeee"])] == task_ids[1:]
+    remove_task_files(task_ids[1], [".task"])
+    assert not index.match(["eeeeeeeeeeeeeee"])
+
+
+def test_task_status_notification(monkeypatch):
+    """Test sending status of task to the task status listener"""
+    from sos.hosts import Host
+    from sos.task_engines import get_task_status_listener
+    from sos.tasks import notify_task_status
+
+    class Receiver:
+
+        def __init__(self):
+            self.status = []
+
+        def notify_task_status(self, task_id, status):
+            self.status.append((task_id, status))
+
+    receiver = Receiver()
+    listener = get_task_status_listener()
+    # the address is passed only to tasks executed by local task engines
+    assert "SOS_TASK_NOTIFY" not in os.environ
+    monkeypatch.setenv("SOS_TASK_NOTIFY", listener.address)
+    listener.engines.add(receiver)
+    try:
+        notify_task_status("ffffffffffffffff", "running")
+        notify_task_status("ffffffffffffffff", "completed")
+        for _ in range(100):
+            if len(receiver.status) == 2:
+                break
+            time.sleep(0.05)
+        assert receiver.status == [("ffffffffffffffff", "running"), ("ffffffffffffffff", "completed")]
+    finally:
+        listener.engines.discard(receiver)
+    # task engines stop receiving status when hosts are reset
+    Host.reset()
+    Host("localhost", start_engine=False)
+    assert len(listener.engines) == 1
+    Host.reset()
+    assert len(listener.engines) == 0
+
+
 def test_workdir():
     """Test workdir option for runtime environment"""
     import tempfile
@@ -1065,6 +1189,73 @@ run: expand=True
         assert os.path.isfile(f"{i}.txt")
 
 
+def test_parallel_subtasks_with_common_dict(clear_now_and_after, purge_tasks):
+    """Test subtasks executed in parallel with values shared by all subtasks"""
+    clear_now_and_after([f"pool_{i}.txt" for i in range(8)])
+    execute_workflow(
+        """
+[10]
+common = ['x'] * 10000
+input: for_each={'I': range(8)}
+task: trunk_size=4, trunk_workers=2
+common.append(I)
+with open(f'pool_{I}.txt', 'w') as out:
+    out.write(f'{I} {len(common)}')
+""",
+        options={
+            "sig_mode": "force",
+            "default_queue": "localhost"
+        },
+    )
+    # subtasks executed by the same process do not share mutable values
+    for i in range(8):
+        with open(f"pool_{i}.txt") as res:
+            assert res.read() == f"{i} 10001"
+
+
+def test_node_monitor(purge_tasks, monkeypatch):
+    """Test monitoring tasks with a single monitor process on the node"""
+    from sos.monitor import monitor_dir
+    # tasks are executed by sos execute, which reads the option from environment
+    monkeypatch.setenv("SOS_NODE_MONITOR", "1")
+    try:
+        execute_workflow(
+            """
+[10]
+input: for_each={'I': range(2)}
+task:
+import time
+time.sleep(2)
+print(f'task {I}')
+""",
+            options={
+                "sig_mode": "force",
+                "default_queue": "localhost"
+            },
+        )
+    finally:
+        # tasks executed later by this process should not use the node monitor
+        monkeypatch.delenv("SOS_NODE_MONITOR")
+        env.reset()
+    task_ids = [
+        os.path.basename(x)[:-5]
+        for x in glob.glob(os.path.join(os.path.expanduser("~"), ".sos", "tasks", "*.task"))
+    ]
+    assert len(task_ids) == 2
+    for task_id in task_ids:
+        tf = TaskFile(task_id)
+        assert tf.status == "completed"
+        # resource usage recorded by the node monitor
+        assert tf.result["peak_mem"] > 0
+    # tasks are unregistered after they are completed
+    for _ in range(20):
+        if not any(os.path.isfile(os.path.join(monitor_dir(), f"{x}.task")) for x in task_ids):
+            break
+        time.sleep(0.5)
+    else:
+        assert False, "Tasks are not unregistered from the node monitor"
+
+
 @pytest.mark.skipif(not has_docker, reason="Docker container not usable")
 def test_sync_input_output_and_rerun(clear_now_and_after, purge_tasks):
     """Test sync input and output with remote host"""
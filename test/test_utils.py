@@ -4,6 +4,7 @@
 # Distributed under the terms of the 3-clause BSD License.
 
 import os
+import pickle
 import sys
 import random
 
@@ -11,11 +12,13 @@ import pytest
 from sos.eval import accessed_vars, on_demand_options
 from sos.parser import SoS_Script
 from sos.pattern import expand_pattern, extract_pattern
-from sos.targets import executable, file_target, sos_step, sos_targets
+from sos.targets import (executable, file_target, named_output, sos_step,
+                         sos_targets)
 # these functions are normally not available but can be imported
 # using their names for testing purposes
-from sos.utils import (WorkflowDict, as_fstring, env, get_logger,
-                       split_fstring, stable_repr, fileMD5)
+from sos.utils import (WorkflowDict, as_fstring, compress_blob,
+                       decompress_blob, env, fileMD5, get_logger,
+                       register_blob_codec, split_fstring, stable_repr)
 from sos.workflow_executor import Base_Executor, analyze_section
 
 
@@ -330,3 +333,261 @@ def test_file_md5(fsize, temp_factory):
     partial_md5, full_md5 = fileMD5(fname, sig_type='both')
     assert partial_md5 == fileMD5(fname, sig_type='partial')
     assert full_md5 == fileMD5(fname, sig_type='full')
+
+
+def test_blob_codecs():
+    """Test compression of blobs with different codecs"""
+    import lzma
+    import zlib
+    data = pickle.dumps({'input': ['a.txt'] * 100, 'output': {'b.txt': 'sig'}})
+    for codec in ('lzma', 'zlib', 'none'):
+        assert decompress_blob(compress_blob(data, codec)) == data
+    # lzma blobs are not tagged so that earlier versions of SoS can read them
+    assert compress_blob(data, 'lzma') == lzma.compress(data)
+    assert decompress_blob(lzma.compress(data)) == data
+    assert len(compress_blob(data, 'zlib')) < len(data)
+    with pytest.raises(ValueError):
+        compress_blob(data, 'unknown')
+    with pytest.raises(ValueError):
+        decompress_blob(b'\x7fdata')
+    # a codec cannot reuse the tag of another codec
+    with pytest.raises(ValueError):
+        register_blob_codec('zlib9', b'\x01', zlib.compress, zlib.decompress)
+    register_blob_codec('reversed', b'\x7f', lambda x: x[::-1], lambda x: x[::-1])
+    assert compress_blob(b'abc', 'reversed') == b'\x7fcba'
+    assert decompress_blob(b'\x7fcba') == b'abc'
+
+
+def test_file_signature_cache(clear_now_and_after):
+    '''test cross-process cache of file signatures'''
+    import time
+    from sos.utils import FileSignatureCache, file_signature_cache
+
+    clear_now_and_after('test_sig_cache.txt')
+    with open('test_sig_cache.txt', 'w') as ts:
+        ts.write('abc')
+    # signatures of files that are just modified are not cached
+    fileMD5('test_sig_cache.txt')
+    assert file_signature_cache.get(os.stat('test_sig_cache.txt')) is None
+    os.utime('test_sig_cache.txt', (time.time() - 10, time.time() - 10))
+    md5 = fileMD5('test_sig_cache.txt')
+    hits = file_signature_cache.hits
+    assert fileMD5('test_sig_cache.txt') == md5
+    assert file_signature_cache.hits == hits + 1
+    # cache is shared by other instances (processes) after it is flushed
+    file_signature_cache.flush()
+    assert FileSignatureCache().get(os.stat('test_sig_cache.txt')) == md5
+    # modified file is hashed again
+    with open('test_sig_cache.txt', 'w') as ts:
+        ts.write('abcd')
+    os.utime('test_sig_cache.txt', (time.time() - 5, time.time() - 5))
+    assert FileSignatureCache().get(os.stat('test_sig_cache.txt')) is None
+    assert fileMD5('test_sig_cache.txt') != md5
+    os.utime('test_sig_cache.txt', (time.time() - 5, time.time() - 5))
+    # the database is located when it is first used
+    cache = FileSignatureCache()
+    home = os.environ['HOME']
+    try:
+        os.environ['HOME'] = os.path.join(os.getcwd(), 'test_sig_cache.txt')
+        assert cache.db_file.startswith(os.environ['HOME'])
+        # the cache is disabled if the database cannot be opened
+        assert cache.get(os.stat('test_sig_cache.txt')) is None
+        assert cache.disabled
+        cache.set(os.stat('test_sig_cache.txt'), md5)
+        assert cache.get(os.stat('test_sig_cache.txt')) is None
+        # writing to an unavailable cache is not an error
+        cache = FileSignatureCache()
+        cache.set(os.stat('test_sig_cache.txt'), md5)
+        assert cache.disabled
+        cache.flush()
+    finally:
+        os.environ['HOME'] = home
+
+
+def test_interned_messages():
+    '''Test sending interned values once per peer of sockets'''
+    import zmq
+    from sos.messages import (INTERNED_CACHE_SIZE, Interned, intern_value,
+                              recv_msg, send_msg, forget_peer)
+    context = zmq.Context()
+    sender = context.socket(zmq.PAIR)
+    port = sender.bind_to_random_port('tcp://127.0.0.1')
+    receiver = context.socket(zmq.PAIR)
+    receiver.connect(f'tcp://127.0.0.1:{port}')
+    try:
+        config = {f'key_{i}': f'value_{i}' * 100 for i in range(100)}
+        sizes = []
+        for idx in range(3):
+            send_msg(sender, ['substep', {'index': idx, 'config': intern_value(config)}])
+            sizes.append(sum(len(x) for x in receiver.recv_multipart()[1:]))
+        # interned value is sent only with the first message
+        assert sizes[0] > 50000
+        assert sizes[1] == sizes[2] < 200
+        # messages can be passed along without unpickling interned values
+        send_msg(sender, ['substep', intern_value(config)], peer='other')
+        msg = recv_msg(receiver, resolve=False)
+        assert isinstance(msg[1], Interned)
+        send_msg(receiver, msg)
+        assert recv_msg(sender) == ['substep', config]
+        send_msg(receiver, msg)
+        assert recv_msg(sender) == ['substep', config]
+        # shared values are unpickled only once by receivers
+        send_msg(sender, ['substep', intern_value(config, shared=True)], peer='other')
+        shared = recv_msg(receiver)[1]
+        send_msg(sender, ['substep', intern_value(config, shared=True)], peer='other')
+        assert recv_msg(receiver)[1] is shared and shared == config
+        # large buffers (e.g. of numpy arrays) are sent out of band
+        data = os.urandom(1024 * 1024)
+        send_msg(sender, {'data': pickle.PickleBuffer(data), 'config': intern_value(config)}, peer='other')
+        frames = receiver.recv_multipart()
+        assert len(frames) == 3 and len(frames[1]) < 200
+        # a peer that is forgotten receives interned values again
+        forget_peer(sender, 'other')
+        send_msg(sender, {'data': pickle.PickleBuffer(data), 'config': intern_value(config)}, peer='other')
+        msg = recv_msg(receiver)
+        assert bytes(msg['data']) == data and msg['config'] == config
+        # values evicted from the cache of the connection are sent again
+        for idx in range(INTERNED_CACHE_SIZE + 1):
+            send_msg(sender, intern_value(f'value_{idx}' * 1000))
+            assert recv_msg(receiver) == f'value_{idx}' * 1000
+        send_msg(sender, intern_value('value_0' * 1000))
+        assert recv_msg(receiver) == 'value_0' * 1000
+        send_msg(sender, intern_value('value_0' * 1000))
+        assert len(receiver.recv_multipart()[1]) < 200
+    finally:
+        sender.close()
+        receiver.close()
+        context.term()
+
+
+def test_global_def_cache(reset_env):
+    '''Test reusing namespace created by global definitions'''
+    from sos.eval import analyze_global_statements
+    from sos.executor_utils import _global_def_cache, prepare_env
+    global_def, _ = analyze_global_statements('''
+import os
+
+def get_value(i):
+    return lookup[i]
+''')
+    _global_def_cache.clear()
+    prepare_env(global_def, {'lookup': [1, 2, 3]})
+    get_value = env.sos_dict['get_value']
+    assert env.sos_dict['get_value'](1) == 2
+    assert len(_global_def_cache) == 1
+    # global definitions are not executed again, and functions defined
+    # refer to the new global variables
+    prepare_env(global_def, {'lookup': [4, 5, 6]})
+    assert env.sos_dict['get_value'] is get_value
+    assert env.sos_dict['get_value'](1) == 5
+    assert 'os' in env.sos_dict
+    assert len(_global_def_cache) == 1
+    # different global definitions are executed
+    other_def, _ = analyze_global_statements('import sys')
+    prepare_env(other_def, {})
+    assert 'sys' in env.sos_dict and 'get_value' not in env.sos_dict
+    assert len(_global_def_cache) == 2
+    # global definitions that are changed are executed again
+    global_def.body.extend(analyze_global_statements('def get_other(i):\n    return i')[0].body)
+    prepare_env(global_def, {'lookup': [4, 5, 6]})
+    assert env.sos_dict['get_other'](1) == 1
+    assert len(_global_def_cache) == 3
+    # classes are created again for each execution
+    class_def, _ = analyze_global_statements('class A:\n    values = []')
+    prepare_env(class_def, {})
+    cls = env.sos_dict['A']
+    prepare_env(class_def, {})
+    assert env.sos_dict['A'] is not cls
+    assert len(_global_def_cache) == 3
+
+
+def test_code_cache(reset_env):
+    '''Test caching of compiled statements and expressions'''
+    from sos.eval import SoS_eval, SoS_exec, code_cache, interpolate
+    code_cache.clear()
+    env.sos_dict.set('a', 1)
+    for i in range(3):
+        assert SoS_exec('b = a + 1\nb * 2') == 4
+    assert code_cache.info() == {'hits': 2, 'misses': 1, 'size': 1, 'maxsize': code_cache.size}
+    # the same script compiled without split point is a different entry
+    SoS_exec('b = a + 1\nb * 2', return_result=False)
+    assert code_cache.misses == 2
+    assert SoS_exec('') is None
+    assert SoS_exec('c = 5') is None and env.sos_dict['c'] == 5
+    assert SoS_exec('a + 5') == 6
+    for i in range(3):
+        assert SoS_eval('a + c') == 6
+        assert interpolate('{a + c}', env.sos_dict.dict()) == '6'
+    assert code_cache.info()['misses'] == 7
+    with pytest.raises(SyntaxError):
+        SoS_exec('a +')
+    # cache is bounded and keeps recently used code
+    size = code_cache.size
+    try:
+        code_cache.size = 3
+        for i in range(5):
+            SoS_eval(f'a + {i}')
+        SoS_eval('a + 2')
+        SoS_eval('a + 5')
+        assert [key[0] for key in code_cache] == ['a + 4', 'a + 2', 'a + 5']
+    finally:
+        code_cache.size = size
+
+
+def test_analysis_cache(clear_now_and_after):
+    '''Test caching of analysis of sections'''
+    from sos.section_analyzer import (StaticAnalysisCache, analysis_cache,
+                                      clear_analysis_cache,
+                                      get_static_analysis,
+                                      static_analysis_cache)
+    clear_now_and_after('test_analysis_cache.db')
+    script = SoS_Script('''
+parameter: p1 = 5
+
+[A_1]
+input: None
+output: f'a_{p1}.txt', sample='b.txt'
+c = p1
+
+[A_2]
+output: 'c.txt'
+d = 5
+''')
+    wf = script.workflow('A')
+    Base_Executor(wf)
+    clear_analysis_cache()
+    section = wf.sections[0]
+    res = analyze_section(section, analysis_type='forward')
+    output = sos_targets('a_5.txt', sample='b.txt')
+    output.extend(named_output('sample'))
+    assert res['step_output'] == output
+    assert len(analysis_cache) == 1
+    signature_vars = set(res['signature_vars'])
+    # cached results are new objects that can be modified
+    res['signature_vars'].add('e')
+    res['step_output'].extend('f.txt')
+    cached = analyze_section(section, analysis_type='forward')
+    assert cached['signature_vars'] == signature_vars
+    assert cached['step_output'] == output
+    assert len(analysis_cache) == 1
+    # default input and type of analysis are part of the key
+    analyze_section(section, default_input=sos_targets('g.txt'), analysis_type='forward')
+    analyze_section(section)
+    assert len(analysis_cache) == 3
+    clear_analysis_cache()
+    assert not analysis_cache
+    # static analysis depends only on the content of sections
+    key, static = get_static_analysis(section)
+    assert static['signature_vars'] == signature_vars
+    assert static['output_args'] == (1, ['sample'])
+    assert get_static_analysis(wf.sections[1])[0] != key
+    # static analysis is shared by other processes through a database
+    cache = StaticAnalysisCache('test_analysis_cache.db')
+    cache.set(key, static)
+    cache.flush()
+    other = StaticAnalysisCache('test_analysis_cache.db')
+    assert other.get(key) == static
+    assert other.hits == 1
+    assert other.get('unknown') is None
+    assert other.misses == 1
+    assert static_analysis_cache.get(key) == static